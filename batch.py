@@ -0,0 +1,328 @@
+"""
+Batched execution of many games in lockstep (the "batch" mode of parallel_game.py).
+
+The games run as usual, but their models do not call the API: every chat completion
+request is queued by the `BatchScheduler`. Once every running game is waiting on a
+request (a game may queue several at once, e.g. the branches of a speculative round), the queue is written to a JSONL file in the OpenAI batch format, submitted
+through a backend, and the results are fanned back to the waiting games. This trades
+latency for throughput and the lower cost of the Batch API.
+"""
+
+import asyncio
+import contextvars
+import itertools
+import json
+import os
+import uuid
+from types import SimpleNamespace
+from typing import Any, Awaitable, Callable, Iterable, Protocol
+from openai import AsyncOpenAI, NotGiven
+from openai.types.chat import ChatCompletion
+from agents import Model, ModelProvider, OpenAIChatCompletionsModel
+from clients import get_openai_client
+from model_backends import get_backend
+from config import (
+    batch_backend,
+    batch_completion_window,
+    batch_dir,
+    batch_poll_interval,
+    max_concurrent_games_per_loop,
+)
+
+# Endpoint of the batched requests
+BATCH_ENDPOINT = "/v1/chat/completions"
+
+# Arguments of `chat.completions.create` that do not belong in the request body
+_CLIENT_ONLY_ARGUMENTS = {"stream", "stream_options", "extra_headers"}
+
+# Game of the running task, set by `BatchScheduler` (the tasks a game starts inherit it)
+_current_game: contextvars.ContextVar[int | None] = contextvars.ContextVar(
+    "batch_game", default=None
+)
+
+
+class BatchRequestError(Exception):
+    """
+    Raised for a request of a batch that did not succeed.
+    """
+
+
+class BatchBackend(Protocol):
+    """
+    Interface of a batch backend: runs a JSONL file of requests in the OpenAI batch
+    format and writes a JSONL file of results in the OpenAI batch output format.
+    """
+
+    async def run(self, input_path: str, output_path: str): ...
+
+
+class OpenAIBatchBackend:
+    """
+    Backend submitting the batches to the OpenAI Batch API and polling until they finish.
+
+    :param client: OpenAI client (defaults to the shared client of the event loop)
+    :param poll_interval: Seconds between two status checks of a batch
+    :param completion_window: Time frame within which the batch should be processed
+    """
+
+    def __init__(
+        self,
+        client: AsyncOpenAI | None = None,
+        poll_interval: float = batch_poll_interval,
+        completion_window: str = batch_completion_window,
+    ):
+        self.client = client
+        self.poll_interval = poll_interval
+        self.completion_window = completion_window
+
+    async def run(self, input_path: str, output_path: str):
+        client = self.client or get_openai_client()
+        with open(input_path, "rb") as f:
+            input_file = await client.files.create(file=f, purpose="batch")
+        batch = await client.batches.create(
+            input_file_id=input_file.id,
+            endpoint=BATCH_ENDPOINT,
+            completion_window=self.completion_window,
+        )
+        while batch.status not in ("completed", "failed", "expired", "cancelled"):
+            await asyncio.sleep(self.poll_interval)
+            batch = await client.batches.retrieve(batch.id)
+        if batch.status == "failed":
+            raise BatchRequestError(f"Batch {batch.id} failed: {batch.errors}")
+
+        # Expired or cancelled batches still return the results of the finished requests
+        with open(output_path, "w") as f:
+            for file_id in (batch.output_file_id, batch.error_file_id):
+                if file_id is not None:
+                    content = await client.files.content(file_id)
+                    f.write(content.text)
+
+
+class LocalBatchBackend:
+    """
+    File-based stand-in for the Batch API: runs the requests of the batch file one by
+    one and writes the results file, without the API's batch queue. Useful to check a
+    tournament end to end offline, or with a custom responder.
+
+    :param responder: Coroutine function mapping a request body to a chat completion body
+        (defaults to the mock backend, see model_backends.py, so no API quota is spent)
+    :param max_concurrent: Maximum number of requests in flight at once
+    """
+
+    def __init__(
+        self,
+        responder: Callable[[dict], Awaitable[dict]] | None = None,
+        max_concurrent: int = max_concurrent_games_per_loop,
+    ):
+        if responder is None:
+            mock_provider, _ = get_backend("mock")
+            responder = mock_provider.acreate_chat_completion
+        self.responder = responder
+        self.max_concurrent = max_concurrent
+
+    async def run(self, input_path: str, output_path: str):
+        with open(input_path) as f:
+            requests = [json.loads(line) for line in f if line.strip()]
+        semaphore = asyncio.Semaphore(self.max_concurrent)
+
+        async def respond(request: dict) -> dict:
+            async with semaphore:
+                try:
+                    body = await self.responder(request["body"])
+                except Exception as e:
+                    return {
+                        "id": f"batch_req_{uuid.uuid4().hex}",
+                        "custom_id": request["custom_id"],
+                        "response": None,
+                        "error": {"code": type(e).__name__, "message": str(e)},
+                    }
+            return {
+                "id": f"batch_req_{uuid.uuid4().hex}",
+                "custom_id": request["custom_id"],
+                "response": {"status_code": 200, "body": body},
+                "error": None,
+            }
+
+        results = await asyncio.gather(*(respond(request) for request in requests))
+        with open(output_path, "w") as f:
+            for result in results:
+                f.write(json.dumps(result) + "\n")
+
+
+class BatchScheduler:
+    """
+    Queues the requests of many concurrent games and submits them as one batch once
+    every running game is waiting on at least one request.
+
+    :param backend: Backend running the batches
+    :param batch_dir: Directory holding the batch input and output files
+    """
+
+    def __init__(self, backend: BatchBackend, batch_dir: str = batch_dir):
+        self.backend = backend
+        self.batch_dir = batch_dir
+        os.makedirs(batch_dir, exist_ok=True)
+        self.num_batches = 0
+        self.num_requests = 0
+        self._run_id = uuid.uuid4().hex[:8]
+        # Queued requests: ID, body, future of the result and game waiting on it
+        self._pending: list[tuple[str, dict, asyncio.Future, int | None]] = []
+        self._num_running = 0
+        self._game_ids = itertools.count()
+        self._wakeup = asyncio.Event()
+
+    async def submit(self, body: dict) -> dict:
+        """
+        Queue a request and wait for its result.
+
+        :param body: Body of the chat completion request
+        :returns: Body of the chat completion
+        """
+        future = asyncio.get_running_loop().create_future()
+        request_id = f"request-{self.num_requests}"
+        self._pending.append((request_id, body, future, _current_game.get()))
+        self.num_requests += 1
+        self._wakeup.set()
+        return await future
+
+    async def run(
+        self,
+        awaitables: Iterable[Awaitable[Any]],
+        on_complete: Callable[[Any], None] | None = None,
+    ) -> list[Any]:
+        """
+        Run the games, submitting their requests in batches.
+
+        :param awaitables: The games to run
+        :param on_complete: Optional callback called with the result of each game as it finishes
+        :returns: The results of the games in completion order
+        """
+        tasks = [asyncio.ensure_future(self._track(awaitable)) for awaitable in awaitables]
+        self._num_running = len(tasks)
+        dispatcher = asyncio.create_task(self._dispatch())
+        results = []
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                result = await next_done
+                results.append(result)
+                if on_complete is not None:
+                    on_complete(result)
+        finally:
+            dispatcher.cancel()
+        return results
+
+    async def _track(self, awaitable: Awaitable[Any]) -> Any:
+        # Set in this task's own context, so the requests of the game are attributed to it
+        _current_game.set(next(self._game_ids))
+        try:
+            return await awaitable
+        finally:
+            self._num_running -= 1
+            self._wakeup.set()
+
+    async def _dispatch(self):
+        """
+        Submit the queued requests whenever no running game can make progress without them.
+        """
+        while True:
+            await self._wakeup.wait()
+            self._wakeup.clear()
+            # A game may queue several requests at once: count the games that wait on one
+            waiting_games = {game for *_, game in self._pending}
+            if self._pending and len(waiting_games) >= self._num_running:
+                await self._flush()
+
+    async def _flush(self):
+        """
+        Submit the queued requests as one batch and resolve their futures.
+        """
+        pending, self._pending = self._pending, []
+        name = f"batch-{self._run_id}-{self.num_batches}"
+        self.num_batches += 1
+        input_path = os.path.join(self.batch_dir, f"{name}.jsonl")
+        output_path = os.path.join(self.batch_dir, f"{name}-output.jsonl")
+        try:
+            with open(input_path, "w") as f:
+                for custom_id, body, *_ in pending:
+                    request = {
+                        "custom_id": custom_id,
+                        "method": "POST",
+                        "url": BATCH_ENDPOINT,
+                        "body": body,
+                    }
+                    f.write(json.dumps(request) + "\n")
+            await self.backend.run(input_path, output_path)
+            with open(output_path) as f:
+                results = {
+                    result["custom_id"]: result
+                    for result in map(json.loads, filter(str.strip, f))
+                }
+        except Exception as e:
+            for _, _, future, _ in pending:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        for custom_id, _, future, _ in pending:
+            if future.done():
+                continue
+            result = results.get(custom_id)
+            response = (result or {}).get("response") or {}
+            if response.get("status_code") == 200:
+                future.set_result(response["body"])
+            else:
+                error = (result or {}).get("error") or response.get("body")
+                future.set_exception(
+                    BatchRequestError(f"Request {custom_id} of {name} failed: {error}")
+                )
+
+
+class _BatchCompletions:
+    """
+    Stand-in for `AsyncOpenAI.chat.completions` queuing the requests on a scheduler.
+
+    :param scheduler: Scheduler collecting the requests
+    """
+
+    def __init__(self, scheduler: BatchScheduler):
+        self.scheduler = scheduler
+
+    async def create(self, **kwargs: Any) -> ChatCompletion:
+        body = {
+            name: value
+            for name, value in kwargs.items()
+            if name not in _CLIENT_ONLY_ARGUMENTS and not isinstance(value, NotGiven)
+        }
+        return ChatCompletion.model_validate(await self.scheduler.submit(body))
+
+
+class BatchModelProvider(ModelProvider):
+    """
+    Provides chat completion models whose requests go through a batch scheduler.
+
+    :param scheduler: Scheduler collecting the requests
+    """
+
+    def __init__(self, scheduler: BatchScheduler):
+        self.scheduler = scheduler
+        self._client = SimpleNamespace(
+            base_url="batch", chat=SimpleNamespace(completions=_BatchCompletions(scheduler))
+        )
+
+    def get_model(self, model_name: str | None) -> Model:
+        return OpenAIChatCompletionsModel(model=model_name, openai_client=self._client)
+
+
+def create_batch_backend(name: str | None = None) -> BatchBackend:
+    """
+    Create a batch backend by name.
+
+    :param name: "openai" or "local" (defaults to `batch_backend` from config.py)
+    :returns: The batch backend
+    """
+    name = name or batch_backend
+    if name == "openai":
+        return OpenAIBatchBackend()
+    if name == "local":
+        return LocalBatchBackend()
+    raise ValueError(f"Unknown batch backend: {name}. Use 'openai' or 'local'.")
@@ -0,0 +1,476 @@
+"""
+Benchmark suite of the game, run offline against the mock model backend (see model_backends.py).
+
+It measures the throughput of concurrent games, the latency of a round, the tail latency of the
+Host's answers with and without hedged requests, the tokens spent per game as games get longer
+and the share of them served from the prompt cache, the rounds saved by the question planner,
+the cost of building the model input from the conversation history, and the startup time of
+the command line. The results are written as JSON and can be compared against a baseline, so
+that performance regressions show up before they are merged:
+
+    python benchmark.py --output baseline.json              # e.g. on the main branch
+    python benchmark.py --baseline baseline.json            # on the change, fails on regressions
+"""
+
+import asyncio
+import contextlib
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from typing import Any
+import fire
+from agents import RunConfig, set_tracing_disabled
+from config import benchmark_dir, benchmark_tolerance, hedge_budget
+from hedging import get_hedger
+from log_writer import flush_logs
+from memory import MEMORY_STRATEGIES, create_memory
+from metrics import Histogram, clear_metrics, get_metrics
+from model_backends import MockModelProvider
+from parallel_game import aplay_games
+from rate_limiter import RateLimiter
+
+
+def _metric(value: float, unit: str, better: str) -> dict[str, Any]:
+    """
+    Build the record of a measurement.
+
+    :param value: Measured value
+    :param unit: Unit of the value
+    :param better: "higher" or "lower", the direction of an improvement
+    :returns: The record of the metric
+    """
+    return {"value": value, "unit": unit, "better": better}
+
+
+def _mock_game_kwargs(
+    latency: float,
+    guesser_accuracy: float | None = None,
+    latency_sigma: float | None = None,
+    **game_kwargs: Any,
+) -> dict[str, Any]:
+    """
+    Build the keyword arguments of `aplay_game` running the games on a fresh mock backend.
+
+    :param latency: Median latency of a mock call in seconds
+    :param guesser_accuracy: Probability that the mock Guesser asks the most informative
+        question (defaults to `mock_guesser_accuracy` from config.py)
+    :param latency_sigma: Spread of the latency distribution (defaults to
+        `mock_latency_sigma` from config.py)
+    :param game_kwargs: Other keyword arguments of `aplay_game`
+    :returns: The keyword arguments
+    """
+    provider_kwargs = {"seed": 0, "latency_median": latency, "error_rate": 0.0}
+    if guesser_accuracy is not None:
+        provider_kwargs["guesser_accuracy"] = guesser_accuracy
+    if latency_sigma is not None:
+        provider_kwargs["latency_sigma"] = latency_sigma
+    return {
+        "model_provider": MockModelProvider(**provider_kwargs),
+        "rate_limiter": RateLimiter({}),
+        **game_kwargs,
+    }
+
+
+def _play(num_games: int, max_concurrent: int, game_kwargs: dict[str, Any]):
+    """
+    Play games on a new event loop, without their console output.
+
+    :returns: Tuple of (statistics of the games, seconds taken)
+    """
+    start_time = time.perf_counter()
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stderr(devnull):
+        outcomes = asyncio.run(
+            aplay_games(list(range(num_games)), max_concurrent, game_kwargs=game_kwargs)
+        )
+        # The console lines of the games are written by a background thread
+        flush_logs()
+    seconds = time.perf_counter() - start_time
+    errors = [error for _, error in outcomes if error]
+    if errors:
+        raise RuntimeError(f"{len(errors)} benchmark games failed, e.g.: {errors[0]}")
+    return [stats for (_, _, stats), _ in outcomes], seconds
+
+
+def bench_throughput(
+    concurrency: tuple[int, ...] = (1, 10, 50, 200),
+    num_games: int = 200,
+    latency: float = 0.05,
+) -> dict[str, dict[str, Any]]:
+    """
+    Measure the games played per minute for increasing numbers of games in flight.
+
+    :param concurrency: Numbers of games in flight on the event loop
+    :param num_games: Number of games played at each level (at most 10 per game in flight,
+        so that the sequential level finishes quickly)
+    :param latency: Median latency of a mock call in seconds
+    :returns: The metrics
+    """
+    results = {}
+    for max_concurrent in concurrency:
+        games = min(num_games, 10 * max_concurrent)
+        _, seconds = _play(games, max_concurrent, _mock_game_kwargs(latency))
+        results[f"throughput.games_per_minute.concurrency_{max_concurrent}"] = _metric(
+            games / seconds * 60, "games/min", "higher"
+        )
+    return results
+
+
+def bench_round_latency(num_games: int = 20, latency: float = 0.05) -> dict[str, dict[str, Any]]:
+    """
+    Measure the latency of a round of games played one at a time.
+
+    :param num_games: Number of games to play
+    :param latency: Median latency of a mock call in seconds
+    :returns: The metrics
+    """
+    results = {}
+    for speculative in (False, True):
+        stats, _ = _play(num_games, 1, _mock_game_kwargs(latency, speculative=speculative))
+        round_seconds = [s["duration"] / s["num_rounds"] for s in stats if s["num_rounds"]]
+        quantiles = statistics.quantiles(round_seconds, n=20, method="inclusive")
+        name = "speculative" if speculative else "sequential"
+        results[f"round_latency.{name}.p50"] = _metric(statistics.median(round_seconds), "s", "lower")
+        results[f"round_latency.{name}.p95"] = _metric(quantiles[18], "s", "lower")
+    return results
+
+
+def bench_hedging(
+    num_games: int = 50, latency: float = 0.05, latency_sigma: float = 1.0
+) -> dict[str, dict[str, Any]]:
+    """
+    Measure the tail latency of the Host's answers with and without hedged requests, on a
+    heavy-tailed latency distribution. Both runs go through the hedger, whose budget is
+    zero in the run without hedges, so the same latencies are measured.
+
+    :param num_games: Number of games per run
+    :param latency: Median latency of a mock call in seconds
+    :param latency_sigma: Spread of the log-normal latency distribution
+    :returns: The metrics
+    """
+    hedger = get_hedger()
+    results = {}
+    for name, budget in (("off", 0.0), ("on", hedge_budget)):
+        hedger.budget = budget
+        clear_metrics()
+        _play(
+            num_games,
+            10,
+            _mock_game_kwargs(latency, latency_sigma=latency_sigma, hedge=True, dispatch_mode="direct"),
+        )
+        effective = Histogram()
+        for (metric, labels), histogram in get_metrics().histograms.items():
+            if metric == "llm_hedged_call_seconds" and dict(labels)["request"] == "effective":
+                effective.merge(histogram.counts, histogram.sum, histogram.count)
+        for q in (0.5, 0.95, 0.99):
+            results[f"hedging.{name}.answer_p{round(q * 100)}"] = _metric(
+                effective.quantile(q), "s", "lower"
+            )
+    hedger.budget = hedge_budget
+    return results
+
+
+def bench_tokens_per_game(
+    max_num_rounds: tuple[int, ...] = (5, 10, 20, 40),
+    strategies: tuple[str, ...] = ("full", "window", "ledger", "summary"),
+    num_games: int = 5,
+) -> dict[str, dict[str, Any]]:
+    """
+    Measure the tokens spent per game as games get longer. The mock Guesser never
+    guesses the topic here, so every game lasts `max_num_rounds` rounds.
+
+    :param max_num_rounds: Lengths of the games
+    :param strategies: Memory strategies of the agents
+    :param num_games: Number of games per length and strategy
+    :returns: The metrics
+    """
+    results = {}
+    for strategy in strategies:
+        for num_rounds in max_num_rounds:
+            game_kwargs = _mock_game_kwargs(
+                0.0,
+                guesser_accuracy=0.0,
+                max_num_rounds=num_rounds,
+                memory_strategy=strategy,
+                dispatch_mode="handoff",
+            )
+            stats, _ = _play(num_games, num_games, game_kwargs)
+            results[f"tokens_per_game.{strategy}.rounds_{num_rounds}"] = _metric(
+                statistics.mean(s["total_tokens"] for s in stats), "tokens", "lower"
+            )
+    return results
+
+
+def bench_prompt_cache(
+    strategies: tuple[str, ...] = ("full", "window", "ledger", "summary"),
+    max_num_rounds: int = 30,
+    num_games: int = 5,
+) -> dict[str, dict[str, Any]]:
+    """
+    Measure the share of the input tokens served from the prompt cache of the mock backend,
+    which simulates the API's (see prompt_layout.py). The mock Guesser never guesses the
+    topic here, so every game lasts `max_num_rounds` rounds.
+
+    :param strategies: Memory strategies of the agents
+    :param max_num_rounds: Length of the games
+    :param num_games: Number of games per strategy
+    :returns: The metrics
+    """
+    results = {}
+    for strategy in strategies:
+        game_kwargs = _mock_game_kwargs(
+            0.0,
+            guesser_accuracy=0.0,
+            max_num_rounds=max_num_rounds,
+            memory_strategy=strategy,
+            dispatch_mode="handoff",
+        )
+        stats, _ = _play(num_games, num_games, game_kwargs)
+        usage = [agent_usage for s in stats for agent_usage in s["usage"].values()]
+        results[f"prompt_cache.{strategy}.cached_fraction"] = _metric(
+            sum(u["cached_input_tokens"] for u in usage) / sum(u["input_tokens"] for u in usage),
+            "ratio",
+            "higher",
+        )
+    return results
+
+
+def bench_planner(num_games: int = 100) -> dict[str, dict[str, Any]]:
+    """
+    Measure the rounds and tokens spent per game with and without the question planner.
+    The mock Guesser follows the planner's suggestions when it is on.
+
+    :param num_games: Number of games with and without the planner
+    :returns: The metrics
+    """
+    results = {}
+    for plan in (False, True):
+        stats, _ = _play(num_games, num_games, _mock_game_kwargs(0.0, dispatch_mode="direct", plan=plan))
+        name = "on" if plan else "off"
+        results[f"planner.{name}.rounds_per_game"] = _metric(
+            statistics.mean(s["num_rounds"] for s in stats), "rounds", "lower"
+        )
+        results[f"planner.{name}.tokens_per_game"] = _metric(
+            statistics.mean(s["total_tokens"] for s in stats), "tokens", "lower"
+        )
+    return results
+
+
+def _synthetic_history(num_rounds: int) -> list[dict]:
+    """
+    Build a conversation history shaped like the Guesser's after a number of rounds.
+
+    :param num_rounds: Number of rounds played
+    :returns: The messages
+    """
+    messages = []
+    for round_number in range(num_rounds):
+        question = f"Is it question number {round_number}?"
+        reply = {"reasoning": "Narrowing down the candidates.", "question": question, "topic_proposal": None}
+        messages += [
+            {"role": "user", "content": f"This is round {round_number + 1}/{num_rounds} of the game."},
+            {"role": "user", "content": "Generate a question that helps you guess the topic."},
+            {
+                "role": "assistant",
+                "type": "message",
+                "status": "completed",
+                "id": "__fake_id__",
+                "content": [{"type": "output_text", "text": json.dumps(reply), "annotations": []}],
+            },
+            {"role": "user", "content": f"The answer to the question: {question} is: No"},
+        ]
+    return messages
+
+
+def bench_message_building(
+    history_rounds: tuple[int, ...] = (20, 100), repeats: int = 2000
+) -> dict[str, dict[str, Any]]:
+    """
+    Measure the time to build the model input from the conversation history, for every
+    memory strategy (the summaries of the summary strategy come from the mock backend).
+
+    :param history_rounds: Numbers of rounds in the history
+    :param repeats: Number of inputs built per measurement
+    :returns: The metrics
+    """
+    run_config = RunConfig(model_provider=MockModelProvider(seed=0, latency_median=0.0))
+    rate_limiter = RateLimiter({})
+
+    async def measure(strategy: str, messages: list[dict]) -> float:
+        memory = create_memory(strategy)
+        for round_number in range(len(messages) // 4):
+            memory.record_fact(f"Is it question number {round_number}?", "No")
+        # Warm up, so the summary (if any) is built before the measurement
+        await memory.build_input(messages, 1, run_config=run_config, rate_limiter=rate_limiter)
+        start_time = time.perf_counter()
+        for _ in range(repeats):
+            await memory.build_input(messages, 1, run_config=run_config, rate_limiter=rate_limiter)
+        return (time.perf_counter() - start_time) / repeats
+
+    results = {}
+    for num_rounds in history_rounds:
+        messages = [{"role": "system", "content": "You are the Guesser."}] + _synthetic_history(num_rounds)
+        for strategy in MEMORY_STRATEGIES:
+            seconds = asyncio.run(measure(strategy, messages))
+            results[f"message_building.{strategy}.rounds_{num_rounds}"] = _metric(
+                seconds * 1e6, "us", "lower"
+            )
+    return results
+
+
+def bench_startup(repeats: int = 5) -> dict[str, dict[str, Any]]:
+    """
+    Measure the startup time of the command line entry points (`--help`, which must not
+    load the SDK), and of importing the agents, as paid when the first game starts.
+
+    :param repeats: Number of runs of each command (the median is kept)
+    :returns: The metrics
+    """
+    repo_dir = os.path.dirname(os.path.abspath(__file__))
+    commands = {
+        "startup.game_help": ["game.py", "--help"],
+        "startup.parallel_game_help": ["parallel_game.py", "--help"],
+        "startup.import_agents": ["-c", "import custom_agents"],
+    }
+    results = {}
+    for name, command in commands.items():
+        seconds = []
+        for _ in range(repeats):
+            start_time = time.perf_counter()
+            subprocess.run(
+                [sys.executable, *command],
+                cwd=repo_dir,
+                capture_output=True,
+                check=True,
+                env={**os.environ, "PAGER": "cat"},
+            )
+            seconds.append(time.perf_counter() - start_time)
+        results[name] = _metric(statistics.median(seconds), "s", "lower")
+    return results
+
+
+BENCHMARKS = {
+    "throughput": bench_throughput,
+    "round_latency": bench_round_latency,
+    "hedging": bench_hedging,
+    "tokens_per_game": bench_tokens_per_game,
+    "prompt_cache": bench_prompt_cache,
+    "planner": bench_planner,
+    "message_building": bench_message_building,
+    "startup": bench_startup,
+}
+
+
+def _environment() -> dict[str, Any]:
+    """
+    Describe where the benchmarks ran, so results from different machines are not mixed up.
+    """
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "commit": commit,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+    }
+
+
+def compare_results(
+    results: dict[str, dict[str, Any]],
+    baseline: dict[str, dict[str, Any]],
+    tolerance: float = benchmark_tolerance,
+) -> list[str]:
+    """
+    Compare benchmark results against a baseline.
+
+    :param results: Metrics of the current run
+    :param baseline: Metrics of the baseline run
+    :param tolerance: Relative change in the wrong direction tolerated before a metric
+        counts as a regression
+    :returns: Descriptions of the regressions
+    """
+    regressions = []
+    print("\n========== COMPARISON WITH BASELINE ==========")
+    for name, metric in results.items():
+        if name not in baseline:
+            print(f"{name}: {metric['value']:.4g} {metric['unit']} (new)")
+            continue
+        before, after = baseline[name]["value"], metric["value"]
+        change = (after - before) / before if before else 0.0
+        worse = -change if metric["better"] == "higher" else change
+        status = "REGRESSION" if worse > tolerance else "ok"
+        line = f"{name}: {before:.4g} -> {after:.4g} {metric['unit']} ({change * 100:+.1f}%) {status}"
+        print(line)
+        if status == "REGRESSION":
+            regressions.append(line)
+    return regressions
+
+
+def run_benchmarks(
+    benchmarks: tuple[str, ...] = tuple(BENCHMARKS),
+    output: str | None = None,
+    baseline: str | None = None,
+    tolerance: float = benchmark_tolerance,
+    quick: bool = False,
+):
+    """
+    Run the benchmarks, write their results as JSON and compare them against a baseline.
+
+    :param benchmarks: Names of the benchmarks to run (see `BENCHMARKS`)
+    :param output: Path of the results file (defaults to a timestamped file in `benchmark_dir`)
+    :param baseline: Path of the results of a baseline run. If given, the process exits with
+        status 1 if a metric regressed by more than `tolerance`.
+    :param tolerance: Relative regression tolerated (e.g. 0.1 for 10%)
+    :param quick: Whether to run smaller versions of the benchmarks (e.g. for a smoke test)
+    """
+    if isinstance(benchmarks, str):
+        benchmarks = (benchmarks,)
+    quick_kwargs = {
+        "throughput": {"concurrency": (1, 10), "num_games": 20},
+        "round_latency": {"num_games": 5},
+        "hedging": {"num_games": 10},
+        "tokens_per_game": {"max_num_rounds": (5, 10), "num_games": 2},
+        "prompt_cache": {"max_num_rounds": 10, "num_games": 2},
+        "planner": {"num_games": 10},
+        "message_building": {"history_rounds": (20,), "repeats": 100},
+        "startup": {"repeats": 2},
+    }
+
+    # The games run on the mock backend, whose traces are noise
+    set_tracing_disabled(True)
+    results = {}
+    for name in benchmarks:
+        if name not in BENCHMARKS:
+            raise ValueError(f"Unknown benchmark: {name}. Use one of {list(BENCHMARKS)}.")
+        print(f"Running the {name} benchmark...")
+        results.update(BENCHMARKS[name](**(quick_kwargs[name] if quick else {})))
+
+    print("\n========== BENCHMARKS ==========")
+    for name, metric in results.items():
+        print(f"{name}: {metric['value']:.4g} {metric['unit']}")
+
+    if output is None:
+        os.makedirs(benchmark_dir, exist_ok=True)
+        output = os.path.join(benchmark_dir, f"benchmark-{time.strftime('%Y%m%d-%H%M%S')}.json")
+    with open(output, "w") as f:
+        json.dump({"environment": _environment(), "metrics": results}, f, indent=2)
+    print(f"Results written to {output}")
+
+    if baseline is not None:
+        with open(baseline) as f:
+            regressions = compare_results(results, json.load(f)["metrics"], tolerance)
+        if regressions:
+            print(f"\n{len(regressions)} metrics regressed by more than {tolerance * 100:.0f}%")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    fire.Fire(run_benchmarks)
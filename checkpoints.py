@@ -0,0 +1,207 @@
+"""
+Checkpoints of the games, to resume a failed game from its last round.
+
+With checkpointing on, the state of a game is saved once the Guesser has asked the
+question of each round: the history, memory and usage of both agents, the topic, the
+round and the question. A game that fails later in the round (e.g. once the retries of
+an LLM call are exhausted) leaves its checkpoint behind, and resuming it replays nothing:
+it starts over from the Host's side of that round, with the rounds already played kept
+as they were. The checkpoint of a game is deleted once the game ends.
+
+    python parallel_game.py --num_games 200 --checkpoint     # failed games leave a checkpoint
+    python parallel_game.py --num_games 200 --resume         # games resume those first
+    python checkpoints.py list                               # pending checkpoints
+"""
+
+import asyncio
+import glob
+import json
+import os
+import uuid
+from typing import TYPE_CHECKING, Any
+from config import checkpoint_dir
+
+if TYPE_CHECKING:
+    from custom_agents import GuesserAgent, HostAgent
+
+
+def capture_checkpoint(
+    game_id: Any,
+    round_number: int,
+    max_num_rounds: int,
+    question: str,
+    topic_proposal: str | None,
+    host_agent: "HostAgent",
+    guesser_agent: "GuesserAgent",
+) -> str:
+    """
+    Capture the state of a game once the Guesser has asked the question of a round.
+
+    :param game_id: ID of the game
+    :param round_number: The round
+    :param max_num_rounds: The maximum number of rounds of the game
+    :param question: The Guesser's question of the round
+    :param topic_proposal: The Guesser's topic proposal of the round, if any
+    :param host_agent: The Host
+    :param guesser_agent: The Guesser
+    :returns: The checkpoint, serialised (so the game can go on while it is written)
+    """
+    return json.dumps(
+        {
+            "game_id": str(game_id),
+            "round": round_number,
+            "max_num_rounds": max_num_rounds,
+            "question": question,
+            "topic_proposal": topic_proposal,
+            "host": host_agent.get_state(),
+            "guesser": guesser_agent.get_state(),
+        },
+        default=str,
+    )
+
+
+class CheckpointStore:
+    """
+    Directory of the checkpoints of the games, one JSON file per game, shared by all the
+    worker processes.
+
+    :param directory: Directory of the checkpoints
+    """
+
+    def __init__(self, directory: str = checkpoint_dir):
+        self.directory = directory
+
+    def path(self, game_id: Any) -> str:
+        """
+        Path of the checkpoint of a game.
+
+        :param game_id: ID of the game
+        :returns: The path
+        """
+        return os.path.join(self.directory, f"{game_id}.json")
+
+    def save(self, game_id: Any, checkpoint: str):
+        """
+        Save the checkpoint of a game, replacing its previous one atomically.
+
+        :param game_id: ID of the game
+        :param checkpoint: Checkpoint returned by `capture_checkpoint`
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        temporary_path = f"{self.path(game_id)}.{uuid.uuid4().hex}.tmp"
+        with open(temporary_path, "w", encoding="utf-8") as f:
+            f.write(checkpoint)
+        os.replace(temporary_path, self.path(game_id))
+
+    async def asave(self, game_id: Any, checkpoint: str):
+        """
+        Save the checkpoint of a game without blocking the event loop (see `save`).
+        """
+        await asyncio.to_thread(self.save, game_id, checkpoint)
+
+    def load(self, game_id: Any) -> dict[str, Any] | None:
+        """
+        Load the checkpoint of a game.
+
+        :param game_id: ID of the game
+        :returns: The checkpoint, or None if the game has none
+        """
+        try:
+            with open(self.path(game_id), encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def claim(self) -> dict[str, Any] | None:
+        """
+        Take the oldest pending checkpoint, so that no other game (of any process)
+        resumes the same one. The claimed checkpoint is removed from the store, and saved
+        again by the resumed game.
+
+        :returns: The checkpoint, or None if none is pending
+        """
+        for path in sorted(self._paths(), key=_mtime):
+            claimed_path = f"{path}.{os.getpid()}.{uuid.uuid4().hex}.claimed"
+            try:
+                # Renaming is atomic: only one claimer succeeds
+                os.rename(path, claimed_path)
+            except FileNotFoundError:
+                continue
+            try:
+                with open(claimed_path, encoding="utf-8") as f:
+                    return json.load(f)
+            finally:
+                os.remove(claimed_path)
+        return None
+
+    def delete(self, game_id: Any):
+        """
+        Delete the checkpoint of a game, if any.
+
+        :param game_id: ID of the game
+        """
+        try:
+            os.remove(self.path(game_id))
+        except FileNotFoundError:
+            pass
+
+    def game_ids(self) -> list[str]:
+        """
+        IDs of the games with a pending checkpoint, oldest first.
+
+        :returns: The IDs
+        """
+        return [
+            os.path.basename(path).removesuffix(".json")
+            for path in sorted(self._paths(), key=_mtime)
+        ]
+
+    def _paths(self) -> list[str]:
+        return glob.glob(os.path.join(self.directory, "*.json"))
+
+
+def _mtime(path: str) -> float:
+    """
+    Modification time of a file (infinite if it was removed meanwhile).
+    """
+    try:
+        return os.path.getmtime(path)
+    except FileNotFoundError:
+        return float("inf")
+
+
+def list_checkpoints(directory: str = checkpoint_dir):
+    """
+    Print the pending checkpoints.
+
+    :param directory: Directory of the checkpoints
+    """
+    store = CheckpointStore(directory)
+    game_ids = store.game_ids()
+    for game_id in game_ids:
+        checkpoint = store.load(game_id)
+        if checkpoint is not None:
+            print(
+                f"{game_id}: round {checkpoint['round'] + 1} of {checkpoint['max_num_rounds']}, "
+                f"topic {checkpoint['host']['topic']}"
+            )
+    print(f"{len(game_ids)} pending checkpoints in {directory}")
+
+
+def clear_checkpoints(directory: str = checkpoint_dir):
+    """
+    Delete the pending checkpoints.
+
+    :param directory: Directory of the checkpoints
+    """
+    store = CheckpointStore(directory)
+    game_ids = store.game_ids()
+    for game_id in game_ids:
+        store.delete(game_id)
+    print(f"Deleted {len(game_ids)} checkpoints from {directory}")
+
+
+if __name__ == "__main__":
+    import fire
+
+    fire.Fire({"list": list_checkpoints, "clear": clear_checkpoints})
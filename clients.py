@@ -0,0 +1,148 @@
+"""
+Registry of the OpenAI clients shared by all agents and games of a worker.
+
+An HTTP connection pool belongs to the event loop it was opened on, so the registry keeps
+one client (and connection pool) per process and event loop. Every game of an event loop
+reuses its kept-alive connections, so only the first game of a worker pays for the TLS
+handshakes.
+"""
+
+import asyncio
+import dataclasses
+import functools
+import importlib.util
+import logging
+import os
+import weakref
+import httpx
+from openai import AsyncOpenAI, DefaultAsyncHttpxClient
+from openai.types.responses import Response
+from agents import Model, ModelProvider, ModelResponse, OpenAIProvider, OpenAIResponsesModel
+from config import (
+    client_http2,
+    client_keepalive_expiry,
+    client_max_connections,
+    client_max_keepalive_connections,
+    client_timeout,
+)
+from prompt_layout import CachedUsage, read_cached_tokens
+
+logger = logging.getLogger(__name__)
+
+_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, AsyncOpenAI]" = weakref.WeakKeyDictionary()
+_providers: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, OpenAIProvider]" = weakref.WeakKeyDictionary()
+_clients_pid: int | None = None
+
+
+@functools.cache
+def _http2_available() -> bool:
+    """
+    Check whether HTTP/2 can be used (httpx needs the optional `h2` package for it).
+    """
+    if not client_http2:
+        return False
+    if importlib.util.find_spec("h2") is None:
+        logger.warning("HTTP/2 needs the `h2` package (pip install h2); using HTTP/1.1")
+        return False
+    return True
+
+
+def create_openai_client() -> AsyncOpenAI:
+    """
+    Create an OpenAI client with a keep-alive connection pool sized by config.py.
+
+    :returns: The client
+    """
+    http_client = DefaultAsyncHttpxClient(
+        http2=_http2_available(),
+        limits=httpx.Limits(
+            max_connections=client_max_connections,
+            max_keepalive_connections=client_max_keepalive_connections,
+            keepalive_expiry=client_keepalive_expiry,
+        ),
+        timeout=httpx.Timeout(client_timeout, connect=5.0),
+    )
+    return AsyncOpenAI(http_client=http_client)
+
+
+def get_openai_client() -> AsyncOpenAI:
+    """
+    Get the OpenAI client of the running event loop, shared by every agent of this process
+    running on it. Forked worker processes get their own clients.
+
+    :returns: The client
+    """
+    global _clients_pid
+    if _clients_pid != os.getpid():
+        _clients_pid = os.getpid()
+        _clients.clear()
+        _providers.clear()
+    loop = asyncio.get_running_loop()
+    if loop not in _clients:
+        _clients[loop] = create_openai_client()
+        _providers.pop(loop, None)
+    return _clients[loop]
+
+
+async def aclose_openai_client():
+    """
+    Close the OpenAI client of the running event loop (e.g. before the loop is closed).
+    """
+    if _clients_pid != os.getpid():
+        return
+    loop = asyncio.get_running_loop()
+    client = _clients.pop(loop, None)
+    _providers.pop(loop, None)
+    if client is not None:
+        await client.close()
+
+
+class CachedTokensResponsesModel(OpenAIResponsesModel):
+    """
+    Model of the Responses API (as the SDK's), whose usage also reports the input tokens
+    served from the prompt cache (see prompt_layout.py), which the SDK's usage leaves out.
+    """
+
+    def __init__(self, model: str, openai_client: AsyncOpenAI):
+        super().__init__(model=model, openai_client=openai_client)
+        # Cached input tokens of the responses fetched, by response ID
+        self._cached_tokens: dict[str, int] = {}
+
+    async def _fetch_response(self, *args, **kwargs):
+        response = await super()._fetch_response(*args, **kwargs)
+        if isinstance(response, Response) and response.usage is not None:
+            self._cached_tokens[response.id] = read_cached_tokens(response.usage)
+        return response
+
+    async def get_response(self, *args, **kwargs) -> ModelResponse:
+        response = await super().get_response(*args, **kwargs)
+        response.usage = CachedUsage(
+            **dataclasses.asdict(response.usage),
+            cached_input_tokens=self._cached_tokens.pop(response.referenceable_id, 0),
+        )
+        return response
+
+
+class _CachedTokensOpenAIProvider(OpenAIProvider):
+    def get_model(self, model_name: str | None) -> Model:
+        model = super().get_model(model_name)
+        if isinstance(model, OpenAIResponsesModel):
+            return CachedTokensResponsesModel(model=model.model, openai_client=self._client)
+        return model
+
+
+class PooledOpenAIProvider(ModelProvider):
+    """
+    Provides the OpenAI models (as the default provider of the SDK does), backed by the
+    shared client of the running event loop, with the cached input tokens in their usage.
+    """
+
+    def get_model(self, model_name: str | None) -> Model:
+        client = get_openai_client()
+        loop = asyncio.get_running_loop()
+        if loop not in _providers:
+            # Failed calls are retried by the game agents (see retry.py), not by the client
+            _providers[loop] = _CachedTokensOpenAIProvider(
+                openai_client=client.with_options(max_retries=0)
+            )
+        return _providers[loop].get_model(model_name)
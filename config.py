@@ -1,3 +1,188 @@
 model_type_guesser = "gpt-4o-mini"
 model_type_host = "gpt-4o-mini"
 model_type_topic_proposal = "o3-mini"
+model_type_summary = "gpt-4o-mini"
+
+# Maximum number of games in flight on a single event loop (async mode of parallel_game.py)
+max_concurrent_games_per_loop = 100
+
+# Client-side rate limits per model: requests per minute ("rpm") and tokens per minute ("tpm").
+# Shared by all worker processes; models missing from this table are not rate limited.
+rate_limits = {
+    model_type_guesser: {"rpm": 500, "tpm": 200_000},
+    model_type_host: {"rpm": 500, "tpm": 200_000},
+    model_type_topic_proposal: {"rpm": 500, "tpm": 200_000},
+}
+
+# Response cache for LLM calls (replays of identical requests are served from the cache)
+response_cache_enabled = False
+response_cache_path = ".cache/responses.sqlite"
+response_cache_max_entries = 10_000  # in-memory LRU tier
+response_cache_max_bytes = 512 * 1024 * 1024  # persistent SQLite tier
+response_cache_counter_flush = 100  # lookups between writes of the hit/miss counters
+
+# Local pre-validation of topic proposals (see topic_matcher.py).
+# Only exact matches (after normalisation and aliases) are accepted without calling the LLM.
+# Proposals less similar than this and sharing no word with the topic are rejected without
+# calling the LLM. Disabled by default, since the Host accepts specific instances and
+# synonyms (e.g. `Husky` for `Dog`) that string similarity cannot recognise.
+topic_reject_threshold = None
+# Alternative names of topics, extended with the JSON file at `topic_aliases_path` if set.
+# Only names that cannot mean anything else: an alias is accepted without calling the LLM
+# (e.g. not "New York", which may be the state, or "Queen Elizabeth", which may be Elizabeth I)
+topic_aliases = {
+    "New York City": ["NYC", "Big Apple"],
+    "United States": ["USA", "United States of America"],
+    "United Kingdom": ["UK", "United Kingdom of Great Britain and Northern Ireland"],
+    "Elizabeth II": ["Queen Elizabeth II"],
+    "Pyramids of Giza": ["Giza Pyramids"],
+    "Great Wall of China": ["Great Wall"],
+}
+topic_aliases_path = None
+
+# Pool of pre-generated topics (see topic_pool.py): games without a topic take an unused one
+# instantly instead of waiting on `model_type_topic_proposal`, and the pool is topped up in the
+# background once it runs low. Each topic is handed out only once.
+topic_pool_enabled = False
+topic_pool_path = ".cache/topic_pool.sqlite"
+topic_pool_low_watermark = 20  # top up once fewer unused topics are left
+topic_pool_target_size = 100  # number of unused topics a top-up aims for
+topic_pool_max_concurrent = 10  # topics generated at once during a top-up
+topic_pool_retry_after = 60  # seconds before topping up again after a failed top-up
+
+# Conversation memory of the agents (see memory.py): "full", "window", "ledger" or "summary"
+memory_strategy = "full"
+# Number of most recent user turns kept verbatim by the "window", "ledger" and "summary" strategies
+memory_window_turns = 12
+# The "window" and "ledger" strategies move their cut this many user turns at a time, so the requests in
+# between share their prefix with the previous ones (1: the cut moves at every turn, see prompt_layout.py)
+memory_cut_step_turns = 6
+# The "summary" strategy folds older turns into the summary once this many have accumulated
+memory_summary_every = 9
+
+# How the agents reach the specialised agents of tools.py: "handoff" (the Host/Guesser agent
+# routes each request through a handoff) or "direct" (the game calls the specialised agent
+# straight away, with only the context it needs)
+dispatch_mode = "handoff"
+
+# Speculative execution of the game loop: overlap the Host's validation and answer with the
+# Guesser drafting its next question for both answers (the draft for the other answer is discarded)
+speculative_execution = False
+
+# Hedged requests (see hedging.py): once an answer of the Host has taken longer than the
+# `hedge_percentile` latency of recent answers, a duplicate request is sent and the first response
+# wins. At most `hedge_budget` extra requests are sent per answer.
+hedge_requests = False
+hedge_percentile = 0.95
+hedge_min_samples = 20  # answers observed before the first hedge
+hedge_budget = 0.05  # e.g. 0.05: at most one hedge per 20 answers
+hedge_window = 500  # number of recent latencies the percentile is computed over
+
+# Micro-batching of the Host's decisions in "direct" dispatch mode (see host_batching.py): the
+# answers and topic validations requested by concurrent games of an event loop within
+# `host_batch_window` seconds are sent as one request, sharing its system prompt. A request left
+# alone in its window is sent on its own, as without batching.
+host_batching = False
+host_batch_window = 0.02  # seconds
+host_batch_max_size = 32  # a batch is sent as soon as it holds this many requests
+
+# Batch mode of parallel_game.py (see batch.py): the games advance in lockstep and their requests
+# are submitted together, either to the OpenAI Batch API ("openai") or run locally on the mock
+# backend ("local")
+batch_backend = "openai"
+batch_dir = ".cache/batches"
+batch_poll_interval = 30  # seconds between two status checks of a submitted batch
+batch_completion_window = "24h"
+
+# Question planner of the Guesser (see planner.py, needs numpy): ranks the questions about the attributes of a
+# local table of candidate topics by expected information gain, and suggests the best ones to the Guesser
+question_planner = False
+planner_knowledge_path = None  # JSON file of topic -> attributes (None: the table of the mock backend)
+planner_num_suggestions = 3  # questions suggested per round
+planner_answer_noise = 0.05  # probability that an answer of the Host is wrong
+planner_propose_threshold = 0.3  # probability of a candidate above which proposing it is suggested (a wrong
+# proposal costs no round: the question of the round is still answered)
+planner_max_mismatches = 1  # answers a candidate may contradict before the topic is deemed not in the table
+
+# Checkpoints of the games (see checkpoints.py): the state of both agents is saved in `checkpoint_dir`
+# after the Guesser's question of every round, so a failed game can be resumed from its last round
+checkpoint_games = False
+checkpoint_dir = ".cache/checkpoints"
+
+# Game logs (see log_writer.py): the games queue their records and a background thread per process
+# writes them in batches to the console and to the process' log file in `log_dir`
+log_dir = "game_logs"
+log_max_bytes = 50 * 1024 * 1024  # size after which the log file of a process is rotated
+log_backup_count = 10  # rotated log files kept per process (older ones are deleted)
+log_compress = True  # whether the rotated log files are gzip-compressed
+log_batch_size = 1000  # maximum number of records written at once
+
+# Structured records of the games (see game_records.py), appended as JSON lines by all games.
+# None disables them.
+game_records_path = "game_logs/game_records.jsonl"
+
+# Instrumentation of the LLM calls (see metrics.py). Every process writes a snapshot of its
+# metrics to the directory of its run in `metrics_dir` at this interval, next to the merged
+# `metrics.prom`.
+metrics_dir = ".cache/metrics"
+metrics_snapshot_interval = 10  # seconds
+metrics_run_retention = 7 * 24 * 3600  # seconds after which the directory of a run is deleted
+# Port of the Prometheus endpoint served by parallel_game.py (None: no endpoint)
+metrics_port = None
+# Address the endpoint listens on ("0.0.0.0" to let other machines scrape it)
+metrics_host = "127.0.0.1"
+# Prices in USD per million tokens, used to estimate the cost of the games
+model_prices = {
+    "gpt-4o-mini": {"input": 0.15, "cached_input": 0.075, "output": 0.60},
+    "o3-mini": {"input": 1.10, "cached_input": 0.55, "output": 4.40},
+}
+
+# Provider-side prompt caching (see prompt_layout.py): the provider serves the prefix a request shares
+# with recent requests from its cache, from `prompt_cache_min_tokens` on and in blocks of
+# `prompt_cache_block_tokens` (the values of the OpenAI API, also simulated by the mock backend)
+prompt_cache_min_tokens = 1024
+prompt_cache_block_tokens = 128
+prompt_prefix_max_entries = 100_000  # prefixes of recent requests remembered to measure the shared prefix
+
+# Retries of failed LLM calls (see retry.py). Rate limits, timeouts, server errors and outputs that
+# do not match the schema are retried with exponential backoff and full jitter; other errors fail
+# the call at once.
+llm_max_attempts = 4
+llm_backoff_base = 0.5  # upper bound of the first backoff in seconds, doubled on every retry
+llm_backoff_max = 30.0  # upper bound of a single backoff in seconds
+llm_call_timeout = 120.0  # seconds a single attempt may take (None: no limit)
+llm_retry_deadline = 300.0  # seconds all the attempts of a call may take together (None: no limit)
+# Circuit breaker per model: after this many consecutive server errors or timeouts, the calls to
+# the model fail at once for `circuit_reset_timeout` seconds, after which a trial call is let through
+circuit_failure_threshold = 5
+circuit_reset_timeout = 30.0
+
+# Backend of the models: "openai" (the API) or "mock" (a local stand-in, see model_backends.py),
+# to run and benchmark the whole game loop offline
+model_backend = "openai"
+mock_seed = 0  # seed of the random draws of the mock backend
+mock_latency_median = 0.0  # median latency of a mock call in seconds (0: no delay)
+mock_latency_sigma = 0.5  # spread of the log-normal latency distribution
+mock_error_rate = 0.0  # probability that a mock call fails
+mock_error_kinds = ("rate_limit", "server_error", "timeout")
+mock_guesser_accuracy = 0.9  # probability that the mock Guesser asks the most informative question
+mock_max_tracked_requests = 100_000  # distinct requests whose repeats the mock counts
+
+# Benchmarks (see benchmark.py): directory of the results, and the relative regression of a
+# metric tolerated when comparing against a baseline
+benchmark_dir = ".cache/benchmarks"
+benchmark_tolerance = 0.1
+
+# HTTP connection pool of the OpenAI clients (see clients.py), shared by all agents and games of
+# a worker's event loop. HTTP/2 needs the optional `h2` package (HTTP/1.1 is used without it).
+client_http2 = True
+client_max_connections = 200
+client_max_keepalive_connections = 100
+client_keepalive_expiry = 60  # seconds an idle connection is kept open
+client_timeout = 120  # seconds
+
+# Long-lived game server (see game_server.py): address of its local socket, and the file the
+# server writes the random key its clients authenticate with to (GAME_SERVER_AUTHKEY overrides it)
+game_server_host = "localhost"
+game_server_port = 6010
+game_server_authkey_path = ".cache/game_server.key"
@@ -1,19 +1,64 @@
+import asyncio
+import copy
+import dataclasses
+import itertools
 import json
 import logging
+import logging.handlers
+import sys
 import time
-import random
-from typing import Dict, Any, Tuple, Optional
-from agents import Agent, Runner, MessageOutputItem
+from typing import TYPE_CHECKING, Dict, Any, Tuple, Optional
+from agents import (
+    Agent,
+    HandoffOutputItem,
+    MessageOutputItem,
+    ModelBehaviorError,
+    ModelProvider,
+    Runner,
+    RunConfig,
+)
 from tools import (
     generate_topic_agent,
     get_question_agent,
     get_answer_agent,
     validate_topic_proposal_agent,
 )
-from messages import topic_message
+from messages import (
+    topic_message,
+    question_message,
+    direct_topic_message,
+    direct_answer_message,
+    direct_validate_message,
+    round_message,
+)
 from prompts import SYSTEM_PROMPT_HOST, SYSTEM_PROMPT_GUESSER
 import uuid
 from config import model_type_host, model_type_guesser
+from config import dispatch_mode as default_dispatch_mode
+from utils import run_sync
+from game_records import event
+from metrics import get_metrics, record_llm_call
+from history import TurnHistory
+from memory import ConversationMemory, create_memory
+from prompt_layout import CachedUsage, get_prefix_tracker
+from model_backends import MockModelProvider
+from topic_matcher import TopicMatcher, get_topic_matcher
+from topic_pool import TopicPool, get_topic_pool, pool_namespace
+from response_cache import ResponseCache, describe_agent, get_response_cache
+from hedging import RequestHedger
+from host_batching import HostDecisionBatcher
+from retry import RetryPolicy, classify_error, get_circuit_breaker
+from rate_limiter import (
+    RateLimiter,
+    RateLimitHooks,
+    estimate_tokens,
+    get_rate_limiter,
+    retry_after_seconds,
+)
+
+# numpy is only needed with the question planner
+if TYPE_CHECKING:
+    from planner import QuestionPlanner
 
 
 class BaseGameAgent(Agent):
@@ -25,6 +70,16 @@ class BaseGameAgent(Agent):
     :param model: Model to use for this agent
     :param handoffs: List of agents this agent can hand off to
     :param logger: Logger instance to use
+    :param rate_limiter: Rate limiter shared by the LLM calls (defaults to the process-wide one)
+    :param response_cache: Cache for the LLM responses (defaults to the process-wide one,
+        which is None unless enabled in config.py)
+    :param memory: Conversation memory strategy, by name or instance (defaults to
+        `memory_strategy` from config.py)
+    :param dispatch_mode: "handoff" to let the agent route each request to a specialised agent,
+        or "direct" to call the specialised agent straight away (defaults to `dispatch_mode`
+        from config.py)
+    :param model_provider: Provider of the models the agent runs on (defaults to the OpenAI API)
+    :param retry_policy: Retries and timeouts of the LLM calls (defaults to the ones of config.py)
     """
 
     def __init__(
@@ -34,45 +89,353 @@ class BaseGameAgent(Agent):
         model: str | None,
         handoffs: list = None,
         logger: logging.Logger | None = None,
+        rate_limiter: RateLimiter | None = None,
+        response_cache: ResponseCache | None = None,
+        memory: str | ConversationMemory | None = None,
+        dispatch_mode: str | None = None,
+        model_provider: ModelProvider | None = None,
+        retry_policy: RetryPolicy | None = None,
     ):
         super().__init__(
             name=name, instructions=system_prompt, model=model, handoffs=handoffs or []
         )
-        self.messages = []
+        self.dispatch_mode = dispatch_mode or default_dispatch_mode
+        if self.dispatch_mode not in ("handoff", "direct"):
+            raise ValueError(
+                f"Unknown dispatch mode: {self.dispatch_mode}. Use 'handoff' or 'direct'."
+            )
+        # Frozen turns in the model's input format (see history.py)
+        self.messages = TurnHistory()
+        # Leading messages that the memory strategy must always send (e.g. the Host's topic)
+        self.num_pinned_messages = 0
+        self.memory = (
+            memory if isinstance(memory, ConversationMemory) else create_memory(memory)
+        )
+        self.run_config = (
+            RunConfig(model_provider=model_provider) if model_provider is not None else None
+        )
+        self.usage = CachedUsage()
+        # Wall-clock time spent waiting on the model
+        self.llm_seconds = 0.0
         self.logger = logger or logging.getLogger()
+        self.rate_limiter = rate_limiter or get_rate_limiter()
+        self.retry_policy = retry_policy or RetryPolicy()
+        self.circuit_breaker = get_circuit_breaker()
+        # Hedges the calls made with `hedge=True` (set by agents that hedge their calls)
+        self.hedger: RequestHedger | None = None
+        self.response_cache = response_cache or get_response_cache()
+        self._cache_descriptions: Dict[str, Dict[str, Any]] = {}
+        # Set on branches created by `fork`
+        self._fork_point: int | None = None
+        self._log_buffer: logging.handlers.BufferingHandler | None = None
+
+    def get_state(self) -> Dict[str, Any]:
+        """
+        Get the state of the agent in the game: its history, memory and usage (e.g. for a
+        checkpoint of the game, see checkpoints.py).
+
+        :returns: JSON-serialisable state
+        """
+        return {
+            "messages": self.messages,
+            "num_pinned_messages": self.num_pinned_messages,
+            "memory": self.memory.get_state(),
+            "usage": dataclasses.asdict(self.usage),
+            "llm_seconds": self.llm_seconds,
+        }
+
+    def restore_state(self, state: Dict[str, Any]):
+        """
+        Restore a state returned by `get_state`.
+
+        :param state: The state
+        """
+        self.messages = TurnHistory(copy.deepcopy(state["messages"]))
+        self.num_pinned_messages = state["num_pinned_messages"]
+        self.memory.restore_state(state["memory"])
+        self.usage = CachedUsage(**state["usage"])
+        self.llm_seconds = state["llm_seconds"]
+
+    def fork(self) -> "BaseGameAgent":
+        """
+        Create a branch of the agent that can run requests concurrently with the agent
+        and with other branches (used for speculative execution).
+
+        The branch starts from a copy of the history and memory, and buffers its log
+        records until it is merged back, so a discarded branch leaves no trace in the log.
+
+        :returns: The branch
+        """
+        branch = copy.copy(self)
+        branch.messages = self.messages.copy()
+        branch.memory = copy.deepcopy(self.memory)
+        branch.memory.usage = CachedUsage()
+        branch.usage = CachedUsage()
+        branch.llm_seconds = 0.0
+        branch._fork_point = len(self.messages)
+        branch._log_buffer = logging.handlers.BufferingHandler(capacity=sys.maxsize)
+        branch.logger = logging.Logger(self.logger.name)
+        branch.logger.addHandler(branch._log_buffer)
+        return branch
+
+    def merge(self, branch: "BaseGameAgent", adopt: bool = True):
+        """
+        Merge a branch created by `fork` back into the agent.
+
+        The usage of the branch is always accounted for, since a discarded branch
+        still costs tokens.
+
+        :param branch: The branch to merge
+        :param adopt: If True, append the branch's new messages to the history, take over
+            its memory and replay its log records; if False, the branch is discarded
+        """
+        self.usage.add(branch.usage)
+        self.memory.usage.add(branch.memory.usage)
+        self.llm_seconds += branch.llm_seconds
+        if not adopt:
+            return
+        self.messages.extend(branch.messages[branch._fork_point :])
+        memory_usage = self.memory.usage
+        self.memory = branch.memory
+        self.memory.usage = memory_usage
+        for record in branch._log_buffer.buffer:
+            if self.logger.isEnabledFor(record.levelno):
+                self.logger.handle(record)
 
     def _run_agent_and_extract_response(
-        self, message: str, context: Dict[str, Any] = None
+        self,
+        message: str,
+        context: Dict[str, Any] = None,
+        agent: Agent | None = None,
+        include_history: bool = True,
+    ) -> Dict[str, Any]:
+        """
+        Run the agent with a message and extract the response (blocking).
+
+        :param message: Message to send to the agent
+        :param context: Optional context to pass to the agent
+        :param agent: Agent to run (defaults to this agent; a specialised agent in direct mode)
+        :param include_history: Whether to send the conversation history along with the message
+        :returns: Parsed JSON response
+        """
+        return run_sync(
+            self._arun_agent_and_extract_response(
+                message, context, agent=agent, include_history=include_history
+            )
+        )
+
+    async def _arun_agent_and_extract_response(
+        self,
+        message: str,
+        context: Dict[str, Any] = None,
+        agent: Agent | None = None,
+        include_history: bool = True,
+        hedge: bool = False,
     ) -> Dict[str, Any]:
         """
         Run the agent with a message and extract the response.
 
+        The message and the new items of the run are added to this agent's history
+        either way, so the history stays a complete record of the game. Failed attempts
+        are rolled back and retried as set by `retry_policy` (see retry.py).
+
         :param message: Message to send to the agent
         :param context: Optional context to pass to the agent
+        :param agent: Agent to run (defaults to this agent; a specialised agent in direct mode)
+        :param include_history: Whether to send the conversation history along with the message
+        :param hedge: Whether to hedge the call with a duplicate request if it is slow
+            (only if the agent has a `hedger`)
         :returns: Parsed JSON response
         """
-        for attempt in range(3):
+        if hedge and self.hedger is not None:
+            return await self.hedger.arun(
+                self,
+                f"{self.name}/{(agent or self).name}",
+                lambda branch: branch._arun_agent_and_extract_response(
+                    message, context, agent=agent, include_history=include_history
+                ),
+            )
+        agent = agent or self
+        start_time = time.monotonic()
+        for attempt in itertools.count():
+            # Roll the history back after a failed attempt, so a retry does not repeat the message
+            checkpoint = len(self.messages)
+            hooks = RateLimitHooks(self.rate_limiter, 0, circuit_breaker=self.circuit_breaker)
             try:
-                self.messages.append({"role": "user", "content": message})
-                result = Runner.run_sync(self, self.messages, context=context)
-                self.messages = result.to_input_list()
-
-                # Extract the message content
-                message_output_item = next(
-                    item
-                    for item in result.new_items
-                    if isinstance(item, MessageOutputItem)
+                response = await asyncio.wait_for(
+                    self._arun_attempt(message, context, agent, include_history, hooks),
+                    timeout=self.retry_policy.attempt_timeout_at(start_time),
+                )
+            except asyncio.CancelledError:
+                del self.messages[checkpoint:]
+                # A cancelled call (e.g. a losing hedge) must not keep the circuit's trial
+                hooks.release_trials()
+                raise
+            except Exception as e:
+                del self.messages[checkpoint:]
+                kind = classify_error(e)
+                model = hooks.models[-1] if hooks.models else self.model
+                retry_after = None
+                if kind == "rate_limit":
+                    # Pause every worker using this model for as long as the server asks
+                    retry_after = retry_after_seconds(e)
+                    await self.rate_limiter.penalize(model, retry_after)
+                self.circuit_breaker.record_failure(model, kind)
+                hooks.release_trials()
+                get_metrics().increment(
+                    "llm_errors_total", agent=self.name, error=type(e).__name__, kind=kind
+                )
+                delay = self.retry_policy.next_delay(attempt, kind, start_time, retry_after)
+                if delay is None:
+                    get_metrics().observe(
+                        "llm_call_attempts", attempt + 1, agent=self.name, outcome="failure"
+                    )
+                    self.logger.error(f"Attempt {attempt + 1} failed ({kind}), giving up: {e!r}")
+                    raise
+                self.logger.warning(
+                    f"Attempt {attempt + 1} failed ({kind}), retrying in {delay:.2f}s: {e!r}"
                 )
-                content = message_output_item.raw_item.content[0].text
+                await asyncio.sleep(delay)
+            else:
+                for model in hooks.models:
+                    self.circuit_breaker.record_success(model)
+                get_metrics().observe(
+                    "llm_call_attempts", attempt + 1, agent=self.name, outcome="success"
+                )
+                return response
 
-                parsed_response = json.loads(content)
-                return parsed_response
+    async def _arun_attempt(
+        self,
+        message: str,
+        context: Dict[str, Any] | None,
+        agent: Agent,
+        include_history: bool,
+        hooks: RateLimitHooks,
+    ) -> Dict[str, Any]:
+        """
+        Make a single attempt of `_arun_agent_and_extract_response`.
 
-            except Exception as e:
-                breakpoint()
-                self.logger.error(f"Attempt {attempt + 1} failed: {e}")
-                if attempt == 2:  # Last attempt
-                    raise e
+        :param message: Message to send to the agent
+        :param context: Optional context to pass to the agent
+        :param agent: Agent to run
+        :param include_history: Whether to send the conversation history along with the message
+        :param hooks: Hooks of the run, whose token estimate is set once the input is built
+        :returns: Parsed JSON response
+        """
+        self.messages.append({"role": "user", "content": message})
+        if include_history:
+            model_input = await self.memory.build_input(
+                self.messages,
+                self.num_pinned_messages,
+                run_config=self.run_config,
+                rate_limiter=self.rate_limiter,
+            )
+        else:
+            model_input = [self.messages[-1]]
+        cache_key = self._response_cache_key(agent, model_input)
+        if cache_key is not None:
+            cached = await self.response_cache.aget(cache_key)
+            if cached is not None:
+                self.messages.extend(cached["new_items"])
+                get_metrics().increment("llm_cache_hits_total", agent=self.name)
+                self.logger.debug(
+                    f"{self.name} served {agent.name} from the response cache",
+                    extra=event(
+                        "llm_call",
+                        agent=self.name,
+                        called_agent=agent.name,
+                        seconds=0.0,
+                        requests=0,
+                        input_tokens=0,
+                        output_tokens=0,
+                        cached=True,
+                    ),
+                )
+                return cached["response"]
+
+        hooks.estimated_tokens = estimate_tokens(agent.instructions, model_input)
+        prompt_tokens = get_prefix_tracker().measure(agent.instructions, model_input)
+        start_time = time.perf_counter()
+        result = await Runner.run(
+            agent,
+            model_input,
+            context=context,
+            hooks=hooks,
+            run_config=self.run_config,
+        )
+        seconds = time.perf_counter() - start_time
+        self.llm_seconds += seconds
+        hooks.reconcile(result.raw_responses)
+        call_usage = CachedUsage()
+        for response in result.raw_responses:
+            call_usage.add(response.usage)
+        self.usage.add(call_usage)
+        record_llm_call(
+            self.name,
+            result.last_agent.name,
+            seconds,
+            hooks.models,
+            result.raw_responses,
+            num_handoffs=sum(
+                isinstance(item, HandoffOutputItem) for item in result.new_items
+            ),
+            prompt_tokens=prompt_tokens,
+        )
+        self.logger.debug(
+            f"{self.name} called {result.last_agent.name} in {seconds:.2f}s",
+            extra=event(
+                "llm_call",
+                agent=self.name,
+                called_agent=result.last_agent.name,
+                seconds=seconds,
+                requests=call_usage.requests,
+                input_tokens=call_usage.input_tokens,
+                output_tokens=call_usage.output_tokens,
+                cached_input_tokens=call_usage.cached_input_tokens,
+                prefix_tokens=prompt_tokens[0],
+                cached=False,
+            ),
+        )
+        # Only the new items: `to_input_list` would copy the whole input again
+        new_items = [item.to_input_item() for item in result.new_items]
+        self.messages.extend(new_items)
+
+        # Extract the message content
+        message_output_item = next(
+            (item for item in result.new_items if isinstance(item, MessageOutputItem)),
+            None,
+        )
+        if message_output_item is None:
+            raise ModelBehaviorError(f"{result.last_agent.name} returned no message")
+        content = message_output_item.raw_item.content[0].text
+
+        parsed_response = json.loads(content)
+        if cache_key is not None:
+            await self.response_cache.aset(
+                cache_key,
+                {"response": parsed_response, "new_items": new_items},
+            )
+        return parsed_response
+
+    def _response_cache_key(self, agent: Agent, model_input: list[dict]) -> str | None:
+        """
+        Build the response cache key of the current request.
+
+        :param agent: Agent that is run
+        :param model_input: Messages sent to the model
+        :returns: The cache key, or None if caching is disabled
+        """
+        if self.response_cache is None:
+            return None
+        if agent.name not in self._cache_descriptions:
+            self._cache_descriptions[agent.name] = describe_agent(agent)
+        fields = {"agent": self._cache_descriptions[agent.name], "messages": model_input}
+        if self.run_config is not None and isinstance(
+            self.run_config.model_provider, MockModelProvider
+        ):
+            # Responses of the mock backend must not be served for the API
+            fields["model_provider"] = type(self.run_config.model_provider).__name__
+        return ResponseCache.make_key(**fields)
 
     def _log_internal_dialogue(self, reasoning: str, prefix: str = "internal dialogue"):
         """
@@ -88,10 +451,27 @@ class HostAgent(BaseGameAgent):
     """
     Host agent for the 20 questions game. Generates topics and validates guesses.
 
+    Every action has a coroutine variant (prefixed with `a`) built on `Runner.run`,
+    and a blocking variant that runs the coroutine on the thread's event loop.
+    Inside a running event loop, create the agent with `HostAgent.acreate`.
+
     :param system_prompt: System prompt for the agent
     :param model: Model to use for this agent
     :param topic: Optional predefined topic for the game
     :param logger: Logger instance to use
+    :param defer_topic: If True and no topic is given, leave the topic unset
+        (used by `acreate`, which generates it asynchronously)
+    :param topic_matcher: Local pre-validator of topic proposals (defaults to the process-wide one)
+    :param memory: Conversation memory strategy, by name or instance
+    :param dispatch_mode: "handoff" or "direct" (see `BaseGameAgent`)
+    :param rate_limiter: Rate limiter shared by the LLM calls (defaults to the process-wide one)
+    :param model_provider: Provider of the models the agent runs on (defaults to the OpenAI API)
+    :param topic_pool: Pool of pre-generated topics to take the topic from, if none is given
+        (defaults to the process-wide one, if enabled in config.py)
+    :param hedger: If given, slow answers are hedged with a duplicate request (see hedging.py)
+    :param host_batcher: If given, the decisions of the "direct" dispatch mode are batched with
+        those of concurrent games (see host_batching.py)
+    :param retry_policy: Retries and timeouts of the LLM calls (defaults to the ones of config.py)
     """
 
     def __init__(
@@ -100,6 +480,16 @@ class HostAgent(BaseGameAgent):
         model: str | None = model_type_host,
         topic: str | None = None,
         logger: logging.Logger | None = None,
+        defer_topic: bool = False,
+        topic_matcher: TopicMatcher | None = None,
+        memory: str | ConversationMemory | None = None,
+        dispatch_mode: str | None = None,
+        rate_limiter: RateLimiter | None = None,
+        model_provider: ModelProvider | None = None,
+        topic_pool: TopicPool | None = None,
+        hedger: RequestHedger | None = None,
+        host_batcher: HostDecisionBatcher | None = None,
+        retry_policy: RetryPolicy | None = None,
     ):
         super().__init__(
             name="Host",
@@ -111,17 +501,90 @@ class HostAgent(BaseGameAgent):
                 validate_topic_proposal_agent,
             ],
             logger=logger,
+            rate_limiter=rate_limiter,
+            memory=memory,
+            dispatch_mode=dispatch_mode,
+            model_provider=model_provider,
+            retry_policy=retry_policy,
         )
-        if topic is None:
-            self.topic = self._generate_topic()
-        else:
-            self.messages.append(
-                {
-                    "role": "user",
-                    "content": f"IMPORTANT: The topic for this game is: {topic}",
-                }
-            )
-            self.topic = topic
+        self.topic_matcher = topic_matcher or get_topic_matcher()
+        self.topic_pool = topic_pool or get_topic_pool()
+        self.hedger = hedger
+        self.host_batcher = host_batcher
+        # Decisions on earlier proposals, keyed by canonical name, so repeated guesses are free
+        self._topic_proposal_decisions: Dict[str, bool] = {}
+        self.topic = None
+        if topic is not None:
+            self._set_topic(topic)
+        elif not defer_topic:
+            run_sync(self._aobtain_topic())
+
+    @classmethod
+    async def acreate(
+        cls, topic: str | None = None, **kwargs: Any
+    ) -> "HostAgent":
+        """
+        Create a Host agent, taking the topic from the topic pool or generating it
+        asynchronously if none is given.
+
+        :param topic: Optional predefined topic for the game
+        :param kwargs: Remaining arguments passed to the constructor
+        :returns: Host agent with the topic set
+        """
+        host = cls(topic=topic, defer_topic=True, **kwargs)
+        if host.topic is None:
+            await host._aobtain_topic()
+        return host
+
+    def get_state(self) -> Dict[str, Any]:
+        return {
+            **super().get_state(),
+            "topic": self.topic,
+            "topic_proposal_decisions": self._topic_proposal_decisions,
+        }
+
+    def restore_state(self, state: Dict[str, Any]):
+        super().restore_state(state)
+        self.topic = state["topic"]
+        self._topic_proposal_decisions = dict(state["topic_proposal_decisions"])
+
+    async def _aobtain_topic(self):
+        """
+        Take the topic from the topic pool, or generate it if the pool is disabled or empty.
+        """
+        pooled = None
+        if self.topic_pool is not None:
+            model_provider = self.run_config.model_provider if self.run_config else None
+            pooled = await self.topic_pool.atake(model_provider, self.rate_limiter)
+        if pooled is None:
+            topic = await self._agenerate_topic()
+            # The topic request carries a unique seed: stating the topic instead, the Host's
+            # requests start the same way however the topic was obtained (see prompt_layout.py)
+            self.messages.clear()
+            self._set_topic(topic)
+            if self.topic_pool is not None:
+                self.topic_pool.mark_used(pool_namespace(model_provider), self.topic)
+            return
+        self._log_internal_dialogue(
+            f"Took topic: {pooled['topic']} from category: "
+            f"{pooled['category']}/{pooled['sub_category']} from the topic pool"
+        )
+        self._set_topic(pooled["topic"])
+
+    def _set_topic(self, topic: str):
+        """
+        Set a predefined topic and make it known to the agent.
+
+        :param topic: Topic for the game
+        """
+        self.messages.append(
+            {
+                "role": "user",
+                "content": f"IMPORTANT: The topic for this game is: {topic}",
+            }
+        )
+        self.num_pinned_messages = len(self.messages)
+        self.topic = topic
 
     def _generate_topic(self) -> str:
         """
@@ -129,9 +592,24 @@ class HostAgent(BaseGameAgent):
 
         :returns: Generated topic string
         """
-        response = self._run_agent_and_extract_response(
-            topic_message.format(unique_id=uuid.uuid4())
-        )
+        return run_sync(self._agenerate_topic())
+
+    async def _agenerate_topic(self) -> str:
+        """
+        Generate a new topic for the game.
+
+        :returns: Generated topic string
+        """
+        if self.dispatch_mode == "direct":
+            response = await self._arun_agent_and_extract_response(
+                direct_topic_message.format(unique_id=uuid.uuid4()),
+                agent=generate_topic_agent,
+                include_history=False,
+            )
+        else:
+            response = await self._arun_agent_and_extract_response(
+                topic_message.format(unique_id=uuid.uuid4())
+            )
 
         self._log_internal_dialogue(
             f"Generated topic: {response['topic']} from category: {response['category']}/{response['sub_category']}. "
@@ -139,19 +617,65 @@ class HostAgent(BaseGameAgent):
         )
         return response["topic"]
 
-    def generate_answer(self, question: str) -> Tuple[str, str]:
+    async def _adecide(
+        self, message: str, agent: Agent, item: Dict[str, str], hedge: bool = False
+    ) -> Dict[str, Any]:
+        """
+        Make a decision in "direct" dispatch mode, batched with the decisions of concurrent
+        games if the agent has a `host_batcher`.
+
+        :param message: Message to send to the specialised agent if the decision is not batched
+        :param agent: The specialised agent
+        :param item: The request as part of a batch: the topic and either a question or a
+            topic proposal
+        :param hedge: Whether to hedge the call if the decision is not batched
+        :returns: Parsed JSON response
+        """
+        if self.host_batcher is not None:
+            decision = await self.host_batcher.adecide(item, self.run_config, self.rate_limiter)
+            if decision is not None:
+                response, usage, seconds = decision
+                self.messages.append({"role": "user", "content": message})
+                self.messages.append({"role": "assistant", "content": json.dumps(response)})
+                self.usage.add(usage)
+                self.llm_seconds += seconds
+                return response
+        return await self._arun_agent_and_extract_response(
+            message, agent=agent, include_history=False, hedge=hedge
+        )
+
+    def generate_answer(self, question: str) -> str:
         """
         Generate an answer to the question.
 
         :param question: Question to answer
-        :returns: Tuple of (answer, reasoning)
+        :returns: The answer ('Yes' or 'No')
         """
-        response = self._run_agent_and_extract_response(
-            f"Use the 'get_answer' agent to generate an answer to the question: {question}."
-        )
+        return run_sync(self.agenerate_answer(question))
+
+    async def agenerate_answer(self, question: str) -> str:
+        """
+        Generate an answer to the question.
+
+        :param question: Question to answer
+        :returns: The answer ('Yes' or 'No')
+        """
+        if self.dispatch_mode == "direct":
+            response = await self._adecide(
+                direct_answer_message.format(topic=self.topic, question=question),
+                get_answer_agent,
+                {"topic": self.topic, "question": question},
+                hedge=True,
+            )
+        else:
+            response = await self._arun_agent_and_extract_response(
+                f"Use the 'get_answer' agent to generate an answer to the question: {question}.",
+                hedge=True,
+            )
 
         reasoning, answer = response["reasoning"], response["answer"]
         self._log_internal_dialogue(reasoning)
+        self.memory.record_fact(question, answer)
         return answer
 
     def validate_topic_proposal(self, topic_proposal: str) -> bool:
@@ -161,14 +685,73 @@ class HostAgent(BaseGameAgent):
         :param topic_proposal: Proposed topic to validate
         :returns: True if the proposal is correct, False otherwise
         """
-        response = self._run_agent_and_extract_response(
-            "Use the 'validate_topic_proposal' agent to validate the topic proposal.",
-            context={"topic_proposal": topic_proposal, "topic": self.topic},
-        )
-        reasoning, is_correct = response["reasoning"], response["is_correct"]
-        self._log_internal_dialogue(reasoning)
+        return run_sync(self.avalidate_topic_proposal(topic_proposal))
+
+    async def avalidate_topic_proposal(self, topic_proposal: str) -> bool:
+        """
+        Validate the topic proposal. Clear matches and repeated proposals are decided
+        locally; only ambiguous proposals are sent to the LLM.
+
+        :param topic_proposal: Proposed topic to validate
+        :returns: True if the proposal is correct, False otherwise
+        """
+        canonical_proposal = self.topic_matcher.canonical(topic_proposal)
+        if canonical_proposal in self._topic_proposal_decisions:
+            is_correct = self._topic_proposal_decisions[canonical_proposal]
+            self.topic_matcher.stats["repeated"] += 1
+            self._log_internal_dialogue(
+                f"{topic_proposal} was already proposed and found {'correct' if is_correct else 'incorrect'}.",
+                prefix="local validation",
+            )
+            self._record_validation(topic_proposal, is_correct, decided_by="repeated")
+            return is_correct
+
+        is_correct = self.topic_matcher.match(topic_proposal, self.topic)
+        decided_by = "local" if is_correct is not None else "llm"
+        if is_correct is not None:
+            self._log_internal_dialogue(
+                f"{topic_proposal} {'matches' if is_correct else 'does not match'} the topic {self.topic}.",
+                prefix="local validation",
+            )
+        else:
+            if self.dispatch_mode == "direct":
+                response = await self._adecide(
+                    direct_validate_message.format(
+                        topic=self.topic, topic_proposal=topic_proposal
+                    ),
+                    validate_topic_proposal_agent,
+                    {"topic": self.topic, "topic_proposal": topic_proposal},
+                )
+            else:
+                response = await self._arun_agent_and_extract_response(
+                    "Use the 'validate_topic_proposal' agent to validate the topic proposal.",
+                    context={"topic_proposal": topic_proposal, "topic": self.topic},
+                )
+            reasoning, is_correct = response["reasoning"], response["is_correct"]
+            self._log_internal_dialogue(reasoning)
+
+        self._topic_proposal_decisions[canonical_proposal] = is_correct
+        self._record_validation(topic_proposal, is_correct, decided_by)
         return is_correct
 
+    def _record_validation(self, topic_proposal: str, is_correct: bool, decided_by: str):
+        """
+        Record the validation of a topic proposal in the game records.
+
+        :param topic_proposal: The validated proposal
+        :param is_correct: Whether the proposal is correct
+        :param decided_by: "repeated", "local" or "llm"
+        """
+        self.logger.debug(
+            f"{topic_proposal} validated ({decided_by})",
+            extra=event(
+                "validation",
+                topic_proposal=topic_proposal,
+                is_correct=is_correct,
+                decided_by=decided_by,
+            ),
+        )
+
 
 class GuesserAgent(BaseGameAgent):
     """
@@ -177,6 +760,13 @@ class GuesserAgent(BaseGameAgent):
     :param system_prompt: System prompt for the agent
     :param model: Model to use for this agent
     :param logger: Logger instance to use
+    :param memory: Conversation memory strategy, by name or instance
+    :param dispatch_mode: "handoff" or "direct" (see `BaseGameAgent`)
+    :param rate_limiter: Rate limiter shared by the LLM calls (defaults to the process-wide one)
+    :param model_provider: Provider of the models the agent runs on (defaults to the OpenAI API)
+    :param planner: If given, its suggested questions are handed to the model with every
+        request for a question (see planner.py)
+    :param retry_policy: Retries and timeouts of the LLM calls (defaults to the ones of config.py)
     """
 
     def __init__(
@@ -184,6 +774,12 @@ class GuesserAgent(BaseGameAgent):
         system_prompt: str = SYSTEM_PROMPT_GUESSER,
         model: str | None = model_type_guesser,
         logger: logging.Logger | None = None,
+        memory: str | ConversationMemory | None = None,
+        dispatch_mode: str | None = None,
+        rate_limiter: RateLimiter | None = None,
+        model_provider: ModelProvider | None = None,
+        planner: "QuestionPlanner | None" = None,
+        retry_policy: RetryPolicy | None = None,
     ):
         super().__init__(
             name="Guesser",
@@ -191,18 +787,80 @@ class GuesserAgent(BaseGameAgent):
             model=model,
             handoffs=[get_question_agent],
             logger=logger,
+            rate_limiter=rate_limiter,
+            memory=memory,
+            dispatch_mode=dispatch_mode,
+            model_provider=model_provider,
+            retry_policy=retry_policy,
         )
+        self.planner = planner
+
+    def get_state(self) -> Dict[str, Any]:
+        state = super().get_state()
+        if self.planner is not None:
+            state["planner"] = self.planner.get_state()
+        return state
+
+    def restore_state(self, state: Dict[str, Any]):
+        super().restore_state(state)
+        if self.planner is not None and "planner" in state:
+            self.planner.restore_state(state["planner"])
+
+    def fork(self) -> "GuesserAgent":
+        branch = super().fork()
+        if self.planner is not None:
+            branch.planner = self.planner.copy()
+        return branch
+
+    def merge(self, branch: "GuesserAgent", adopt: bool = True):
+        super().merge(branch, adopt)
+        if adopt:
+            self.planner = branch.planner
+
+    def generate_question(
+        self, round_number: int | None = None, max_num_rounds: int | None = None
+    ) -> Tuple[str, Optional[str]]:
+        """
+        Generate a question about the topic.
 
-    def generate_question(self) -> Tuple[str, Optional[str]]:
+        :param round_number: The round of the game, stated at the end of the request
+        :param max_num_rounds: The maximum number of rounds of the game
+        :returns: Tuple of (question, topic_proposal) where topic_proposal may be None
+        """
+        return run_sync(self.agenerate_question(round_number, max_num_rounds))
+
+    async def agenerate_question(
+        self, round_number: int | None = None, max_num_rounds: int | None = None
+    ) -> Tuple[str, Optional[str]]:
         """
         Generate a question about the topic.
 
+        The volatile parts of the request (the round and the planner's suggestions) come
+        last, after its fixed instruction (see prompt_layout.py).
+
+        :param round_number: The round of the game, stated at the end of the request
+        :param max_num_rounds: The maximum number of rounds of the game
         :returns: Tuple of (question, topic_proposal) where topic_proposal may be None
         """
-        response = self._run_agent_and_extract_response(
-            "Use the appropriate agent to generate a question about the topic."
+        message = (
+            question_message
+            if self.dispatch_mode == "direct"
+            else "Use the appropriate agent to generate a question about the topic."
         )
-        time.sleep(random.randint(1, 5))
+        if round_number is not None:
+            message = f"{message}\n" + round_message.format(
+                round_number=round_number, max_num_rounds=max_num_rounds
+            )
+        suggestion = self.planner.suggest() if self.planner is not None else None
+        if suggestion is not None:
+            self._log_internal_dialogue(suggestion, prefix="planner")
+            message = f"{message}\n{suggestion}"
+        if self.dispatch_mode == "direct":
+            response = await self._arun_agent_and_extract_response(
+                message, agent=get_question_agent
+            )
+        else:
+            response = await self._arun_agent_and_extract_response(message)
 
         question = response["question"]
         reasoning = response["reasoning"]
@@ -222,6 +880,9 @@ class GuesserAgent(BaseGameAgent):
         :param question: The question that was asked
         :param answer: The answer to the question
         """
+        self.memory.record_fact(question, answer)
+        if self.planner is not None:
+            self.planner.observe(question, answer)
         self.messages.append(
             {
                 "role": "user",
@@ -230,6 +891,14 @@ class GuesserAgent(BaseGameAgent):
         )
 
     def acknowledge_bad_topic_proposal(self, topic_proposal: str):
+        """
+        Acknowledge that a topic proposal was rejected.
+
+        :param topic_proposal: The rejected topic proposal
+        """
+        self.memory.record_fact(f"Is the topic {topic_proposal}?", "No")
+        if self.planner is not None:
+            self.planner.reject(topic_proposal)
         self.messages.append(
             {
                 "role": "user",
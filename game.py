@@ -1,65 +1,561 @@
+from __future__ import annotations
+
+import asyncio
 import fire
-from custom_agents import HostAgent, GuesserAgent
-from messages import round_message
+import logging
+import time
 import uuid
-from agents import trace
-from utils import setup_logger
+from typing import TYPE_CHECKING, Any, Awaitable
+from config import (
+    checkpoint_games,
+    hedge_requests,
+    host_batching,
+    question_planner,
+    speculative_execution,
+)
+from game_records import event
+from utils import close_logger, setup_logger, run_sync
+
+# The SDK and the agents are only imported once a game starts, so that the command line
+# (e.g. `python game.py --help`) starts quickly
+if TYPE_CHECKING:
+    from agents import ModelProvider
+    from custom_agents import BaseGameAgent, GuesserAgent, HostAgent
+    from rate_limiter import RateLimiter
 
 
 def play_game(
-    topic: str | None = None, max_num_rounds: int = 20, game_id: uuid.UUID | None = None
-) -> tuple[bool, str]:
+    topic: str | None = None,
+    max_num_rounds: int = 20,
+    game_id: uuid.UUID | None = None,
+    memory_strategy: str | None = None,
+    dispatch_mode: str | None = None,
+    speculative: bool | None = None,
+    hedge: bool | None = None,
+    batch_host: bool | None = None,
+    plan: bool | None = None,
+    checkpoint: bool | None = None,
+    resume: str | bool | None = None,
+    backend: str | None = None,
+    model_provider: ModelProvider | None = None,
+    rate_limiter: RateLimiter | None = None,
+    return_stats: bool = False,
+) -> tuple[bool, str] | tuple[bool, str, dict]:
     """
     Play the game of 20 questions.
 
     :param topic: The topic to be guessed. If not provided, a topic will be generated.
     :param max_num_rounds: The maximum number of rounds to play. Default is 20.
     :param game_id: Unique identifier for the game instance. If None, a new UUID is generated.
-    :return: Tuple containing a boolean indicating if the Guesser wins and the topic.
+    :param memory_strategy: Conversation memory of the agents ("full", "window", "ledger" or
+        "summary"). If None, `memory_strategy` from config.py is used.
+    :param dispatch_mode: "handoff" (the agents route requests through handoffs) or "direct"
+        (the specialised agents are called directly). If None, `dispatch_mode` from config.py is used.
+    :param speculative: Whether to overlap the Host's validation and answer with the Guesser's
+        next question, drafted for both answers. If None, `speculative_execution` from config.py is used.
+    :param hedge: Whether to hedge the Host's slow answers with a duplicate request (see
+        hedging.py). If None, `hedge_requests` from config.py is used.
+    :param batch_host: Whether to batch the Host's decisions with those of concurrent games in
+        "direct" dispatch mode (see host_batching.py). If None, `host_batching` from config.py is used.
+    :param plan: Whether to suggest the most informative questions to the Guesser, planned over a
+        local table of candidate topics (see planner.py). If None, `question_planner` from config.py is used.
+    :param checkpoint: Whether to save a checkpoint of the game after the Guesser's question of
+        every round (see checkpoints.py). If None, `checkpoint_games` from config.py is used.
+    :param resume: ID of a game to resume from its checkpoint, or True to resume the oldest
+        pending checkpoint (a new game is played if there is none). A resumed game keeps its
+        ID, topic, history and usage, and is always checkpointed.
+    :param backend: Backend of the models: "openai" (the API) or "mock" (a local stand-in, see
+        model_backends.py). If None, `model_backend` from config.py is used. Ignored if
+        `model_provider` is given.
+    :param model_provider: Provider of the models the agents run on (defaults to the backend's)
+    :param rate_limiter: Rate limiter of the agents' LLM calls (defaults to the process-wide one)
+    :param return_stats: Whether to also return statistics of the game (rounds played, token
+        usage, time spent waiting on the model).
+    :return: Tuple containing a boolean indicating if the Guesser wins and the topic
+        (and the statistics of the game if `return_stats` is True).
+    """
+    return run_sync(
+        aplay_game(
+            topic=topic,
+            max_num_rounds=max_num_rounds,
+            game_id=game_id,
+            memory_strategy=memory_strategy,
+            dispatch_mode=dispatch_mode,
+            speculative=speculative,
+            hedge=hedge,
+            batch_host=batch_host,
+            plan=plan,
+            checkpoint=checkpoint,
+            resume=resume,
+            backend=backend,
+            model_provider=model_provider,
+            rate_limiter=rate_limiter,
+            return_stats=return_stats,
+        )
+    )
+
+
+async def aplay_game(
+    topic: str | None = None,
+    max_num_rounds: int = 20,
+    game_id: uuid.UUID | None = None,
+    memory_strategy: str | None = None,
+    dispatch_mode: str | None = None,
+    speculative: bool | None = None,
+    hedge: bool | None = None,
+    batch_host: bool | None = None,
+    plan: bool | None = None,
+    checkpoint: bool | None = None,
+    resume: str | bool | None = None,
+    backend: str | None = None,
+    model_provider: ModelProvider | None = None,
+    rate_limiter: RateLimiter | None = None,
+    return_stats: bool = False,
+) -> tuple[bool, str] | tuple[bool, str, dict]:
+    """
+    Play the game of 20 questions on the running event loop.
+
+    Many games can be scheduled concurrently on one loop, since every turn
+    awaits the model instead of blocking the thread.
+
+    :param topic: The topic to be guessed. If not provided, a topic will be generated.
+    :param max_num_rounds: The maximum number of rounds to play. Default is 20.
+    :param game_id: Unique identifier for the game instance. If None, a new UUID is generated.
+    :param memory_strategy: Conversation memory of the agents ("full", "window", "ledger" or
+        "summary"). If None, `memory_strategy` from config.py is used.
+    :param dispatch_mode: "handoff" (the agents route requests through handoffs) or "direct"
+        (the specialised agents are called directly). If None, `dispatch_mode` from config.py is used.
+    :param speculative: Whether to overlap the Host's validation and answer with the Guesser's
+        next question, drafted for both answers. If None, `speculative_execution` from config.py is used.
+    :param hedge: Whether to hedge the Host's slow answers with a duplicate request (see
+        hedging.py). If None, `hedge_requests` from config.py is used.
+    :param batch_host: Whether to batch the Host's decisions with those of concurrent games in
+        "direct" dispatch mode (see host_batching.py). If None, `host_batching` from config.py is used.
+    :param plan: Whether to suggest the most informative questions to the Guesser, planned over a
+        local table of candidate topics (see planner.py). If None, `question_planner` from config.py is used.
+    :param checkpoint: Whether to save a checkpoint of the game after the Guesser's question of
+        every round (see checkpoints.py). If None, `checkpoint_games` from config.py is used.
+    :param resume: ID of a game to resume from its checkpoint, or True to resume the oldest
+        pending checkpoint (a new game is played if there is none). A resumed game keeps its
+        ID, topic, history and usage, and is always checkpointed.
+    :param backend: Backend of the models: "openai" (the API) or "mock" (a local stand-in, see
+        model_backends.py). If None, `model_backend` from config.py is used. Ignored if
+        `model_provider` is given.
+    :param model_provider: Provider of the models the agents run on (defaults to the backend's)
+    :param rate_limiter: Rate limiter of the agents' LLM calls (defaults to the process-wide one)
+    :param return_stats: Whether to also return statistics of the game (rounds played, token
+        usage, time spent waiting on the model).
+    :return: Tuple containing a boolean indicating if the Guesser wins and the topic
+        (and the statistics of the game if `return_stats` is True).
     """
+    resumed = None
+    if resume:
+        from checkpoints import CheckpointStore
+
+        store = CheckpointStore()
+        if resume is True:
+            resumed = store.claim()
+        else:
+            resumed = store.load(resume)
+            if resumed is None:
+                raise ValueError(f"No checkpoint of the game {resume} in {store.directory}.")
+    if resumed is not None:
+        game_id = resumed["game_id"]
+        topic = resumed["host"]["topic"]
+        max_num_rounds = resumed["max_num_rounds"]
     if game_id is None:
         game_id = uuid.uuid4()
+    start_time = time.perf_counter()
+
+    if model_provider is None:
+        from model_backends import get_backend
+
+        model_provider, backend_rate_limiter = get_backend(backend)
+        rate_limiter = rate_limiter or backend_rate_limiter
 
     logger = setup_logger(game_id)
-    logger.info(f"Let's play the game of {max_num_rounds} questions!")
-    host_agent = HostAgent(topic=topic, logger=logger)
-    guesser_agent = GuesserAgent(logger=logger)
+    try:
+        return await _aplay_game(
+            logger,
+            game_id,
+            start_time,
+            topic,
+            max_num_rounds,
+            memory_strategy,
+            dispatch_mode,
+            speculative,
+            hedge,
+            batch_host,
+            plan,
+            checkpoint,
+            resumed,
+            model_provider,
+            rate_limiter,
+            return_stats,
+        )
+    finally:
+        # Long-running workers play many games: release the game's log file and logger
+        close_logger(logger)
+
+
+async def _aplay_game(
+    logger: logging.Logger,
+    game_id: uuid.UUID,
+    start_time: float,
+    topic: str | None,
+    max_num_rounds: int,
+    memory_strategy: str | None,
+    dispatch_mode: str | None,
+    speculative: bool | None,
+    hedge: bool | None,
+    batch_host: bool | None,
+    plan: bool | None,
+    checkpoint: bool | None,
+    resumed: dict[str, Any] | None,
+    model_provider: ModelProvider,
+    rate_limiter: RateLimiter | None,
+    return_stats: bool,
+) -> tuple[bool, str] | tuple[bool, str, dict]:
+    """
+    Play the game of 20 questions with the game's logger (see `aplay_game`).
+    """
+    from agents import trace
+    from batch import BatchModelProvider
+    from custom_agents import GuesserAgent, HostAgent
+    from hedging import get_hedger
+    from host_batching import get_host_batcher
+    from checkpoints import CheckpointStore, capture_checkpoint
+    from prompt_layout import CachedUsage
+    from retry import RetryPolicy
+
+    if resumed is None:
+        logger.info(f"Let's play the game of {max_num_rounds} questions!")
+    else:
+        logger.info(f"Resuming the game of {max_num_rounds} questions at step {resumed['round']}.")
+    agent_kwargs = {
+        "logger": logger,
+        "memory": memory_strategy,
+        "dispatch_mode": dispatch_mode,
+        "rate_limiter": rate_limiter,
+        "model_provider": model_provider,
+    }
+    if hedge is None:
+        hedge = hedge_requests
+    if batch_host is None:
+        batch_host = host_batching
+    if isinstance(model_provider, BatchModelProvider):
+        # A batched request waits for its whole batch, up to the batch's completion window
+        agent_kwargs["retry_policy"] = RetryPolicy(attempt_timeout=None, deadline=None)
+        # The decisions of all games are batched already, and a decision the Host batcher
+        # waits on would not count its game as waiting on the batch
+        batch_host = False
+    host_agent = await HostAgent.acreate(
+        topic=topic,
+        hedger=get_hedger() if hedge else None,
+        host_batcher=get_host_batcher() if batch_host else None,
+        **agent_kwargs,
+    )
+    if plan is None:
+        plan = question_planner
+    planner = None
+    if plan:
+        from planner import QuestionPlanner, get_candidate_index
+
+        planner = QuestionPlanner(get_candidate_index())
+    guesser_agent = GuesserAgent(planner=planner, **agent_kwargs)
+    if resumed is not None:
+        host_agent.restore_state(resumed["host"])
+        guesser_agent.restore_state(resumed["guesser"])
+    if speculative is None:
+        speculative = speculative_execution
+    if checkpoint is None:
+        checkpoint = checkpoint_games
+    checkpoints = CheckpointStore() if checkpoint or resumed is not None else None
+    logger.debug(
+        "Game started",
+        extra=event(
+            "game_start",
+            topic=host_agent.topic,
+            max_num_rounds=max_num_rounds,
+            memory=type(guesser_agent.memory).__name__,
+            dispatch_mode=guesser_agent.dispatch_mode,
+            speculative=speculative,
+            hedge=hedge,
+            batch_host=batch_host,
+            plan=plan,
+            resumed_round=resumed["round"] if resumed is not None else None,
+        ),
+    )
+    speculation = {"seconds_saved": 0.0, "branches_discarded": 0, "tokens_discarded": 0}
+
+    def finish(guesser_wins: bool, num_rounds: int):
+        if checkpoints is not None:
+            checkpoints.delete(game_id)
+        usage = {}
+        total_tokens = 0
+        for agent in (host_agent, guesser_agent):
+            agent_usage = CachedUsage()
+            agent_usage.add(agent.usage)
+            agent_usage.add(agent.memory.usage)
+            usage[agent.name] = {
+                "requests": agent_usage.requests,
+                "input_tokens": agent_usage.input_tokens,
+                "cached_input_tokens": agent_usage.cached_input_tokens,
+                "output_tokens": agent_usage.output_tokens,
+                "llm_seconds": agent.llm_seconds,
+            }
+            total_tokens += agent_usage.total_tokens
+        duration = time.perf_counter() - start_time
+        logger.info(
+            f"Tokens used: {total_tokens} ({usage})",
+            extra=event(
+                "game_end",
+                topic=host_agent.topic,
+                guesser_wins=guesser_wins,
+                num_rounds=num_rounds,
+                duration=duration,
+                total_tokens=total_tokens,
+                usage=usage,
+            ),
+        )
+        if not return_stats:
+            return guesser_wins, host_agent.topic
+        stats = {
+            "num_rounds": num_rounds,
+            "duration": duration,
+            "total_tokens": total_tokens,
+            "usage": usage,
+        }
+        if speculative:
+            stats["speculation"] = speculation
+        return guesser_wins, host_agent.topic, stats
 
     with trace(f"game-{game_id}"):
-        for step in range(max_num_rounds):
+        next_question_branch = None
+        first_round = resumed["round"] if resumed is not None else 0
+        for step in range(first_round, max_num_rounds):
             logger.info("----------------------------------------")
             logger.info(f"Step {step} of the game")
 
-            guesser_agent.messages.append(
-                {
-                    "role": "user",
-                    "content": round_message.format(
-                        round_number=step, max_num_rounds=max_num_rounds
+            if resumed is not None:
+                # Asked before the game failed: the round restarts from the Host's side
+                question, topic_proposal = resumed["question"], resumed["topic_proposal"]
+                resumed = None
+            elif next_question_branch is not None:
+                # Drafted during the previous round, for the answer the Host gave
+                branch, (question, topic_proposal) = next_question_branch
+                guesser_agent.merge(branch)
+            else:
+                question, topic_proposal = await guesser_agent.agenerate_question(
+                    step, max_num_rounds
+                )
+
+            if checkpoints is not None:
+                await checkpoints.asave(
+                    game_id,
+                    capture_checkpoint(
+                        game_id,
+                        step,
+                        max_num_rounds,
+                        question,
+                        topic_proposal,
+                        host_agent,
+                        guesser_agent,
                     ),
-                }
-            )
-            question, topic_proposal = guesser_agent.generate_question()
+                )
+
+            if speculative:
+                is_correct, next_question_branch = await _aplay_round_speculatively(
+                    host_agent,
+                    guesser_agent,
+                    question,
+                    topic_proposal,
+                    next_round=step + 1,
+                    max_num_rounds=max_num_rounds,
+                    speculation=speculation,
+                )
+                if is_correct:
+                    logger.info(f"Guesser wins! The topic is {host_agent.topic}")
+                    return finish(True, step + 1)
+                continue
+
             if topic_proposal is not None:
                 # Host optionally validates the topic proposal
-                is_correct = host_agent.validate_topic_proposal(topic_proposal)
+                is_correct = await host_agent.avalidate_topic_proposal(topic_proposal)
                 if is_correct:
                     logger.info(f"Guesser wins! The topic is {host_agent.topic}")
-                    return True, host_agent.topic
+                    return finish(True, step + 1)
                 else:
                     logger.info(f"Host: {topic_proposal} is not correct. Try again.")
                     guesser_agent.acknowledge_bad_topic_proposal(topic_proposal)
 
-            logger.info(f"Guesser: {question}")
+            logger.info(
+                f"Guesser: {question}",
+                extra=event(
+                    "question",
+                    round=step,
+                    question=question,
+                    topic_proposal=topic_proposal,
+                ),
+            )
 
             # Host actions
-            answer = host_agent.generate_answer(question)
-            logger.info(f"Host: {answer}")
+            answer = await host_agent.agenerate_answer(question)
+            logger.info(
+                f"Host: {answer}",
+                extra=event("answer", round=step, question=question, answer=answer),
+            )
             guesser_agent.acknowledge_answer(question, answer)
 
         logger.info(
             f"The Guesser has not guessed the topic in {step + 1} steps. The Guesser loses!"
         )
-        return False, host_agent.topic
+        return finish(False, step + 1)
+
+
+async def _timed(awaitable: Awaitable[Any]) -> tuple[Any, float]:
+    """
+    Await and measure how long it took.
+
+    :param awaitable: Coroutine or task to await
+    :returns: Tuple of (result, seconds)
+    """
+    start_time = time.perf_counter()
+    result = await awaitable
+    return result, time.perf_counter() - start_time
+
+
+async def _discard(
+    agent: BaseGameAgent,
+    branch: BaseGameAgent,
+    task: asyncio.Task,
+    speculation: dict,
+):
+    """
+    Cancel a speculative branch and account for the tokens it already spent.
+
+    :param agent: Agent the branch was forked from
+    :param branch: The discarded branch
+    :param task: Task running the branch's request
+    :param speculation: Speculation statistics of the game, updated in place
+    """
+    task.cancel()
+    await asyncio.gather(task, return_exceptions=True)
+    agent.merge(branch, adopt=False)
+    speculation["branches_discarded"] += 1
+    speculation["tokens_discarded"] += (
+        branch.usage.total_tokens + branch.memory.usage.total_tokens
+    )
+
+
+async def _aplay_round_speculatively(
+    host_agent: HostAgent,
+    guesser_agent: GuesserAgent,
+    question: str,
+    topic_proposal: str | None,
+    next_round: int,
+    max_num_rounds: int,
+    speculation: dict,
+) -> tuple[bool, tuple[GuesserAgent, tuple[str, str | None]] | None]:
+    """
+    Play the Host's side of a round with the independent calls overlapped.
+
+    The validation of the topic proposal and the answer run concurrently, while the
+    Guesser drafts its next question for both a "Yes" and a "No" answer (assuming the
+    proposal, if any, is rejected). Once the Host has answered, the matching draft is
+    kept and the other one is cancelled. The history of each agent ends up the same
+    as in a sequential round, except that the Host's answer does not see the validation.
+
+    :param host_agent: The Host
+    :param guesser_agent: The Guesser
+    :param question: The Guesser's question
+    :param topic_proposal: The Guesser's topic proposal, if any
+    :param next_round: Number of the next round
+    :param max_num_rounds: The maximum number of rounds
+    :param speculation: Speculation statistics of the game, updated in place
+    :returns: Tuple of (whether the proposal is correct, the Guesser branch holding the
+        next question together with that question, or None if there is no next round)
+    """
+    logger = host_agent.logger
+    start_time = time.perf_counter()
+    tasks = []
+    try:
+        if topic_proposal is not None:
+            validation_branch = host_agent.fork()
+            validation_task = asyncio.create_task(
+                _timed(validation_branch.avalidate_topic_proposal(topic_proposal))
+            )
+            tasks.append(validation_task)
+        answer_branch = host_agent.fork()
+        answer_task = asyncio.create_task(
+            _timed(answer_branch.agenerate_answer(question))
+        )
+        tasks.append(answer_task)
+
+        drafts = {}
+        if next_round < max_num_rounds:
+            for candidate_answer in ("Yes", "No"):
+                branch = guesser_agent.fork()
+                if topic_proposal is not None:
+                    branch.acknowledge_bad_topic_proposal(topic_proposal)
+                branch.acknowledge_answer(question, candidate_answer)
+                task = asyncio.create_task(
+                    _timed(branch.agenerate_question(next_round, max_num_rounds))
+                )
+                tasks.append(task)
+                drafts[candidate_answer] = branch, task
+
+        validation_seconds = 0.0
+        if topic_proposal is not None:
+            is_correct, validation_seconds = await validation_task
+            host_agent.merge(validation_branch)
+            if is_correct:
+                # The game is over: neither the answer nor the next question is needed
+                await _discard(host_agent, answer_branch, answer_task, speculation)
+                for branch, task in drafts.values():
+                    await _discard(guesser_agent, branch, task, speculation)
+                return True, None
+            logger.info(f"Host: {topic_proposal} is not correct. Try again.")
+
+        step = next_round - 1
+        logger.info(
+            f"Guesser: {question}",
+            extra=event(
+                "question", round=step, question=question, topic_proposal=topic_proposal
+            ),
+        )
+        answer, answer_seconds = await answer_task
+        host_agent.merge(answer_branch)
+        logger.info(
+            f"Host: {answer}",
+            extra=event("answer", round=step, question=question, answer=answer),
+        )
+
+        if answer not in drafts:
+            # Last round (or an answer no draft was made for): acknowledge on the Guesser itself
+            for branch, task in drafts.values():
+                await _discard(guesser_agent, branch, task, speculation)
+            if topic_proposal is not None:
+                guesser_agent.acknowledge_bad_topic_proposal(topic_proposal)
+            guesser_agent.acknowledge_answer(question, answer)
+            return False, None
+
+        for candidate_answer, (branch, task) in drafts.items():
+            if candidate_answer != answer:
+                await _discard(guesser_agent, branch, task, speculation)
+        branch, task = drafts[answer]
+        next_question, question_seconds = await task
+
+        # Time the round would have taken with the calls made one after another
+        sequential_seconds = validation_seconds + answer_seconds + question_seconds
+        speculation["seconds_saved"] += max(
+            0.0, sequential_seconds - (time.perf_counter() - start_time)
+        )
+        return False, (branch, next_question)
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
 
 
 if __name__ == "__main__":
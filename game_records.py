@@ -0,0 +1,88 @@
+"""
+Structured, machine-readable records of the games.
+
+Besides the human-readable text log, every game emits events (game start, questions,
+validations, answers, LLM calls, game end) as log records carrying an `event` payload.
+The log writer (see log_writer.py) appends them as compact JSON lines (`event_line`) to
+one file shared by all games and worker processes, and `read_game_events` / `load_games`
+read them back without parsing any text.
+"""
+
+import json
+import logging
+import re
+from collections import defaultdict
+from typing import Any, Iterable, Iterator
+from config import game_records_path
+
+
+def event(name: str, **fields: Any) -> dict[str, Any]:
+    """
+    Build the `extra` argument of a logging call that records a structured event,
+    e.g. `logger.info("Host: Yes", extra=event("answer", answer="Yes"))`.
+
+    :param name: Name of the event
+    :param fields: Fields of the event (JSON-serialisable)
+    :returns: The `extra` mapping of the log record
+    """
+    return {"event": {"event": name, **fields}}
+
+
+def event_line(game_id: Any, record: logging.LogRecord) -> str | None:
+    """
+    Serialise the event of a log record as a compact JSON line.
+
+    :param game_id: Identifier of the game, added to the event
+    :param record: The log record
+    :returns: The line (without a newline), or None if the record carries no event
+    """
+    payload = getattr(record, "event", None)
+    if payload is None:
+        return None
+    return json.dumps(
+        {"game_id": str(game_id), "time": record.created, **payload},
+        separators=(",", ":"),
+        default=str,
+    )
+
+
+def read_game_events(
+    path: str = game_records_path, events: Iterable[str] | None = None
+) -> Iterator[dict[str, Any]]:
+    """
+    Read the events of the recorded games, in the order they were written.
+
+    :param path: Path of the JSON lines file
+    :param events: Names of the events to read (all events if None). Lines of other
+        events are skipped without being parsed.
+    :returns: Iterator over the events
+    """
+    wanted = set(events) if events is not None else None
+    marker = (
+        re.compile("|".join(re.escape(f'"event":"{name}"') for name in wanted))
+        if wanted is not None
+        else None
+    )
+    with open(path) as f:
+        for line in f:
+            if marker is not None and marker.search(line) is None:
+                continue
+            record = json.loads(line)
+            if wanted is None or record["event"] in wanted:
+                yield record
+
+
+def load_games(
+    path: str = game_records_path, events: Iterable[str] | None = None
+) -> dict[str, list[dict[str, Any]]]:
+    """
+    Load the recorded games.
+
+    :param path: Path of the JSON lines file
+    :param events: Names of the events to load (all events if None)
+    :returns: Mapping of game ID to the game's events, in order
+    """
+    games = defaultdict(list)
+    for record in read_game_events(path, events):
+        games[record["game_id"]].append(record)
+    return dict(games)
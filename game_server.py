@@ -0,0 +1,398 @@
+"""
+Long-lived game server with a pool of warm worker processes.
+
+Starting a tournament with `parallel_game.py` spins up new processes, each importing the
+SDK and building its agents and HTTP connections before the first game can start. The
+game server pays for that once: its workers stay up between tournaments, each running
+many games on its own event loop with warm connection pools (see clients.py). Tournaments
+are submitted over a local socket and their results are streamed back as games finish:
+
+    python game_server.py serve --num_workers 4                             # start the server
+    python parallel_game.py --num_games 200 --mode server                   # run a tournament on it
+    python game_server.py stop                                              # stop the server
+
+The connections are authenticated with a random key the server generates at start and
+writes to `game_server_authkey_path`, readable by its owner only (the messages are
+pickled, so whoever holds the key can run code in the server). The `GAME_SERVER_AUTHKEY`
+environment variable, if set, is used instead on both sides (e.g. for a server on another
+host).
+"""
+
+import asyncio
+import itertools
+import multiprocessing
+import os
+import queue
+import secrets
+import threading
+from multiprocessing.connection import Client, Connection, Listener
+from typing import Any, Callable
+import fire
+from config import (
+    game_server_authkey_path,
+    game_server_host,
+    game_server_port,
+    max_concurrent_games_per_loop,
+)
+from game import aplay_game
+from log_writer import flush_logs
+from metrics import clear_metrics, get_metrics, start_metrics_run, write_metrics_snapshot
+from utils import run_sync
+
+# Environment variable overriding the key of the connections
+AUTHKEY_ENV_VAR = "GAME_SERVER_AUTHKEY"
+
+
+def metrics_run_name(port: int = game_server_port) -> str:
+    """
+    Get the name of the metrics run of the server listening on a port (see
+    `metrics.start_metrics_run`), which its clients join to collect the metrics of its workers.
+
+    :param port: Port of the server
+    :returns: The name of the run
+    """
+    return f"server_{port}"
+
+
+def create_authkey(path: str = game_server_authkey_path) -> bytes:
+    """
+    Create the key of the server's connections: a new random key written to a file only
+    its owner can read, unless `GAME_SERVER_AUTHKEY` is set.
+
+    :param path: Path of the key file
+    :returns: The key
+    """
+    if os.environ.get(AUTHKEY_ENV_VAR):
+        return os.environ[AUTHKEY_ENV_VAR].encode()
+    authkey = secrets.token_hex(32).encode()
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    # Created afresh with owner-only permissions, then moved over any previous key
+    temporary_path = f"{path}.tmp"
+    try:
+        os.remove(temporary_path)
+    except FileNotFoundError:
+        pass
+    with os.fdopen(os.open(temporary_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600), "wb") as f:
+        f.write(authkey)
+    os.replace(temporary_path, path)
+    return authkey
+
+
+def read_authkey(path: str = game_server_authkey_path) -> bytes:
+    """
+    Read the key of the server's connections: `GAME_SERVER_AUTHKEY` if set, else the key
+    file written by the server.
+
+    :param path: Path of the key file
+    :returns: The key
+    :raises FileNotFoundError: If there is no key file (e.g. the server was never started)
+    """
+    if os.environ.get(AUTHKEY_ENV_VAR):
+        return os.environ[AUTHKEY_ENV_VAR].encode()
+    try:
+        with open(path, "rb") as f:
+            return f.read()
+    except FileNotFoundError:
+        raise FileNotFoundError(
+            f"No game server key at {path}: start the server, or set {AUTHKEY_ENV_VAR}"
+        ) from None
+
+
+async def _aplay_game_safely(game_id: int, game_kwargs: dict[str, Any]) -> tuple[Any, str | None]:
+    """
+    Play a game, turning its failure into an error message.
+
+    :param game_id: ID of the game within its tournament
+    :param game_kwargs: Keyword arguments for `aplay_game`
+    :returns: Tuple of (result of the game, error message)
+    """
+    try:
+        return await aplay_game(**game_kwargs, return_stats=True), None
+    except Exception as e:
+        return None, f"Game {game_id} failed: {e!r}"
+    finally:
+        write_metrics_snapshot()
+
+
+async def _aserve_jobs(
+    jobs: multiprocessing.Queue,
+    results: multiprocessing.Queue,
+    resets: multiprocessing.Queue,
+    acks: multiprocessing.Queue,
+    max_concurrent: int,
+):
+    """
+    Play the games queued in `jobs` on the worker's event loop, at most `max_concurrent`
+    at a time, until the None sentinel is received. Meanwhile, reset the worker's metrics
+    whenever asked to through `resets`, acknowledging on `acks`.
+    """
+    loop = asyncio.get_running_loop()
+    semaphore = asyncio.Semaphore(max_concurrent)
+    games = set()
+
+    async def reset_metrics():
+        while await loop.run_in_executor(None, resets.get) is not None:
+            get_metrics().reset()
+            # Overwrite the snapshot of the previous tournament
+            write_metrics_snapshot()
+            acks.put(None)
+
+    resetter = asyncio.create_task(reset_metrics())
+
+    async def play(request_id: int, game_id: int, game_kwargs: dict[str, Any]):
+        try:
+            outcome = await _aplay_game_safely(game_id, game_kwargs)
+            results.put((request_id, game_id, outcome))
+        finally:
+            semaphore.release()
+
+    while True:
+        # Only take a job once it can start, so idle workers pick up the rest
+        await semaphore.acquire()
+        job = await loop.run_in_executor(None, jobs.get)
+        if job is None:
+            break
+        game = asyncio.create_task(play(*job))
+        games.add(game)
+        game.add_done_callback(games.discard)
+    await asyncio.gather(*games, resetter)
+
+
+def _worker(
+    jobs: multiprocessing.Queue,
+    results: multiprocessing.Queue,
+    resets: multiprocessing.Queue,
+    acks: multiprocessing.Queue,
+    max_concurrent: int,
+):
+    """
+    Entry point of a worker process. The event loop (and with it the pooled HTTP
+    connections) lives as long as the worker.
+    """
+    try:
+        run_sync(_aserve_jobs(jobs, results, resets, acks, max_concurrent))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        # Worker processes exit without running the exit handlers that write the queued logs
+        flush_logs()
+
+
+class GameServer:
+    """
+    Server running the games of the tournaments submitted by `GameClient` on a pool of
+    warm worker processes. The metrics of the workers are reset when a tournament starts
+    while no other is running, so a tournament's summary only counts its own games (the
+    metrics of concurrent tournaments are shared).
+
+    :param num_workers: Number of worker processes (defaults to the CPU count)
+    :param max_concurrent: Maximum number of games in flight per worker
+    :param host: Host to listen on
+    :param port: Port to listen on
+    :param authkey_path: Path of the file the key of the connections is written to
+    """
+
+    def __init__(
+        self,
+        num_workers: int | None = None,
+        max_concurrent: int = max_concurrent_games_per_loop,
+        host: str = game_server_host,
+        port: int = game_server_port,
+        authkey_path: str = game_server_authkey_path,
+    ):
+        self.num_workers = num_workers or multiprocessing.cpu_count()
+        self.max_concurrent = max_concurrent
+        self.address = (host, port)
+        self.authkey_path = authkey_path
+        self._authkey: bytes | None = None
+        self._jobs = multiprocessing.Queue()
+        self._results = multiprocessing.Queue()
+        # Requests to reset the metrics, one queue per worker, and their acknowledgements
+        self._resets: list[multiprocessing.Queue] = []
+        self._acks = multiprocessing.Queue()
+        self._workers: list[multiprocessing.Process] = []
+        self._requests: dict[int, queue.Queue] = {}
+        self._request_ids = itertools.count()
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+
+    def serve(self):
+        """
+        Start the workers and serve tournaments until a client asks the server to stop.
+        """
+        self._authkey = create_authkey(self.authkey_path)
+        # Drop the snapshots left by a previous server on this port
+        start_metrics_run(metrics_run_name(self.address[1]))
+        clear_metrics()
+        for _ in range(self.num_workers):
+            resets = multiprocessing.Queue()
+            worker = multiprocessing.Process(
+                target=_worker,
+                args=(self._jobs, self._results, resets, self._acks, self.max_concurrent),
+                daemon=True,
+            )
+            worker.start()
+            self._workers.append(worker)
+            self._resets.append(resets)
+        threading.Thread(target=self._route_results, daemon=True).start()
+
+        with Listener(self.address, authkey=self._authkey) as listener:
+            print(
+                f"Game server listening on {self.address[0]}:{self.address[1]} "
+                f"with {self.num_workers} workers"
+            )
+            while not self._stopped.is_set():
+                try:
+                    connection = listener.accept()
+                except (OSError, EOFError, multiprocessing.AuthenticationError):
+                    continue  # e.g. a client with the wrong authkey
+                threading.Thread(target=self._handle, args=(connection,), daemon=True).start()
+
+        for resets in self._resets:
+            resets.put(None)
+        for _ in self._workers:
+            self._jobs.put(None)
+        for worker in self._workers:
+            worker.join(timeout=30)
+
+    def _route_results(self):
+        """
+        Forward the results of the workers to the connections that requested them.
+        """
+        while True:
+            request_id, game_id, outcome = self._results.get()
+            with self._lock:
+                results = self._requests.get(request_id)
+            if results is not None:
+                results.put((game_id, outcome))
+
+    def _reset_metrics(self):
+        """
+        Reset the metrics of every worker, waiting until they are reset.
+        """
+        for resets in self._resets:
+            resets.put(True)
+        for _ in self._resets:
+            try:
+                self._acks.get(timeout=30)
+            except queue.Empty:
+                break  # A worker is stuck or gone; its metrics are counted anyway
+
+    def _handle(self, connection: Connection):
+        """
+        Serve one client connection: queue the games of its tournament and stream their
+        results back as they finish.
+        """
+        with connection:
+            try:
+                request = connection.recv()
+            except EOFError:
+                return
+            if request["type"] == "stop":
+                self._stopped.set()
+                connection.send(("stopped", None, None))
+                # Wake up the listener, which is blocked on accept
+                try:
+                    Client(self.address, authkey=self._authkey).close()
+                except OSError:
+                    pass
+                return
+
+            request_id = next(self._request_ids)
+            results = queue.Queue()
+            with self._lock:
+                if not self._requests:
+                    self._reset_metrics()
+                self._requests[request_id] = results
+            try:
+                for game_id in range(request["num_games"]):
+                    self._jobs.put((request_id, game_id, request["game_kwargs"]))
+                for _ in range(request["num_games"]):
+                    game_id, outcome = results.get()
+                    connection.send(("result", game_id, outcome))
+                connection.send(("done", None, None))
+            except (OSError, EOFError):
+                pass  # The client went away; the games already queued still run
+            finally:
+                with self._lock:
+                    del self._requests[request_id]
+
+
+class GameClient:
+    """
+    Client submitting tournaments to a running `GameServer`.
+
+    :param host: Host of the server
+    :param port: Port of the server
+    :param authkey_path: Path of the file holding the key of the connections
+    """
+
+    def __init__(
+        self,
+        host: str = game_server_host,
+        port: int = game_server_port,
+        authkey_path: str = game_server_authkey_path,
+    ):
+        self.address = (host, port)
+        self.authkey_path = authkey_path
+
+    def play(
+        self,
+        num_games: int,
+        game_kwargs: dict[str, Any] | None = None,
+        on_complete: Callable[[tuple[Any, str | None]], None] | None = None,
+    ) -> list[tuple[Any, str | None]] | None:
+        """
+        Play a tournament on the server.
+
+        :param num_games: Number of games to play
+        :param game_kwargs: Keyword arguments for `aplay_game` (must be picklable)
+        :param on_complete: Optional callback called with (result, error) as each game finishes
+        :returns: A list of (result, error) tuples in completion order, or None if
+            `on_complete` is given (the outcomes are then only passed to the callback)
+        """
+        outcomes = [] if on_complete is None else None
+        with Client(self.address, authkey=read_authkey(self.authkey_path)) as connection:
+            connection.send(
+                {"type": "play", "num_games": num_games, "game_kwargs": game_kwargs or {}}
+            )
+            while True:
+                kind, _, outcome = connection.recv()
+                if kind == "done":
+                    break
+                if on_complete is not None:
+                    on_complete(outcome)
+                else:
+                    outcomes.append(outcome)
+        return outcomes
+
+    def stop(self):
+        """
+        Stop the server (the games in flight are finished first).
+        """
+        with Client(self.address, authkey=read_authkey(self.authkey_path)) as connection:
+            connection.send({"type": "stop"})
+            connection.recv()
+
+
+def serve(
+    num_workers: int | None = None,
+    max_concurrent: int = max_concurrent_games_per_loop,
+    host: str = game_server_host,
+    port: int = game_server_port,
+):
+    """
+    Start the game server (see `GameServer`).
+    """
+    GameServer(num_workers, max_concurrent, host, port).serve()
+
+
+def stop(host: str = game_server_host, port: int = game_server_port):
+    """
+    Stop a running game server.
+    """
+    GameClient(host, port).stop()
+
+
+if __name__ == "__main__":
+    fire.Fire({"serve": serve, "stop": stop})
@@ -0,0 +1,166 @@
+"""
+Hedged requests for the latency-critical LLM calls.
+
+The game loop is sequential, so a single slow answer of the Host stalls the whole game.
+When a hedged call has not returned after the `hedge_percentile` latency of recent calls,
+a duplicate request is sent on a branch of the agent (see `BaseGameAgent.fork`) and the
+first response wins; the other request is cancelled. The duplicates are capped at
+`hedge_budget` extra requests per call, so the extra spend stays bounded even when the
+model slows down as a whole.
+"""
+
+import asyncio
+import os
+import time
+from collections import deque
+from typing import TYPE_CHECKING, Any, Awaitable, Callable
+from config import hedge_budget, hedge_min_samples, hedge_percentile, hedge_window
+from metrics import get_metrics
+
+if TYPE_CHECKING:
+    from custom_agents import BaseGameAgent
+
+
+class RequestHedger:
+    """
+    Hedges calls once they take longer than a percentile of the recent latencies of
+    the same kind of call.
+
+    :param percentile: Percentile of the recent latencies after which a call is hedged
+    :param min_samples: Number of latencies observed before the first hedge
+    :param budget: Maximum number of hedges per call (e.g. 0.05: one hedge per 20 calls)
+    :param window: Number of recent latencies kept per kind of call
+    """
+
+    def __init__(
+        self,
+        percentile: float = hedge_percentile,
+        min_samples: int = hedge_min_samples,
+        budget: float = hedge_budget,
+        window: int = hedge_window,
+    ):
+        self.percentile = percentile
+        self.min_samples = min_samples
+        self.budget = budget
+        self.window = window
+        self._latencies: dict[str, deque[float]] = {}
+        self.num_calls = 0
+        self.num_hedges = 0
+
+    def hedge_delay(self, key: str) -> float | None:
+        """
+        Seconds after which a call is hedged.
+
+        :param key: Kind of call (e.g. "Host/get_answer")
+        :returns: The delay, or None if too few latencies were observed
+        """
+        latencies = self._latencies.get(key)
+        if latencies is None or len(latencies) < self.min_samples:
+            return None
+        ordered = sorted(latencies)
+        return ordered[min(len(ordered) - 1, int(self.percentile * len(ordered)))]
+
+    def observe(self, key: str, seconds: float):
+        """
+        Record the latency of a request (the first one of a call, hedged or not).
+
+        :param key: Kind of call
+        :param seconds: Latency in seconds
+        """
+        if key not in self._latencies:
+            self._latencies[key] = deque(maxlen=self.window)
+        self._latencies[key].append(seconds)
+
+    async def arun(
+        self,
+        agent: "BaseGameAgent",
+        key: str,
+        call: Callable[["BaseGameAgent"], Awaitable[Any]],
+    ) -> Any:
+        """
+        Run a call on the agent, hedging it if it is slow and the budget allows.
+
+        :param agent: The agent making the call
+        :param key: Kind of call, whose latencies set the hedging delay
+        :param call: Function making the call on the agent it is given (the agent
+            itself, or one of its branches)
+        :returns: The result of the first request to succeed
+        """
+        metrics = get_metrics()
+        self.num_calls += 1
+        start_time = time.perf_counter()
+        delay = self.hedge_delay(key)
+        if delay is None or self.num_hedges + 1 > self.budget * self.num_calls:
+            try:
+                return await call(agent)
+            finally:
+                seconds = time.perf_counter() - start_time
+                self.observe(key, seconds)
+                metrics.observe("llm_hedged_call_seconds", seconds, call=key, request="first")
+                metrics.observe("llm_hedged_call_seconds", seconds, call=key, request="effective")
+
+        primary = agent.fork()
+        primary_task = asyncio.create_task(call(primary))
+        primary_seconds = []
+        primary_task.add_done_callback(
+            lambda task: task.cancelled()
+            or primary_seconds.append(time.perf_counter() - start_time)
+        )
+        branches = {primary_task: primary}
+        try:
+            done, _ = await asyncio.wait({primary_task}, timeout=delay)
+            # Checked again once the hedge is due: concurrent calls may have taken the budget
+            # meanwhile (the check and the increment are not separated by an await)
+            if not done and self.num_hedges + 1 <= self.budget * self.num_calls:
+                self.num_hedges += 1
+                metrics.increment("llm_hedges_total", call=key)
+                hedge = agent.fork()
+                branches[asyncio.create_task(call(hedge))] = hedge
+            winner = None
+            pending = set(branches)
+            while winner is None and pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                winner = next((task for task in done if task.exception() is None), None)
+        finally:
+            for task in branches:
+                task.cancel()
+            await asyncio.gather(*branches, return_exceptions=True)
+
+        seconds = time.perf_counter() - start_time
+        # Latency of the first request or, if it was cancelled, a lower bound of it
+        first_seconds = primary_seconds[0] if primary_seconds else seconds
+        self.observe(key, first_seconds)
+        metrics.observe("llm_hedged_call_seconds", first_seconds, call=key, request="first")
+        metrics.observe("llm_hedged_call_seconds", seconds, call=key, request="effective")
+
+        if winner is None:
+            # Every request failed: keep the log of the first one and raise its error
+            agent.merge(primary)
+            return primary_task.result()
+        if winner is not primary_task:
+            metrics.increment("llm_hedge_wins_total", call=key)
+        for task, branch in branches.items():
+            if task is not winner:
+                # The losers ran concurrently with the winner: count their tokens, not their time
+                branch.llm_seconds = 0.0
+                agent.merge(branch, adopt=False)
+        agent.merge(branches[winner])
+        return winner.result()
+
+
+_hedger: RequestHedger | None = None
+_hedger_pid: int | None = None
+
+
+def get_hedger() -> RequestHedger:
+    """
+    Get the process-wide request hedger configured in config.py, whose latency
+    statistics are shared by all the games of the process.
+
+    :returns: The shared hedger
+    """
+    global _hedger, _hedger_pid
+    if _hedger is None or _hedger_pid != os.getpid():
+        _hedger_pid = os.getpid()
+        _hedger = RequestHedger()
+    return _hedger
@@ -0,0 +1,130 @@
+"""
+Compact, append-only turn history of the agents.
+
+The history of an agent is kept in the model's input format, so it is itself the input sent
+to the model (or, with a memory strategy, the slices of it that are sent): no second view
+is rebuilt for every call. Its turns are frozen once recorded:
+
+- the SDK deep-copies the input of every run (several times per run), which for a long game
+  walks every nested part of every message again and again; the deep copy of a recorded
+  turn is the turn itself;
+- the serialised size and digest of a turn, which the rate limiter's token estimate and the
+  prefix tracker of prompt_layout.py need on every call, are computed once.
+
+So the work per call grows with the number of turns by a few pointer copies each, not with
+their content, and only the newly recorded turns are serialised.
+"""
+
+import hashlib
+import json
+from typing import Any, Iterable
+
+
+class Turn(dict):
+    """
+    A message of the history, frozen once recorded. Its nested parts (e.g. the content of
+    an output message) are shared with its copies and must not be modified either.
+    """
+
+    __slots__ = ("_size", "_digest")
+
+    def __copy__(self) -> "Turn":
+        return self
+
+    def __deepcopy__(self, memo: dict) -> "Turn":
+        return self
+
+    def __reduce__(self):
+        return Turn, (dict(self),)
+
+    def _frozen(self, *args: Any, **kwargs: Any):
+        raise TypeError("A recorded turn cannot be modified")
+
+    __setitem__ = __delitem__ = __ior__ = _frozen
+    clear = pop = popitem = setdefault = update = _frozen
+
+
+def record(message: dict) -> Turn:
+    """
+    Freeze a message as a turn of the history.
+
+    :param message: Message in the OpenAI input format
+    :returns: The turn (the message itself if it already is one)
+    """
+    return message if isinstance(message, Turn) else Turn(message)
+
+
+def signature(message: dict) -> tuple[int, bytes]:
+    """
+    Get the serialised size and digest of a message (computed once for a turn).
+
+    :param message: Message in the OpenAI input format
+    :returns: Tuple of (length of the message as JSON, digest of the JSON)
+    """
+    if isinstance(message, Turn):
+        try:
+            return message._size, message._digest
+        except AttributeError:
+            pass
+    encoded = json.dumps(message, default=str)
+    size, digest = len(encoded), hashlib.blake2b(encoded.encode(), digest_size=16).digest()
+    if isinstance(message, Turn):
+        message._size, message._digest = size, digest
+    return size, digest
+
+
+def serialized_size(messages: list[dict]) -> int:
+    """
+    Get the length of a list of messages as JSON (as `json.dumps` would write it), from
+    the sizes of the messages.
+
+    :param messages: Messages in the OpenAI input format
+    :returns: The length
+    """
+    return max(2 * len(messages), 2) + sum(signature(message)[0] for message in messages)
+
+
+class TurnHistory(list):
+    """
+    History of an agent: a list of turns, each message frozen as it is appended.
+    """
+
+    __slots__ = ()
+
+    def __init__(self, messages: Iterable[dict] = ()):
+        super().__init__(map(record, messages))
+
+    def append(self, message: dict):
+        super().append(record(message))
+
+    def extend(self, messages: Iterable[dict]):
+        super().extend(map(record, messages))
+
+    def insert(self, index: int, message: dict):
+        super().insert(index, record(message))
+
+    def __iadd__(self, messages: Iterable[dict]) -> "TurnHistory":
+        self.extend(messages)
+        return self
+
+    def __setitem__(self, index, value):
+        if isinstance(index, slice):
+            super().__setitem__(index, [record(message) for message in value])
+        else:
+            super().__setitem__(index, record(value))
+
+    def copy(self) -> "TurnHistory":
+        """
+        Copy the history (its turns are shared, being frozen).
+
+        :returns: The copy
+        """
+        history = TurnHistory()
+        list.extend(history, self)
+        return history
+
+    def __copy__(self) -> "TurnHistory":
+        return self.copy()
+
+    def __deepcopy__(self, memo: dict) -> "TurnHistory":
+        return self.copy()
@@ -0,0 +1,207 @@
+"""
+Micro-batching of the Host's decisions across concurrent games.
+
+In "direct" dispatch mode, every answer and topic validation of the Host is a small request
+made of the same system prompt and a few lines about the game. When many games run on one
+event loop, the requests made within `host_batch_window` seconds are collected and sent as
+a single request to `batch_host_decisions_agent`, which returns one decision per game; the
+decisions are then handed back to the waiting games. The system prompt is paid once per
+batch instead of once per game, and far fewer requests count against the rate limits.
+
+A request left alone in its window, or whose decision is missing from the batch's output,
+is sent on its own by the Host, as without batching.
+"""
+
+import asyncio
+import json
+import os
+import time
+import weakref
+from dataclasses import dataclass, field
+from typing import Any
+from agents import RunConfig, Runner, Usage
+from config import host_batch_max_size, host_batch_window
+from metrics import get_metrics, record_llm_call
+from prompt_layout import CachedUsage, get_prefix_tracker
+from rate_limiter import RateLimiter, RateLimitHooks, estimate_tokens
+from retry import get_circuit_breaker
+from tools import batch_host_decisions_agent
+
+# A decision of a batch: the response, the game's share of the usage, and the seconds waited
+BatchedDecision = tuple[dict[str, Any], Usage, float]
+
+
+@dataclass
+class _PendingBatch:
+    """
+    Requests collected for the next batch of one model provider.
+    """
+
+    run_config: RunConfig | None
+    rate_limiter: RateLimiter
+    items: list[tuple[dict[str, str], asyncio.Future]] = field(default_factory=list)
+    timer: asyncio.TimerHandle | None = None
+
+
+class HostDecisionBatcher:
+    """
+    Collects the Host decisions requested on an event loop and sends them in batches.
+
+    :param window: Seconds a batch collects requests after its first one
+    :param max_batch_size: Number of requests after which a batch is sent right away
+    """
+
+    def __init__(self, window: float = host_batch_window, max_batch_size: int = host_batch_max_size):
+        self.window = window
+        self.max_batch_size = max_batch_size
+        # Pending batch per model provider (games on different providers are never batched together)
+        self._pending: dict[int | None, _PendingBatch] = {}
+        self._requests: set[asyncio.Task] = set()
+
+    async def adecide(
+        self, item: dict[str, str], run_config: RunConfig | None, rate_limiter: RateLimiter
+    ) -> BatchedDecision | None:
+        """
+        Request a decision as part of a batch.
+
+        :param item: The request: the topic and either a question or a topic proposal
+        :param run_config: Run configuration of the requesting agent
+        :param rate_limiter: Rate limiter of the requesting agent
+        :returns: The decision, or None if the request must be sent on its own
+        """
+        loop = asyncio.get_running_loop()
+        key = id(run_config.model_provider) if run_config is not None else None
+        batch = self._pending.get(key)
+        if batch is None:
+            batch = self._pending[key] = _PendingBatch(run_config, rate_limiter)
+            batch.timer = loop.call_later(self.window, self._send, key)
+        future = loop.create_future()
+        batch.items.append((item, future))
+        if len(batch.items) >= self.max_batch_size:
+            batch.timer.cancel()
+            self._send(key)
+        return await future
+
+    def _send(self, key: int | None):
+        """
+        Close the pending batch of a model provider and send it.
+        """
+        batch = self._pending.pop(key, None)
+        if batch is None:
+            return
+        items = [(item, future) for item, future in batch.items if not future.done()]
+        if len(items) <= 1:
+            for _, future in items:
+                future.set_result(None)
+            return
+        batch.items = items
+        request = asyncio.create_task(self._asend(batch))
+        self._requests.add(request)
+        request.add_done_callback(self._requests.discard)
+
+    async def _asend(self, batch: _PendingBatch):
+        """
+        Send a batch and hand the decisions back to the waiting games.
+        """
+        items = [{"id": str(i), **item} for i, (item, _) in enumerate(batch.items)]
+        model_input = [{"role": "user", "content": json.dumps(items)}]
+        circuit_breaker = get_circuit_breaker()
+        hooks = RateLimitHooks(
+            batch.rate_limiter,
+            estimate_tokens(batch_host_decisions_agent.instructions, model_input),
+            circuit_breaker=circuit_breaker,
+        )
+        prompt_tokens = get_prefix_tracker().measure(
+            batch_host_decisions_agent.instructions, model_input
+        )
+        start_time = time.perf_counter()
+        try:
+            result = await Runner.run(
+                batch_host_decisions_agent, model_input, hooks=hooks, run_config=batch.run_config
+            )
+        except asyncio.CancelledError:
+            hooks.release_trials()
+            raise
+        except Exception as e:
+            # The games send their requests on their own, with the retries of the agents
+            hooks.release_trials()
+            get_metrics().increment(
+                "llm_errors_total", agent="HostBatch", error=type(e).__name__, kind="batch"
+            )
+            for _, future in batch.items:
+                if not future.done():
+                    future.set_result(None)
+            return
+        seconds = time.perf_counter() - start_time
+        for model in hooks.models:
+            circuit_breaker.record_success(model)
+        hooks.reconcile(result.raw_responses)
+        record_llm_call(
+            "HostBatch",
+            batch_host_decisions_agent.name,
+            seconds,
+            hooks.models,
+            result.raw_responses,
+            prompt_tokens=prompt_tokens,
+        )
+        usage = CachedUsage()
+        for response in result.raw_responses:
+            usage.add(response.usage)
+        num_items = len(batch.items)
+        shares = [CachedUsage() for _ in range(num_items)]
+        for field_name in (
+            "requests",
+            "input_tokens",
+            "cached_input_tokens",
+            "output_tokens",
+            "total_tokens",
+        ):
+            # Split evenly, the first games taking the remainder, so the shares add up to the usage
+            quotient, remainder = divmod(getattr(usage, field_name), num_items)
+            for i, share in enumerate(shares):
+                setattr(share, field_name, quotient + (i < remainder))
+        get_metrics().increment("host_batches_total")
+        get_metrics().increment("host_batched_decisions_total", num_items)
+
+        decisions = {decision.id: decision for decision in result.final_output.decisions}
+        for i, (item, future) in enumerate(batch.items):
+            if future.done():
+                continue
+            decision = decisions.get(str(i))
+            if decision is None:
+                future.set_result(None)
+            elif "question" in item and decision.answer is not None:
+                future.set_result(
+                    ({"reasoning": decision.reasoning, "answer": decision.answer}, shares[i], seconds)
+                )
+            elif "topic_proposal" in item and decision.is_correct is not None:
+                future.set_result(
+                    (
+                        {"reasoning": decision.reasoning, "is_correct": decision.is_correct},
+                        shares[i],
+                        seconds,
+                    )
+                )
+            else:
+                future.set_result(None)
+
+
+_batchers: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, HostDecisionBatcher]" = weakref.WeakKeyDictionary()
+_batchers_pid: int | None = None
+
+
+def get_host_batcher() -> HostDecisionBatcher:
+    """
+    Get the batcher of the running event loop, shared by every game of this process running
+    on it. Forked worker processes get their own batchers.
+
+    :returns: The batcher
+    """
+    global _batchers_pid
+    if _batchers_pid != os.getpid():
+        _batchers_pid = os.getpid()
+        _batchers.clear()
+    loop = asyncio.get_running_loop()
+    if loop not in _batchers:
+        _batchers[loop] = HostDecisionBatcher()
+    return _batchers[loop]
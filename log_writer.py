@@ -0,0 +1,407 @@
+"""
+Asynchronous, batched writing of the game logs.
+
+The loggers of the games (see `utils.setup_logger`) only push their records onto an
+in-memory queue. A background thread per process drains the queue in batches: it prints
+them to the console (colour-coded when the console is a terminal), appends them to the
+log file of the worker process and appends their structured events to the game records
+(see game_records.py), with one write per file and batch. No game ever waits on the disk.
+
+The log file of a worker is rotated once it reaches `log_max_bytes`, and its rotated
+segments are optionally gzip-compressed. Every line is tagged with the ID of its game,
+and when a game ends, the segments holding its lines are recorded in the worker's index,
+so `read_game_log` (or `python log_writer.py show <game_id>`) finds a game's log without
+scanning every file.
+"""
+
+import atexit
+import glob
+import gzip
+import json
+import logging
+import os
+import queue
+import shutil
+import sys
+import threading
+import time
+from typing import Any, TextIO
+import colorama
+from colorama import Fore, Style
+from config import (
+    game_records_path,
+    log_backup_count,
+    log_batch_size,
+    log_compress,
+    log_dir,
+    log_max_bytes,
+)
+from game_records import event_line
+
+# Initialize colorama
+colorama.init(autoreset=True)
+
+
+class ColorFormatter(logging.Formatter):
+    """
+    Custom logging formatter to color-code log messages based on their source.
+
+    """
+
+    def __init__(self, fmt=None, datefmt=None):
+        super().__init__(fmt, datefmt)
+        self.host_color = Fore.BLUE
+        self.guesser_color = Fore.GREEN
+        self.other_color = Fore.YELLOW
+        self.reset = Style.RESET_ALL
+
+    def format(self, record):
+        # Color the formatted message only: the record is shared with the other
+        # handlers, which must not receive the color codes
+        message = super().format(record)
+        if message.startswith("Host"):
+            color = self.host_color
+        elif message.startswith("Guesser"):
+            color = self.guesser_color
+        else:
+            color = self.other_color
+        return f"{color}{message}{self.reset}"
+
+
+class LogWriter:
+    """
+    Background writer of the game logs of a process.
+
+    :param directory: Directory of the log files
+    :param max_bytes: Size after which the log file is rotated
+    :param backup_count: Number of rotated segments kept (older ones are deleted)
+    :param compress: Whether the rotated segments are gzip-compressed
+    :param batch_size: Maximum number of records written at once
+    :param records_path: Path of the structured game records (None: not written)
+    :param stream: Console stream (None: `sys.stderr` as of when each record is queued,
+        so a redirection of `sys.stderr` applies to the records of the games it wraps)
+    :param console: Whether the records are printed to the console
+    """
+
+    def __init__(
+        self,
+        directory: str = log_dir,
+        max_bytes: int = log_max_bytes,
+        backup_count: int = log_backup_count,
+        compress: bool = log_compress,
+        batch_size: int = log_batch_size,
+        records_path: str | None = game_records_path,
+        stream: TextIO | None = None,
+        console: bool = True,
+    ):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self.compress = compress
+        self.batch_size = batch_size
+        self.records_path = records_path
+        self.stream = stream
+        self.console = console
+        self.console_formatter = logging.Formatter()
+        self.color_formatter = ColorFormatter()
+        self.file_formatter = logging.Formatter()
+        # Every worker process writes its own segments, named after its PID and start time
+        self.stem = os.path.join(directory, f"worker_{os.getpid()}_{int(time.time() * 1000)}")
+        self._segment = 0
+        self._rotated: list[int] = []
+        self._file: TextIO | None = None
+        self._index: TextIO | None = None
+        # Segments holding lines of each game still running
+        self._game_segments: dict[str, set[int]] = {}
+        self._queue: queue.SimpleQueue = queue.SimpleQueue()
+        self._thread = threading.Thread(target=self._run, name="log-writer", daemon=True)
+        self._thread.start()
+
+    def put(self, game_id: str, record: logging.LogRecord):
+        """
+        Queue a record of a game (never blocks).
+
+        :param game_id: ID of the game
+        :param record: The record
+        """
+        stream = None
+        if self.console:
+            stream = self.stream if self.stream is not None else sys.stderr
+        self._queue.put(("record", game_id, (record, stream)))
+
+    def end_game(self, game_id: str):
+        """
+        Queue the end of a game, after which its segments are recorded in the index.
+
+        :param game_id: ID of the game
+        """
+        self._queue.put(("end_game", game_id, None))
+
+    def flush(self, timeout: float | None = None) -> bool:
+        """
+        Wait until the records queued so far are written (e.g. before a worker process may
+        be terminated).
+
+        :param timeout: Maximum number of seconds to wait (None: no limit)
+        :returns: True if the records were written within the timeout
+        """
+        if not self._thread.is_alive():
+            return False
+        written = threading.Event()
+        self._queue.put(("flush", None, written))
+        return written.wait(timeout)
+
+    def close(self, timeout: float | None = None):
+        """
+        Write the queued records, stop the writer and close its files.
+
+        :param timeout: Maximum number of seconds to wait for the writer
+        """
+        if self._thread.is_alive():
+            self._queue.put(("stop", None, None))
+            self._thread.join(timeout)
+
+    def segment_path(self, segment: int) -> str:
+        """
+        Path of a segment of the log file, while it is written.
+
+        :param segment: Number of the segment
+        :returns: The path (with a ".gz" suffix once the segment is rotated, if compressed)
+        """
+        return f"{self.stem}.{segment}.log"
+
+    def _run(self):
+        """
+        Drain the queue in batches until the writer is closed.
+        """
+        stop = False
+        while not stop:
+            items = [self._queue.get()]
+            while len(items) < self.batch_size:
+                try:
+                    items.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                stop = self._write(items)
+            except Exception as e:
+                # Keep writing the next batches: losing a batch must not stop the logs
+                print(f"Failed to write {len(items)} log records: {e}", file=sys.stderr)
+                stop = any(kind == "stop" for kind, _, _ in items)
+            for kind, _, written in items:
+                if kind == "flush":
+                    written.set()
+        for file in (self._file, self._index):
+            if file is not None:
+                file.close()
+
+    def _write(self, items: list[tuple[str, Any, Any]]) -> bool:
+        """
+        Write a batch of queued items.
+
+        :returns: True if the writer was asked to stop
+        """
+        console: dict[TextIO, list[logging.LogRecord]] = {}
+        lines, events, ended = [], [], []
+        stop = False
+        for kind, game_id, item in items:
+            if kind == "record":
+                record, stream = item
+                if record.levelno >= logging.INFO:
+                    if stream is not None:
+                        console.setdefault(stream, []).append(record)
+                    # Tag every line (of multi-line messages too) with the game
+                    prefix = f"{self.file_formatter.formatTime(record)} - {game_id} - "
+                    lines.extend(
+                        f"{prefix}{line}\n"
+                        for line in self.file_formatter.format(record).splitlines()
+                    )
+                    self._game_segments.setdefault(game_id, set()).add(self._segment)
+                if self.records_path is not None:
+                    line = event_line(game_id, record)
+                    if line is not None:
+                        events.append(line + "\n")
+            elif kind == "end_game":
+                ended.append(game_id)
+            elif kind == "stop":
+                stop = True
+
+        for stream, records in console.items():
+            # Colour codes would only clutter a console redirected to a file or a pipe
+            isatty = getattr(stream, "isatty", None)
+            try:
+                color = isatty is not None and isatty()
+                formatter = self.color_formatter if color else self.console_formatter
+                stream.write("".join(formatter.format(record) + "\n" for record in records))
+                stream.flush()
+            except ValueError:
+                # The stream was closed since the records were queued (e.g. the end of a
+                # redirection): they are still written to the log file
+                pass
+        if lines:
+            if self._file is None:
+                os.makedirs(self.directory, exist_ok=True)
+                self._file = open(self.segment_path(self._segment), "a", encoding="utf-8")
+            self._file.write("".join(lines))
+            self._file.flush()
+        if events:
+            os.makedirs(os.path.dirname(self.records_path) or ".", exist_ok=True)
+            # A single append, so the games of other processes can share the file
+            with open(self.records_path, "ab", buffering=0) as f:
+                f.write("".join(events).encode())
+        if ended:
+            if self._index is None:
+                os.makedirs(self.directory, exist_ok=True)
+                self._index = open(f"{self.stem}.index.jsonl", "a", encoding="utf-8")
+            for game_id in ended:
+                segments = sorted(self._game_segments.pop(game_id, ()))
+                self._index.write(
+                    json.dumps({"game_id": game_id, "stem": self.stem, "segments": segments}) + "\n"
+                )
+            self._index.flush()
+        if self._file is not None and self._file.tell() >= self.max_bytes:
+            self._rotate()
+        return stop
+
+    def _rotate(self):
+        """
+        Close the current segment (compressing it if configured), start the next one and
+        delete the segments beyond `backup_count`.
+        """
+        self._file.close()
+        self._file = None
+        path = self.segment_path(self._segment)
+        if self.compress:
+            with open(path, "rb") as source, gzip.open(f"{path}.gz", "wb") as target:
+                shutil.copyfileobj(source, target)
+            os.remove(path)
+        self._rotated.append(self._segment)
+        self._segment += 1
+        while len(self._rotated) > self.backup_count:
+            old_path = self.segment_path(self._rotated.pop(0))
+            for candidate in (old_path, f"{old_path}.gz"):
+                if os.path.exists(candidate):
+                    os.remove(candidate)
+
+
+class QueuedGameHandler(logging.Handler):
+    """
+    Logging handler of a game, handing its records to the log writer.
+
+    :param game_id: ID of the game
+    :param writer: The log writer of the process
+    """
+
+    def __init__(self, game_id: Any, writer: LogWriter):
+        super().__init__(level=logging.DEBUG)
+        self.game_id = str(game_id)
+        self.writer = writer
+
+    def emit(self, record: logging.LogRecord):
+        # Without game records, the DEBUG records (structured events only) are not written
+        if record.levelno < logging.INFO and self.writer.records_path is None:
+            return
+        # Render the message now: its arguments may change before the writer formats it
+        record.msg = record.getMessage()
+        record.args = None
+        self.writer.put(self.game_id, record)
+
+    def close(self):
+        self.writer.end_game(self.game_id)
+        super().close()
+
+
+_log_writer: LogWriter | None = None
+_log_writer_pid: int | None = None
+
+
+def get_log_writer() -> LogWriter:
+    """
+    Get the log writer of this process, shared by all its games. Forked worker processes
+    get their own writer (and log files).
+
+    :returns: The log writer
+    """
+    global _log_writer, _log_writer_pid
+    if _log_writer is None or _log_writer_pid != os.getpid():
+        _log_writer_pid = os.getpid()
+        _log_writer = LogWriter()
+        atexit.register(_log_writer.close)
+    return _log_writer
+
+
+def flush_logs(timeout: float | None = None):
+    """
+    Wait until the logs queued by the games of this process are written (e.g. when a
+    worker process, which may be terminated without running its exit handlers, finishes
+    its games).
+
+    :param timeout: Maximum number of seconds to wait (None: no limit)
+    """
+    if _log_writer is not None and _log_writer_pid == os.getpid():
+        _log_writer.flush(timeout)
+
+
+def _read_segment(path: str) -> list[str]:
+    """
+    Read the lines of a segment, compressed or not (an empty list if it was deleted).
+    """
+    for candidate, opener in ((f"{path}.gz", gzip.open), (path, open)):
+        if os.path.exists(candidate):
+            with opener(candidate, "rt", encoding="utf-8") as f:
+                return f.readlines()
+    return []
+
+
+def read_game_log(game_id: Any, directory: str = log_dir) -> list[str]:
+    """
+    Read the log of a game, from the log files of all the worker processes.
+
+    :param game_id: ID of the game
+    :param directory: Directory of the log files
+    :returns: The lines of the game's log ("<time> - <message>"), in order. Empty if
+        the game is unknown or its segments were deleted.
+    """
+    game_id = str(game_id)
+    paths = []
+    for index_path in glob.glob(os.path.join(directory, "worker_*.index.jsonl")):
+        with open(index_path, encoding="utf-8") as f:
+            for line in f:
+                if game_id not in line:
+                    continue
+                entry = json.loads(line)
+                if entry["game_id"] == game_id:
+                    paths.extend(f"{entry['stem']}.{segment}.log" for segment in entry["segments"])
+    if not paths:
+        # The game has not ended (or its index was lost): scan every segment
+        paths = sorted(
+            {path.removesuffix(".gz") for path in glob.glob(os.path.join(directory, "worker_*.log*"))},
+            key=lambda path: (path.rsplit(".", 2)[0], int(path.rsplit(".", 2)[1])),
+        )
+    tag = f" - {game_id} - "
+    return [
+        line.replace(tag, " - ", 1).rstrip("\n")
+        for path in paths
+        for line in _read_segment(path)
+        if tag in line
+    ]
+
+
+def show(game_id: str, directory: str = log_dir):
+    """
+    Print the log of a game.
+
+    :param game_id: ID of the game
+    :param directory: Directory of the log files
+    """
+    lines = read_game_log(game_id, directory)
+    if not lines:
+        print(f"No log found for the game {game_id} in {directory}.")
+    for line in lines:
+        print(line)
+
+
+if __name__ == "__main__":
+    import fire
+
+    fire.Fire({"show": show})
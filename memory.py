@@ -0,0 +1,317 @@
+"""
+Conversation memory strategies for the game agents.
+
+The agents keep their full history, but only a bounded view of it is sent to the
+model, so the cost of a turn does not grow with the number of rounds played.
+A prefix of pinned messages (e.g. the Host's topic) is always kept, and the history
+is only ever cut at a user message, so handoff calls stay paired with their outputs.
+"""
+
+import copy
+import dataclasses
+import time
+from typing import Any
+from agents import Runner, RunConfig
+from config import (
+    memory_cut_step_turns,
+    memory_strategy,
+    memory_summary_every,
+    memory_window_turns,
+)
+from metrics import record_llm_call
+from prompt_layout import CachedUsage
+from rate_limiter import RateLimiter, RateLimitHooks, estimate_tokens, get_rate_limiter
+from tools import summarize_history_agent
+
+
+def _recent_start(messages: list[dict], start: int, num_turns: int) -> int:
+    """
+    Find where the last `num_turns` user turns begin.
+
+    :param messages: Conversation history
+    :param start: Index before which the history is never cut
+    :param num_turns: Number of user turns to keep
+    :returns: Index of the first message to keep
+    """
+    seen = 0
+    for i in range(len(messages) - 1, start - 1, -1):
+        if messages[i].get("role") == "user":
+            seen += 1
+            if seen == num_turns:
+                return i
+    return start
+
+
+def _count_user_turns(messages: list[dict]) -> int:
+    return sum(1 for message in messages if message.get("role") == "user")
+
+
+def _render(messages: list[dict]) -> str:
+    """
+    Render conversation messages as plain text (handoff calls are skipped).
+
+    :param messages: Conversation messages in the OpenAI input format
+    :returns: One line per message
+    """
+    lines = []
+    for message in messages:
+        content = message.get("content")
+        if isinstance(content, list):
+            content = " ".join(part.get("text", "") for part in content)
+        if content:
+            lines.append(f"{message.get('role', 'assistant')}: {content}")
+    return "\n".join(lines)
+
+
+class ConversationMemory:
+    """
+    Full conversation history (no compaction). Base class of the memory strategies.
+    """
+
+    def __init__(self):
+        # Token usage of the memory's own LLM calls (e.g. summarisation)
+        self.usage = CachedUsage()
+
+    def get_state(self) -> dict[str, Any]:
+        """
+        Get the state of the memory (e.g. for a checkpoint of the game).
+
+        :returns: JSON-serialisable state
+        """
+        state = {name: value for name, value in vars(self).items() if name != "usage"}
+        state["usage"] = dataclasses.asdict(self.usage)
+        return state
+
+    def restore_state(self, state: dict[str, Any]):
+        """
+        Restore a state returned by `get_state`.
+
+        :param state: The state
+        """
+        for name, value in state.items():
+            setattr(self, name, CachedUsage(**value) if name == "usage" else copy.deepcopy(value))
+
+    def record_fact(self, question: str, answer: str):
+        """
+        Record a question and its answer.
+
+        :param question: The question that was asked
+        :param answer: The answer to the question
+        """
+
+    async def build_input(
+        self,
+        messages: list[dict],
+        num_pinned: int,
+        run_config: RunConfig | None = None,
+        rate_limiter: RateLimiter | None = None,
+    ) -> list[dict]:
+        """
+        Build the messages sent to the model from the full history.
+
+        :param messages: Full conversation history
+        :param num_pinned: Number of leading messages that must always be kept
+        :param run_config: Run configuration of the agent (used for the memory's own LLM calls)
+        :param rate_limiter: Rate limiter of the agent (used for the memory's own LLM calls;
+            defaults to the process-wide one)
+        :returns: Messages to send to the model
+        """
+        return messages
+
+
+class SlidingWindowMemory(ConversationMemory):
+    """
+    Keep the pinned messages and the most recent user turns.
+
+    The cut before the kept turns moves `cut_step_turns` turns at a time, so the requests
+    between two moves only grow at their end and share their prefix with the previous ones
+    (see prompt_layout.py).
+
+    :param window_turns: Number of most recent user turns to keep (at least)
+    :param cut_step_turns: Number of user turns the cut moves at a time (1: at every turn)
+    """
+
+    def __init__(
+        self,
+        window_turns: int = memory_window_turns,
+        cut_step_turns: int = memory_cut_step_turns,
+    ):
+        super().__init__()
+        self.window_turns = window_turns
+        self.cut_step_turns = cut_step_turns
+        # Index of the first message after the pinned ones that is sent
+        self.cut = 0
+
+    def _advance_cut(self, messages: list[dict], num_pinned: int) -> bool:
+        """
+        Move the cut once `window_turns + cut_step_turns` user turns follow it.
+
+        :param messages: Full conversation history
+        :param num_pinned: Number of leading messages that must always be kept
+        :returns: True if the cut moved
+        """
+        self.cut = max(self.cut, num_pinned)
+        if _count_user_turns(messages[self.cut :]) < self.window_turns + self.cut_step_turns:
+            return False
+        self.cut = _recent_start(messages, self.cut, self.window_turns)
+        return True
+
+    async def build_input(
+        self,
+        messages: list[dict],
+        num_pinned: int,
+        run_config: RunConfig | None = None,
+        rate_limiter: RateLimiter | None = None,
+    ) -> list[dict]:
+        self._advance_cut(messages, num_pinned)
+        return messages[:num_pinned] + messages[self.cut :]
+
+
+class FactsLedgerMemory(SlidingWindowMemory):
+    """
+    Replace older turns with a compact ledger of question -> answer facts.
+
+    :param window_turns: Number of most recent user turns to keep verbatim (at least)
+    :param cut_step_turns: Number of user turns the cut moves at a time
+    """
+
+    def __init__(
+        self,
+        window_turns: int = memory_window_turns,
+        cut_step_turns: int = memory_cut_step_turns,
+    ):
+        super().__init__(window_turns, cut_step_turns)
+        self.facts: list[tuple[str, str]] = []
+        # Facts in the ledger: those established when the cut last moved, so that the
+        # ledger only changes with the cut
+        self.num_ledger_facts = 0
+
+    def record_fact(self, question: str, answer: str):
+        self.facts.append((question, answer))
+
+    async def build_input(
+        self,
+        messages: list[dict],
+        num_pinned: int,
+        run_config: RunConfig | None = None,
+        rate_limiter: RateLimiter | None = None,
+    ) -> list[dict]:
+        if self._advance_cut(messages, num_pinned):
+            self.num_ledger_facts = len(self.facts)
+        if not self.num_ledger_facts or self.cut == num_pinned:
+            return messages
+        ledger = "\n".join(
+            f"- {question} -> {answer}" for question, answer in self.facts[: self.num_ledger_facts]
+        )
+        ledger_message = {
+            "role": "user",
+            "content": f"Facts established so far (question -> answer):\n{ledger}",
+        }
+        return messages[:num_pinned] + [ledger_message] + messages[self.cut :]
+
+
+class SummaryMemory(SlidingWindowMemory):
+    """
+    Periodically fold older turns into a summary written by the summarisation agent.
+
+    :param summarize_every: Number of older user turns that triggers a new summary
+    :param window_turns: Number of most recent user turns to keep verbatim
+    """
+
+    def __init__(
+        self,
+        summarize_every: int = memory_summary_every,
+        window_turns: int = memory_window_turns,
+    ):
+        super().__init__(window_turns)
+        self.summarize_every = summarize_every
+        self.summary: str | None = None
+        self.summarized_until = 0
+
+    async def build_input(
+        self,
+        messages: list[dict],
+        num_pinned: int,
+        run_config: RunConfig | None = None,
+        rate_limiter: RateLimiter | None = None,
+    ) -> list[dict]:
+        self.summarized_until = max(self.summarized_until, num_pinned)
+        start = _recent_start(messages, self.summarized_until, self.window_turns)
+        unsummarized = messages[self.summarized_until : start]
+        if _count_user_turns(unsummarized) >= self.summarize_every:
+            self.summary = await self._summarize(unsummarized, run_config, rate_limiter)
+            self.summarized_until = start
+
+        if self.summary is None:
+            return messages
+        summary_message = {
+            "role": "user",
+            "content": f"Summary of the game so far:\n{self.summary}",
+        }
+        return (
+            messages[:num_pinned]
+            + [summary_message]
+            + messages[self.summarized_until :]
+        )
+
+    async def _summarize(
+        self,
+        messages: list[dict],
+        run_config: RunConfig | None = None,
+        rate_limiter: RateLimiter | None = None,
+    ) -> str:
+        """
+        Summarise messages together with the previous summary.
+
+        :param messages: Messages to fold into the summary
+        :param run_config: Run configuration of the agent
+        :param rate_limiter: Rate limiter of the agent (defaults to the process-wide one)
+        :returns: The new summary
+        """
+        prompt = _render(messages)
+        if self.summary is not None:
+            prompt = f"Summary so far:\n{self.summary}\n\nRecent conversation:\n{prompt}"
+        summary_input = [{"role": "user", "content": prompt}]
+        hooks = RateLimitHooks(
+            rate_limiter or get_rate_limiter(),
+            estimate_tokens(summarize_history_agent.instructions, summary_input),
+        )
+        start_time = time.perf_counter()
+        result = await Runner.run(
+            summarize_history_agent, summary_input, hooks=hooks, run_config=run_config
+        )
+        record_llm_call(
+            "Memory",
+            summarize_history_agent.name,
+            time.perf_counter() - start_time,
+            hooks.models,
+            result.raw_responses,
+        )
+        hooks.reconcile(result.raw_responses)
+        for response in result.raw_responses:
+            self.usage.add(response.usage)
+        return result.final_output.summary
+
+
+MEMORY_STRATEGIES = {
+    "full": ConversationMemory,
+    "window": SlidingWindowMemory,
+    "ledger": FactsLedgerMemory,
+    "summary": SummaryMemory,
+}
+
+
+def create_memory(strategy: str | None = None, **kwargs: Any) -> ConversationMemory:
+    """
+    Create a conversation memory (one per agent, as the strategies are stateful).
+
+    :param strategy: Name of the strategy (defaults to `memory_strategy` from config.py)
+    :param kwargs: Arguments passed to the strategy
+    :returns: The conversation memory
+    """
+    strategy = strategy or memory_strategy
+    if strategy not in MEMORY_STRATEGIES:
+        raise ValueError(
+            f"Unknown memory strategy: {strategy}. Use one of {list(MEMORY_STRATEGIES)}."
+        )
+    return MEMORY_STRATEGIES[strategy](**kwargs)
@@ -0,0 +1,60 @@
+"""
+Script comparing the conversation memory strategies (see memory.py) on win rate and token usage.
+"""
+
+from parallel_game import run_games
+import fire
+
+
+def compare_memory_strategies(
+    num_games: int = 20,
+    strategies: tuple[str, ...] = ("full", "window", "ledger", "summary"),
+    max_num_rounds: int = 20,
+    mode: str = "async",
+    max_concurrent: int = None,
+    backend: str | None = None,
+):
+    """
+    Play the same number of games with each memory strategy and compare win rate and token usage.
+
+    :param num_games: The number of games per strategy
+    :param strategies: The memory strategies to compare
+    :param max_num_rounds: The maximum number of rounds per game
+    :param mode: "process" or "async" (see `play_games`)
+    :param max_concurrent: Maximum games to run concurrently (see `play_games`)
+    :param backend: Backend of the models: "openai" (the API) or "mock" (a local stand-in, see
+        model_backends.py). If None, `model_backend` from config.py is used.
+    :returns: Dictionary mapping each strategy to its win rate and average tokens per game
+    """
+    comparison = {}
+    for strategy in strategies:
+        stats = run_games(
+            num_games,
+            clear_logs=False,
+            max_concurrent=max_concurrent,
+            show_progress=False,
+            mode=mode,
+            num_shards=1,
+            game_kwargs={
+                "max_num_rounds": max_num_rounds,
+                "memory_strategy": strategy,
+                "backend": backend,
+            },
+        )
+        summary = stats.summary()
+        comparison[strategy] = {
+            "win_rate": summary["win_rate"],
+            "tokens_per_game": summary["tokens_per_game"],
+        }
+
+    print("\n========== MEMORY STRATEGIES ==========")
+    for strategy, row in comparison.items():
+        print(
+            f"{strategy:>8}: win rate {row['win_rate'] * 100:.1f}%, "
+            f"{row['tokens_per_game']:.0f} tokens per game"
+        )
+    return comparison
+
+
+if __name__ == "__main__":
+    fire.Fire(compare_memory_strategies)
@@ -1,3 +1,9 @@
-round_message = """This is round {round_number}/{max_num_rounds} of the game. Do not do anything with this message, just acknowledge it."""
+round_message = """This is round {round_number}/{max_num_rounds} of the game."""
 topic_message = """Use an appropriate agent to provide a topic for a game of 20 questions. Here is a unique seed to ensure randomness and diversity: '{unique_id}'."""
 question_message = """Generate a question that helps you guess the topic. Be creative and think about the best question to ask."""
+direct_topic_message = """Provide a topic for a game of 20 questions. Here is a unique seed to ensure randomness and diversity: '{unique_id}'."""
+topic_pool_message = """Provide a topic for a game of 20 questions. It must be different from these topics, which were already used: {used_topics}. Here is a unique seed to ensure randomness and diversity: '{unique_id}'."""
+direct_answer_message = """The topic of the game is: {topic}. Answer the question: {question}"""
+direct_validate_message = """The topic of the game is: {topic}. The Guesser proposed the topic: {topic_proposal}. Did the Guesser guess the topic?"""
+planner_questions_message = """A planner tracking {num_candidates} candidate topics suggests these questions, most informative first: {questions}. Prefer them unless you have a better question."""
+planner_proposal_message = """The planner estimates a {probability:.0%} chance that the topic is {topic}: consider proposing it."""
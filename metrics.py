@@ -0,0 +1,533 @@
+"""
+Instrumentation of the LLM calls: latency histograms, token, cost and error counters.
+
+Every process records into its own registry (see `get_metrics`) and periodically writes
+a snapshot of it to the directory of its run in `metrics_dir` (see `start_metrics_run`).
+`collect_metrics` merges the snapshots of the processes of the run, and
+`start_metrics_export` publishes the merged metrics while a tournament is running: as a
+Prometheus text file in the run's directory, and optionally on an HTTP endpoint.
+"""
+
+import bisect
+import glob
+import json
+import os
+import shutil
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any
+from config import (
+    metrics_dir,
+    metrics_host,
+    metrics_run_retention,
+    metrics_snapshot_interval,
+    model_prices,
+)
+
+# Upper bounds of the latency buckets: 1 ms to ~9 minutes, each ~19% wider than the previous
+LATENCY_BUCKETS = tuple(0.001 * 2 ** (i / 4) for i in range(77))
+# Upper bounds of the buckets of the attempts per call (retries included)
+ATTEMPT_BUCKETS = (1, 2, 3, 4, 5, 6, 8, 10, 15, 20)
+# Buckets of the histograms that do not hold latencies
+HISTOGRAM_BUCKETS = {"llm_call_attempts": ATTEMPT_BUCKETS}
+
+Labels = tuple[tuple[str, str], ...]
+
+
+def _labels(labels: dict[str, Any]) -> Labels:
+    return tuple(sorted((name, str(value)) for name, value in labels.items()))
+
+
+def _format_labels(labels: Labels, **extra: str) -> str:
+    pairs = list(labels) + list(extra.items())
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{value}"' for name, value in pairs) + "}"
+
+
+class Histogram:
+    """
+    Histogram with fixed buckets, mergeable across processes.
+
+    :param buckets: Sorted upper bounds of the buckets (an overflow bucket is added)
+    """
+
+    def __init__(self, buckets: tuple[float, ...] = LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def merge(self, counts: list[int], total: float, count: int):
+        """
+        Add the observations of another histogram with the same buckets.
+
+        :param counts: Per-bucket counts of the other histogram
+        :param total: Sum of its observations
+        :param count: Number of its observations
+        """
+        self.counts = [a + b for a, b in zip(self.counts, counts)]
+        self.sum += total
+        self.count += count
+
+    def quantile(self, q: float) -> float:
+        """
+        Estimate a quantile by interpolating within its bucket.
+
+        :param q: Quantile between 0 and 1
+        :returns: The estimated value (0.0 if the histogram is empty)
+        """
+        if self.count == 0:
+            return 0.0
+        rank = q * self.count
+        cumulative = 0
+        for i, count in enumerate(self.counts):
+            if count and cumulative + count >= rank:
+                if i == len(self.buckets):
+                    return self.buckets[-1]
+                lower = self.buckets[i - 1] if i > 0 else 0.0
+                return lower + (self.buckets[i] - lower) * (rank - cumulative) / count
+            cumulative += count
+        return self.buckets[-1]
+
+
+def _new_histogram(name: str) -> Histogram:
+    return Histogram(HISTOGRAM_BUCKETS.get(name, LATENCY_BUCKETS))
+
+
+class MetricsRegistry:
+    """
+    Counters and histograms keyed by name and labels. Thread-safe.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counters: dict[tuple[str, Labels], float] = {}
+        self.histograms: dict[tuple[str, Labels], Histogram] = {}
+
+    def increment(self, name: str, value: float = 1.0, **labels: Any):
+        """
+        Add to a counter.
+
+        :param name: Name of the counter
+        :param value: Amount to add
+        :param labels: Labels of the series
+        """
+        key = (name, _labels(labels))
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0.0) + value
+
+    def observe(self, name: str, value: float, **labels: Any):
+        """
+        Record an observation in a histogram.
+
+        :param name: Name of the histogram
+        :param value: Observed value
+        :param labels: Labels of the series
+        """
+        key = (name, _labels(labels))
+        with self._lock:
+            if key not in self.histograms:
+                self.histograms[key] = _new_histogram(name)
+            self.histograms[key].observe(value)
+
+    def reset(self):
+        with self._lock:
+            self.counters.clear()
+            self.histograms.clear()
+
+    def snapshot(self) -> dict[str, list]:
+        """
+        Get a JSON-serialisable copy of the metrics.
+
+        :returns: Snapshot that can be merged with `merge_snapshot`
+        """
+        with self._lock:
+            return {
+                "counters": [
+                    [name, dict(labels), value]
+                    for (name, labels), value in self.counters.items()
+                ],
+                "histograms": [
+                    [name, dict(labels), list(histogram.counts), histogram.sum, histogram.count]
+                    for (name, labels), histogram in self.histograms.items()
+                ],
+            }
+
+    def merge_snapshot(self, snapshot: dict[str, list]):
+        """
+        Add the metrics of a snapshot (e.g. of another process).
+
+        :param snapshot: Snapshot returned by `snapshot`
+        """
+        for name, labels, value in snapshot["counters"]:
+            self.increment(name, value, **labels)
+        with self._lock:
+            for name, labels, counts, total, count in snapshot["histograms"]:
+                key = (name, _labels(labels))
+                if key not in self.histograms:
+                    self.histograms[key] = _new_histogram(name)
+                self.histograms[key].merge(counts, total, count)
+
+    def to_prometheus(self) -> str:
+        """
+        Render the metrics in the Prometheus text exposition format.
+
+        :returns: The metrics as text
+        """
+        lines = []
+        with self._lock:
+            for name in sorted({name for name, _ in self.counters}):
+                lines.append(f"# TYPE {name} counter")
+                for (series, labels), value in sorted(self.counters.items()):
+                    if series == name:
+                        lines.append(f"{name}{_format_labels(labels)} {value:g}")
+            for name in sorted({name for name, _ in self.histograms}):
+                lines.append(f"# TYPE {name} histogram")
+                for (series, labels), histogram in sorted(self.histograms.items()):
+                    if series != name:
+                        continue
+                    cumulative = 0
+                    for bound, count in zip(histogram.buckets, histogram.counts):
+                        cumulative += count
+                        lines.append(
+                            f"{name}_bucket{_format_labels(labels, le=f'{bound:.6g}')} {cumulative}"
+                        )
+                    lines.append(
+                        f"{name}_bucket{_format_labels(labels, le='+Inf')} {histogram.count}"
+                    )
+                    lines.append(f"{name}_sum{_format_labels(labels)} {histogram.sum:g}")
+                    lines.append(f"{name}_count{_format_labels(labels)} {histogram.count}")
+        return "\n".join(lines) + "\n"
+
+    def write_snapshot(self, path: str):
+        """
+        Atomically write a snapshot of the metrics to a JSON file.
+
+        :param path: Path of the snapshot file
+        """
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        temporary_path = f"{path}.tmp"
+        with open(temporary_path, "w") as f:
+            json.dump(self.snapshot(), f)
+        os.replace(temporary_path, path)
+
+
+def record_llm_call(
+    agent: str,
+    called_agent: str,
+    seconds: float,
+    models: list[str | None],
+    raw_responses: list,
+    num_handoffs: int = 0,
+    prompt_tokens: tuple[int, int] | None = None,
+):
+    """
+    Record a completed LLM call (one agent run, possibly spanning several model responses).
+
+    :param agent: Name of the game agent making the call (e.g. "Host")
+    :param called_agent: Name of the agent that produced the final output
+    :param seconds: Duration of the call
+    :param models: Model of each response, in call order
+    :param raw_responses: The model responses of the run
+    :param num_handoffs: Number of handoffs during the run
+    :param prompt_tokens: Estimated tokens of the prefix that the first request of the run
+        shares with recent requests, and of the whole request (see prompt_layout.py)
+    """
+    metrics = get_metrics()
+    final_model = models[-1] if models else None
+    metrics.observe(
+        "llm_call_seconds", seconds, agent=agent, called_agent=called_agent, model=final_model
+    )
+    if num_handoffs:
+        metrics.increment("llm_handoffs_total", num_handoffs, agent=agent)
+    if prompt_tokens is not None:
+        prefix_tokens, request_tokens = prompt_tokens
+        metrics.increment(
+            "llm_prompt_tokens_estimated_total", prefix_tokens, agent=agent, part="prefix"
+        )
+        metrics.increment(
+            "llm_prompt_tokens_estimated_total", request_tokens, agent=agent, part="request"
+        )
+    for model, response in zip(models, raw_responses):
+        usage = response.usage
+        # Only reported by the usage of prompt_layout.py (the SDK's own leaves it out)
+        cached_tokens = getattr(usage, "cached_input_tokens", 0)
+        metrics.increment("llm_requests_total", usage.requests, agent=agent, model=model)
+        metrics.increment(
+            "llm_tokens_total", usage.input_tokens, agent=agent, model=model, kind="input"
+        )
+        metrics.increment(
+            "llm_tokens_total", cached_tokens, agent=agent, model=model, kind="cached_input"
+        )
+        metrics.increment(
+            "llm_tokens_total", usage.output_tokens, agent=agent, model=model, kind="output"
+        )
+        price = model_prices.get(model)
+        if price is not None:
+            cost = (
+                (usage.input_tokens - cached_tokens) * price["input"]
+                + cached_tokens * price.get("cached_input", price["input"])
+                + usage.output_tokens * price["output"]
+            ) / 1_000_000
+            metrics.increment("llm_cost_usd_total", cost, agent=agent, model=model)
+
+
+def format_metrics_summary(metrics: MetricsRegistry) -> str:
+    """
+    Summarise the LLM call metrics: latency percentiles per agent and model, tokens and cost.
+
+    :param metrics: The metrics to summarise
+    :returns: Human-readable summary
+    """
+    latencies: dict[tuple[str, str], Histogram] = {}
+    for (name, labels), histogram in metrics.histograms.items():
+        if name != "llm_call_seconds":
+            continue
+        labels = dict(labels)
+        key = (labels["agent"], labels["model"])
+        latencies.setdefault(key, Histogram()).merge(
+            histogram.counts, histogram.sum, histogram.count
+        )
+
+    lines = ["LLM calls (agent / model: calls, p50 / p95 / p99 seconds):"]
+    for (agent, model), histogram in sorted(latencies.items()):
+        lines.append(
+            f"  {agent} / {model}: {histogram.count}, "
+            f"{histogram.quantile(0.5):.2f} / {histogram.quantile(0.95):.2f} / "
+            f"{histogram.quantile(0.99):.2f}"
+        )
+
+    totals: dict[str, float] = {}
+    for (name, labels), value in metrics.counters.items():
+        if name == "llm_tokens_total":
+            name = f"{dict(labels)['kind']}_tokens"
+        elif name == "llm_prompt_tokens_estimated_total":
+            name = f"prompt_{dict(labels)['part']}_tokens"
+        totals[name] = totals.get(name, 0.0) + value
+    lines.append(
+        f"Tokens: {totals.get('input_tokens', 0):.0f} input, "
+        f"{totals.get('output_tokens', 0):.0f} output; "
+        f"cost: ${totals.get('llm_cost_usd_total', 0):.4f}; "
+        f"handoffs: {totals.get('llm_handoffs_total', 0):.0f}; "
+        f"failed attempts: {totals.get('llm_errors_total', 0):.0f}"
+    )
+
+    if totals.get("prompt_request_tokens"):
+        lines.append(
+            f"Prompt cache: {totals['prompt_prefix_tokens'] / totals['prompt_request_tokens'] * 100:.1f}% "
+            f"of the input repeats a recent request (estimated); "
+            f"{totals.get('cached_input_tokens', 0) / max(totals.get('input_tokens', 0), 1) * 100:.1f}% "
+            f"of the input tokens were served from the provider's cache"
+        )
+
+    hedged: dict[str, Histogram] = {}
+    for (name, labels), histogram in metrics.histograms.items():
+        if name == "llm_hedged_call_seconds":
+            hedged.setdefault(dict(labels)["request"], Histogram()).merge(
+                histogram.counts, histogram.sum, histogram.count
+            )
+    if "effective" in hedged:
+        # The first request of a call won by its hedge was cancelled, so its p99 is a lower bound
+        lines.append(
+            f"Hedging: {totals.get('llm_hedges_total', 0):.0f} of {hedged['effective'].count} "
+            f"calls hedged, {totals.get('llm_hedge_wins_total', 0):.0f} won by the hedge; "
+            f"p99 latency: at least {hedged['first'].quantile(0.99):.2f}s for the first request, "
+            f"{hedged['effective'].quantile(0.99):.2f}s with the hedges"
+        )
+
+    attempts = {outcome: Histogram(ATTEMPT_BUCKETS) for outcome in ("success", "failure")}
+    for (name, labels), histogram in metrics.histograms.items():
+        if name == "llm_call_attempts":
+            attempts[dict(labels)["outcome"]].merge(
+                histogram.counts, histogram.sum, histogram.count
+            )
+    calls = attempts["success"].count + attempts["failure"].count
+    if calls:
+        # Calls made in a single attempt fall in the first bucket
+        retried = calls - attempts["success"].counts[0] - attempts["failure"].counts[0]
+        lines.append(
+            f"Retries: {retried} of {calls} calls retried, "
+            f"{(attempts['success'].sum + attempts['failure'].sum) / calls:.2f} attempts per call "
+            f"on average, {attempts['failure'].count} calls gave up"
+        )
+    return "\n".join(lines)
+
+
+_metrics: MetricsRegistry | None = None
+_metrics_pid: int | None = None
+
+# Environment variable holding the name of the run, so the worker processes started by the
+# process that started the run (forked or spawned) write to its directory
+RUN_ENV_VAR = "METRICS_RUN"
+
+
+def start_metrics_run(name: str | None = None):
+    """
+    Write the snapshots of this process, and of the worker processes it starts from now on,
+    to the directory of a run in `metrics_dir`, so concurrent runs neither merge nor delete
+    each other's metrics. The directories of the runs older than `metrics_run_retention`
+    are deleted.
+
+    :param name: Name of the run, for processes joining a run started elsewhere (e.g. the
+        clients of the game server). By default, a new run is started.
+    """
+    if name is None:
+        name = f"run_{os.getpid()}_{int(time.time() * 1000)}"
+        for path in glob.glob(os.path.join(metrics_dir, "run_*")):
+            try:
+                if time.time() - os.path.getmtime(path) > metrics_run_retention:
+                    shutil.rmtree(path, ignore_errors=True)
+            except OSError:
+                continue  # Deleted by another process meanwhile
+    os.environ[RUN_ENV_VAR] = name
+
+
+def metrics_run_dir() -> str:
+    """
+    Get the directory of the snapshots of the current run.
+
+    :returns: The directory (`metrics_dir` itself for processes outside of a run)
+    """
+    name = os.environ.get(RUN_ENV_VAR)
+    return os.path.join(metrics_dir, name) if name else metrics_dir
+
+
+def _snapshot_path(pid: int) -> str:
+    return os.path.join(metrics_run_dir(), f"metrics-{pid}.json")
+
+
+def get_metrics() -> MetricsRegistry:
+    """
+    Get the registry of this process. Forked worker processes get their own registry,
+    whose snapshot is written to `metrics_dir` every `metrics_snapshot_interval` seconds.
+
+    :returns: The process-wide registry
+    """
+    global _metrics, _metrics_pid
+    if _metrics is None or _metrics_pid != os.getpid():
+        _metrics_pid = os.getpid()
+        _metrics = MetricsRegistry()
+        threading.Thread(
+            target=_write_snapshots, args=(_metrics, _metrics_pid), daemon=True
+        ).start()
+    return _metrics
+
+
+def _write_snapshots(metrics: MetricsRegistry, pid: int):
+    while True:
+        time.sleep(metrics_snapshot_interval)
+        if metrics.counters or metrics.histograms:
+            metrics.write_snapshot(_snapshot_path(pid))
+
+
+def write_metrics_snapshot():
+    """
+    Write the snapshot of this process now (e.g. when a worker finishes a game).
+    """
+    get_metrics().write_snapshot(_snapshot_path(os.getpid()))
+
+
+def clear_metrics():
+    """
+    Reset the registry of this process and delete the snapshots of the current run (outside
+    of a run, only the snapshot of this process: the other processes may be in other runs).
+    """
+    get_metrics().reset()
+    if os.environ.get(RUN_ENV_VAR):
+        paths = glob.glob(os.path.join(metrics_run_dir(), "metrics-*.json"))
+    else:
+        paths = [_snapshot_path(os.getpid())]
+    for path in paths:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+def collect_metrics() -> MetricsRegistry:
+    """
+    Merge the metrics of this process with the latest snapshots of the other processes
+    of the run.
+
+    :returns: A new registry holding the merged metrics
+    """
+    merged = MetricsRegistry()
+    merged.merge_snapshot(get_metrics().snapshot())
+    own_path = _snapshot_path(os.getpid())
+    for path in glob.glob(os.path.join(metrics_run_dir(), "metrics-*.json")):
+        if path == own_path:
+            continue
+        try:
+            with open(path) as f:
+                merged.merge_snapshot(json.load(f))
+        except (OSError, json.JSONDecodeError):
+            continue  # Removed or replaced while reading; picked up on the next collection
+    return merged
+
+
+_export_started = False
+_metrics_server: ThreadingHTTPServer | None = None
+
+
+class _MetricsRequestHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path != "/metrics":
+            self.send_error(404)
+            return
+        body = collect_metrics().to_prometheus().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_metrics_export(port: int | None = None, host: str = metrics_host):
+    """
+    Publish the merged metrics while games are running: rewrite `metrics.prom` in the
+    run's directory every `metrics_snapshot_interval` seconds, and optionally serve them
+    at http://<host>:<port>/metrics.
+
+    :param port: Port of the HTTP endpoint (no endpoint if None)
+    :param host: Address the HTTP endpoint listens on
+    """
+    global _export_started, _metrics_server
+    if port is not None and _metrics_server is None:
+        _metrics_server = ThreadingHTTPServer((host, port), _MetricsRequestHandler)
+        threading.Thread(target=_metrics_server.serve_forever, daemon=True).start()
+    if _export_started:
+        return
+    _export_started = True
+
+    def export():
+        while True:
+            time.sleep(metrics_snapshot_interval)
+            write_metrics_file()
+
+    threading.Thread(target=export, daemon=True).start()
+
+
+def write_metrics_file() -> MetricsRegistry:
+    """
+    Write the merged metrics of the processes of the run to `metrics.prom` in its directory.
+
+    :returns: The merged metrics
+    """
+    metrics = collect_metrics()
+    run_dir = metrics_run_dir()
+    path = os.path.join(run_dir, "metrics.prom")
+    os.makedirs(run_dir, exist_ok=True)
+    with open(f"{path}.tmp", "w") as f:
+        f.write(metrics.to_prometheus())
+    os.replace(f"{path}.tmp", path)
+    return metrics
@@ -0,0 +1,648 @@
+"""
+Model backends of the game: the OpenAI API (default) and a local mock.
+
+The mock backend answers every agent of the game without a network: it returns
+schema-valid outputs from a small oracle driven by a topic knowledge table, with a
+configurable latency distribution and error rate, and serves the input tokens of the prefix
+a request shares with recent requests from a simulated prompt cache, like the API. Its
+random draws are seeded from the request, so the same games can be replayed, and the whole
+game loop can be stress-tested and benchmarked offline.
+"""
+
+import asyncio
+import hashlib
+import json
+import os
+import random
+import re
+import time
+from collections import OrderedDict
+from types import SimpleNamespace
+from typing import Any, AsyncIterator
+import httpx
+from openai import APITimeoutError, InternalServerError, RateLimitError
+from openai.types.responses import (
+    Response,
+    ResponseCompletedEvent,
+    ResponseContentPartAddedEvent,
+    ResponseContentPartDoneEvent,
+    ResponseCreatedEvent,
+    ResponseFunctionCallArgumentsDeltaEvent,
+    ResponseFunctionToolCall,
+    ResponseOutputItemAddedEvent,
+    ResponseOutputItemDoneEvent,
+    ResponseOutputMessage,
+    ResponseOutputText,
+    ResponseTextDeltaEvent,
+)
+from openai.types.responses.response_usage import OutputTokensDetails, ResponseUsage
+from agents import Model, ModelProvider, ModelResponse, set_tracing_disabled
+from agents.items import TResponseStreamEvent
+from clients import PooledOpenAIProvider
+from config import (
+    mock_error_kinds,
+    mock_error_rate,
+    mock_guesser_accuracy,
+    mock_latency_median,
+    mock_latency_sigma,
+    mock_max_tracked_requests,
+    mock_seed,
+    model_backend,
+)
+from history import serialized_size
+from prompt_layout import CachedUsage, PrefixTracker, cacheable_tokens
+from rate_limiter import RateLimiter
+from tools import (
+    GetAnswer,
+    GetQuestion,
+    GetTopic,
+    HostDecisions,
+    SummarizeHistory,
+    ValidateAnswer,
+)
+from topic_matcher import normalize_topic
+
+# Topics known to the mock backend: category, sub-category and the attributes that hold
+TOPIC_KNOWLEDGE = {
+    "Eiffel Tower": ("Place", "Landmark", {"man-made", "a place", "in Europe", "made of metal", "bigger than a house", "older than 100 years"}),
+    "Great Wall of China": ("Place", "Landmark", {"man-made", "a place", "in Asia", "bigger than a house", "older than 100 years"}),
+    "Pyramids of Giza": ("Place", "Landmark", {"man-made", "a place", "in Africa", "bigger than a house", "older than 100 years"}),
+    "Mount Kilimanjaro": ("Place", "Nature", {"a place", "in Africa", "bigger than a house", "older than 100 years"}),
+    "Amazon River": ("Place", "Nature", {"a place", "in South America", "bigger than a house", "older than 100 years"}),
+    "Paris": ("Place", "City", {"man-made", "a place", "in Europe", "bigger than a house", "older than 100 years"}),
+    "Tokyo": ("Place", "City", {"man-made", "a place", "in Asia", "bigger than a house", "older than 100 years"}),
+    "Cat": ("Animal", "Mammal", {"alive", "an animal", "kept at home", "smaller than a person"}),
+    "Dog": ("Animal", "Mammal", {"alive", "an animal", "kept at home"}),
+    "Elephant": ("Animal", "Mammal", {"alive", "an animal", "in Africa", "bigger than a house"}),
+    "Kangaroo": ("Animal", "Mammal", {"alive", "an animal"}),
+    "Penguin": ("Animal", "Bird", {"alive", "an animal", "smaller than a person"}),
+    "Goldfish": ("Animal", "Fish", {"alive", "an animal", "kept at home", "smaller than a person", "able to fit in a pocket"}),
+    "Oak Tree": ("Plant", "Tree", {"alive", "bigger than a house", "older than 100 years"}),
+    "Sunflower": ("Plant", "Flower", {"alive", "smaller than a person"}),
+    "Pizza": ("Food", "Dish", {"man-made", "edible", "kept at home", "smaller than a person"}),
+    "Chocolate Cake": ("Food", "Dessert", {"man-made", "edible", "kept at home", "smaller than a person"}),
+    "Banana": ("Food", "Fruit", {"alive", "edible", "kept at home", "smaller than a person", "able to fit in a pocket"}),
+    "Smartphone": ("Object", "Electronics", {"man-made", "electronic", "kept at home", "smaller than a person", "able to fit in a pocket", "made of metal"}),
+    "Laptop": ("Object", "Electronics", {"man-made", "electronic", "kept at home", "smaller than a person", "made of metal"}),
+    "Blender": ("Object", "Appliance", {"man-made", "electronic", "kept at home", "smaller than a person"}),
+    "Bicycle": ("Object", "Vehicle", {"man-made", "kept at home", "made of metal", "used for transport"}),
+    "Airplane": ("Object", "Vehicle", {"man-made", "made of metal", "used for transport", "bigger than a house", "electronic"}),
+    "Sundial": ("Object", "Instrument", {"man-made", "smaller than a person", "older than 100 years"}),
+    "Violin": ("Object", "Instrument", {"man-made", "kept at home", "smaller than a person", "older than 100 years"}),
+    "Cleopatra": ("Person", "Historical figure", {"a person", "in Africa", "older than 100 years"}),
+    "Albert Einstein": ("Person", "Scientist", {"a person", "in Europe", "older than 100 years"}),
+    "Serena Williams": ("Person", "Athlete", {"a person"}),
+    "Van Gogh": ("Person", "Artist", {"a person", "in Europe", "older than 100 years"}),
+}
+ATTRIBUTES = sorted({attribute for *_, attributes in TOPIC_KNOWLEDGE.values() for attribute in attributes})
+
+# Questions the Guesser asks instead of the most informative one (they carry no information)
+FILLER_QUESTIONS = [
+    "Is it something you would give as a present?",
+    "Is it something most people have seen?",
+    "Is it something with a famous name?",
+]
+
+_UUID = re.compile(r"[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}")
+_QUESTION = re.compile(r"^Is it (.+?)\?$", re.IGNORECASE)
+_ANSWERED = re.compile(r"The answer to the question: (.+?) is: (Yes|No)")
+_LEDGER_FACT = re.compile(r"^- (.+?) -> (Yes|No)$", re.MULTILINE)
+_REJECTED = re.compile(r"The topic (.+?) is not correct")
+_GIVEN_TOPIC = re.compile(r"The topic (?:for|of) (?:this|the) game is: (.+?)(?:\. (?:Answer|The Guesser)|$)")
+_ASKED = re.compile(r"the question: (.+?)\.?$", re.IGNORECASE)
+_PROPOSED = re.compile(r"The Guesser proposed the topic: (.+?)\. Did")
+_USED_TOPICS = re.compile(r"which were already used: (.+?)\. Here is")
+_PLANNED_QUESTION = re.compile(r"most informative first: '(.+?\?)'")
+_PLANNED_PROPOSAL = re.compile(r"chance that the topic is (.+?): consider proposing it")
+
+# Output types of the agents, told apart by the properties of a request's JSON schema
+_OUTPUT_TYPES = {
+    frozenset(output_type.model_fields): output_type
+    for output_type in (GetTopic, GetAnswer, ValidateAnswer, HostDecisions, GetQuestion, SummarizeHistory)
+}
+
+
+def _texts(model_input: str | list) -> list[tuple[str, str]]:
+    """
+    Extract the (role, text) pairs of the messages of a model input.
+
+    :param model_input: Input of the model (a string or a list of input items)
+    :returns: Role and text of every message, in order
+    """
+    if isinstance(model_input, str):
+        return [("user", model_input)]
+    texts = []
+    for item in model_input:
+        content = item.get("content")
+        if isinstance(content, list):
+            content = " ".join(part.get("text", "") for part in content)
+        if isinstance(content, str):
+            texts.append((item.get("role", "assistant"), content))
+    return texts
+
+
+def _facts(texts: list[tuple[str, str]]) -> tuple[list[tuple[str, str]], set[str]]:
+    """
+    Collect the answered questions and the rejected proposals visible in a conversation.
+
+    :param texts: Role and text of the messages
+    :returns: Tuple of (question and answer pairs, rejected topics)
+    """
+    facts, rejected = [], set()
+    for _, text in texts:
+        facts += _ANSWERED.findall(text) + _LEDGER_FACT.findall(text)
+        rejected.update(_REJECTED.findall(text))
+    for question, answer in facts:
+        match = _QUESTION.match(question)
+        if match and answer == "No" and match.group(1) in TOPIC_KNOWLEDGE:
+            rejected.add(match.group(1))
+    return facts, rejected
+
+
+def oracle_answer(topic: str, question: str) -> str:
+    """
+    Answer a question about a topic from the knowledge table.
+
+    :param topic: Topic of the game
+    :param question: Question of the form "Is it <attribute or topic>?"
+    :returns: "Yes" or "No" (unknown questions and topics are answered with "No")
+    """
+    match = _QUESTION.match(question.strip())
+    if match is None:
+        return "No"
+    subject = match.group(1)
+    if normalize_topic(subject) == normalize_topic(topic):
+        return "Yes"
+    _, _, attributes = TOPIC_KNOWLEDGE.get(topic, (None, None, set()))
+    return "Yes" if subject in attributes else "No"
+
+
+class MockModel(Model):
+    """
+    Local stand-in for an LLM, playing every role of the game from the knowledge table.
+
+    :param provider: The provider of the model (holds the settings and the random state)
+    """
+
+    def __init__(self, provider: "MockModelProvider"):
+        self.provider = provider
+
+    async def get_response(
+        self,
+        system_instructions,
+        input,
+        model_settings,
+        tools,
+        output_schema,
+        handoffs,
+        tracing,
+    ) -> ModelResponse:
+        rng = self.provider.random_for(system_instructions, input)
+        if self.provider.latency_median > 0:
+            await asyncio.sleep(
+                self.provider.latency_median * rng.lognormvariate(0, self.provider.latency_sigma)
+            )
+        else:
+            await asyncio.sleep(0)
+        if rng.random() < self.provider.error_rate:
+            self._raise_error(rng.choice(self.provider.error_kinds))
+
+        texts = _texts(input)
+        if (output_schema is None or output_schema.is_plain_text()) and handoffs:
+            output = self._handoff(texts, handoffs, rng)
+            output_text = output.arguments
+        else:
+            output_type = output_schema.output_type
+            response = self._respond(output_type, texts, rng)
+            output_text = json.dumps(response)
+            output = ResponseOutputMessage(
+                id="mock",
+                content=[ResponseOutputText(annotations=[], text=output_text, type="output_text")],
+                role="assistant",
+                status="completed",
+                type="message",
+            )
+
+        # About four characters per token, like the rate limiter's estimate
+        input_size = len(json.dumps(input)) if isinstance(input, str) else serialized_size(input)
+        input_tokens = (len(system_instructions or "") + input_size) // 4
+        output_tokens = len(output_text) // 4 + 1
+        # Like the API's prompt cache: the prefix shared with a recent request, in whole blocks
+        prefix_tokens, _ = self.provider.prompt_cache.measure(system_instructions, input)
+        return ModelResponse(
+            output=[output],
+            usage=CachedUsage(
+                requests=1,
+                input_tokens=input_tokens,
+                output_tokens=output_tokens,
+                total_tokens=input_tokens + output_tokens,
+                cached_input_tokens=cacheable_tokens(min(prefix_tokens, input_tokens)),
+            ),
+            referenceable_id=None,
+        )
+
+    async def stream_response(
+        self,
+        system_instructions,
+        input,
+        model_settings,
+        tools,
+        output_schema,
+        handoffs,
+        tracing,
+    ) -> AsyncIterator[TResponseStreamEvent]:
+        # The same response as `get_response`, as the events of a streamed response
+        response = await self.get_response(
+            system_instructions, input, model_settings, tools, output_schema, handoffs, tracing
+        )
+        streamed = Response(
+            id="mock",
+            created_at=time.time(),
+            model="mock",
+            object="response",
+            output=[],
+            tool_choice="auto",
+            tools=[],
+            parallel_tool_calls=False,
+        )
+        yield ResponseCreatedEvent(response=streamed, type="response.created")
+        for index, item in enumerate(response.output):
+            yield ResponseOutputItemAddedEvent(
+                item=item, output_index=index, type="response.output_item.added"
+            )
+            if isinstance(item, ResponseFunctionToolCall):
+                yield ResponseFunctionCallArgumentsDeltaEvent(
+                    delta=item.arguments,
+                    item_id=item.id,
+                    output_index=index,
+                    type="response.function_call_arguments.delta",
+                )
+            else:
+                for content_index, part in enumerate(item.content):
+                    yield ResponseContentPartAddedEvent(
+                        content_index=content_index,
+                        item_id=item.id,
+                        output_index=index,
+                        part=ResponseOutputText(annotations=[], text="", type="output_text"),
+                        type="response.content_part.added",
+                    )
+                    # A few tokens per event, like the API
+                    for start in range(0, len(part.text), 16):
+                        yield ResponseTextDeltaEvent(
+                            content_index=content_index,
+                            delta=part.text[start : start + 16],
+                            item_id=item.id,
+                            output_index=index,
+                            type="response.output_text.delta",
+                        )
+                    yield ResponseContentPartDoneEvent(
+                        content_index=content_index,
+                        item_id=item.id,
+                        output_index=index,
+                        part=part,
+                        type="response.content_part.done",
+                    )
+            yield ResponseOutputItemDoneEvent(
+                item=item, output_index=index, type="response.output_item.done"
+            )
+        usage = response.usage
+        yield ResponseCompletedEvent(
+            response=streamed.model_copy(
+                update={
+                    "output": response.output,
+                    "usage": ResponseUsage(
+                        input_tokens=usage.input_tokens,
+                        output_tokens=usage.output_tokens,
+                        output_tokens_details=OutputTokensDetails(reasoning_tokens=0),
+                        total_tokens=usage.total_tokens,
+                    ),
+                }
+            ),
+            type="response.completed",
+        )
+
+    @staticmethod
+    def _raise_error(kind: str):
+        request = httpx.Request("POST", "https://mock.invalid/v1/responses")
+        if kind == "rate_limit":
+            response = httpx.Response(429, request=request, headers={"retry-after-ms": "10"})
+            raise RateLimitError("Rate limit reached (mock)", response=response, body=None)
+        if kind == "server_error":
+            response = httpx.Response(500, request=request)
+            raise InternalServerError("Server error (mock)", response=response, body=None)
+        if kind == "timeout":
+            raise APITimeoutError(request=request)
+        raise ValueError(f"Unknown mock error kind: {kind}")
+
+    @staticmethod
+    def _handoff(texts, handoffs, rng) -> ResponseFunctionToolCall:
+        """
+        Pick the handoff the request asks for (e.g. "Use the 'get_answer' agent").
+        """
+        last_message = next((text for role, text in reversed(texts) if role == "user"), "")
+        handoff = handoffs[0]
+        for candidate in handoffs:
+            if candidate.agent_name in last_message:
+                handoff = candidate
+        if "provide a topic" in last_message:
+            handoff = next(
+                (candidate for candidate in handoffs if candidate.agent_name == "generate_topic"),
+                handoff,
+            )
+        return ResponseFunctionToolCall(
+            id="mock",
+            call_id=f"call_{rng.getrandbits(64):016x}",
+            name=handoff.tool_name,
+            arguments="{}",
+            type="function_call",
+            status="completed",
+        )
+
+    def _respond(self, output_type, texts, rng) -> dict[str, Any]:
+        if output_type is GetTopic:
+            # Like the API, mostly (but not always) steer clear of the topics already used
+            match = _USED_TOPICS.search(texts[-1][1]) if texts else None
+            used = set(match.group(1).split("; ")) if match else set()
+            fresh = sorted(set(TOPIC_KNOWLEDGE) - used)
+            topic = rng.choice(fresh if fresh and rng.random() < 0.9 else sorted(TOPIC_KNOWLEDGE))
+            category, sub_category, _ = TOPIC_KNOWLEDGE[topic]
+            return {
+                "reasoning": "Picked from the knowledge table.",
+                "category": category,
+                "sub_category": sub_category,
+                "topic": topic,
+            }
+        if output_type is GetAnswer:
+            topic, question = self._find_topic(texts), self._find_question(texts)
+            return {
+                "reasoning": f"Looked up '{question}' for {topic}.",
+                "answer": oracle_answer(topic, question) if topic else "No",
+            }
+        if output_type is ValidateAnswer:
+            topic = self._find_topic(texts)
+            proposal = next(
+                (match.group(1) for _, text in texts if (match := _PROPOSED.search(text))),
+                None,
+            )
+            is_correct = (
+                topic is not None
+                and proposal is not None
+                and normalize_topic(proposal) == normalize_topic(topic)
+            )
+            return {"reasoning": f"Compared {proposal} with {topic}.", "is_correct": is_correct}
+        if output_type is HostDecisions:
+            decisions = []
+            for item in json.loads(texts[-1][1]):
+                topic = item["topic"]
+                if "question" in item:
+                    decision = {
+                        "reasoning": f"Looked up '{item['question']}' for {topic}.",
+                        "answer": oracle_answer(topic, item["question"]),
+                    }
+                else:
+                    proposal = item["topic_proposal"]
+                    decision = {
+                        "reasoning": f"Compared {proposal} with {topic}.",
+                        "is_correct": normalize_topic(proposal) == normalize_topic(topic),
+                    }
+                decisions.append({"id": item["id"], **decision})
+            return {"decisions": decisions}
+        if output_type is GetQuestion:
+            return self._question(texts, rng)
+        if output_type is SummarizeHistory:
+            facts, _ = _facts(texts)
+            return {
+                "reasoning": "Kept the answered questions.",
+                "summary": "\n".join(f"- {question} -> {answer}" for question, answer in facts),
+            }
+        raise ValueError(f"The mock backend cannot produce {output_type}")
+
+    @staticmethod
+    def _find_topic(texts) -> str | None:
+        for role, text in texts:
+            match = _GIVEN_TOPIC.search(text)
+            if match:
+                return match.group(1)
+            if role == "assistant" and text.startswith("{"):
+                try:
+                    topic = json.loads(text).get("topic")
+                except json.JSONDecodeError:
+                    continue
+                if topic:
+                    return topic
+        return None
+
+    @staticmethod
+    def _find_question(texts) -> str:
+        for role, text in reversed(texts):
+            if role == "user":
+                match = _ASKED.search(text)
+                if match:
+                    return match.group(1)
+        return ""
+
+    def _question(self, texts, rng) -> dict[str, Any]:
+        """
+        Ask the question that best splits the topics consistent with the answers so far,
+        and propose the topic once a single candidate is left. Like the model is asked to,
+        the mock follows the suggestions of the question planner, if any (see planner.py).
+        """
+        request = next((text for role, text in reversed(texts) if role == "user"), "")
+        planned_question = _PLANNED_QUESTION.search(request)
+        planned_proposal = _PLANNED_PROPOSAL.search(request)
+        if planned_question or planned_proposal:
+            return {
+                "reasoning": "Followed the planner.",
+                "question": planned_question.group(1) if planned_question else rng.choice(FILLER_QUESTIONS),
+                "topic_proposal": planned_proposal.group(1) if planned_proposal else None,
+            }
+        facts, rejected = _facts(texts)
+        known = {}
+        for question, answer in facts:
+            match = _QUESTION.match(question)
+            if match and match.group(1) in ATTRIBUTES:
+                known[match.group(1)] = answer == "Yes"
+        candidates = [
+            topic
+            for topic, (_, _, attributes) in sorted(TOPIC_KNOWLEDGE.items())
+            if topic not in rejected
+            and all((attribute in attributes) == value for attribute, value in known.items())
+        ] or sorted(set(TOPIC_KNOWLEDGE) - rejected) or sorted(TOPIC_KNOWLEDGE)
+
+        splits = [
+            (abs(2 * sum(attribute in TOPIC_KNOWLEDGE[topic][2] for topic in candidates) - len(candidates)), attribute)
+            for attribute in ATTRIBUTES
+            if attribute not in known
+        ]
+        informative = [split for split in splits if split[0] < len(candidates)]
+        if informative and rng.random() < self.provider.guesser_accuracy:
+            question = f"Is it {min(informative)[1]}?"
+        else:
+            question = rng.choice(FILLER_QUESTIONS)
+
+        topic_proposal = candidates[0] if len(candidates) == 1 or not informative else None
+        return {
+            "reasoning": f"{len(candidates)} candidate topics are left.",
+            "question": question,
+            "topic_proposal": topic_proposal,
+        }
+
+
+class MockModelProvider(ModelProvider):
+    """
+    Provides the mock model for every model name.
+
+    :param seed: Seed of the random draws (each draw also depends on the request)
+    :param latency_median: Median latency of a call in seconds (0 for no delay)
+    :param latency_sigma: Spread of the log-normal latency distribution
+    :param error_rate: Probability that a call fails
+    :param error_kinds: Kinds of errors raised ("rate_limit", "server_error", "timeout")
+    :param guesser_accuracy: Probability that the Guesser asks the most informative question
+    :param max_tracked_requests: Number of distinct requests whose repeats are counted (the
+        least recently made are forgotten, and draw as if made for the first time)
+    """
+
+    def __init__(
+        self,
+        seed: int = mock_seed,
+        latency_median: float = mock_latency_median,
+        latency_sigma: float = mock_latency_sigma,
+        error_rate: float = mock_error_rate,
+        error_kinds: tuple[str, ...] = mock_error_kinds,
+        guesser_accuracy: float = mock_guesser_accuracy,
+        max_tracked_requests: int = mock_max_tracked_requests,
+    ):
+        self.seed = seed
+        self.latency_median = latency_median
+        self.latency_sigma = latency_sigma
+        self.error_rate = error_rate
+        self.error_kinds = tuple(error_kinds)
+        self.guesser_accuracy = guesser_accuracy
+        self.max_tracked_requests = max_tracked_requests
+        # Number of occurrences of each request, least recently made first
+        self._num_requests: OrderedDict[str, int] = OrderedDict()
+        # Prefixes of the recent requests, to simulate the provider's prompt cache
+        self.prompt_cache = PrefixTracker()
+        self._model = MockModel(self)
+
+    def get_model(self, model_name: str | None) -> Model:
+        return self._model
+
+    def random_for(self, system_instructions: str | None, model_input: Any) -> random.Random:
+        """
+        Get the random generator of a request. The n-th occurrence of a request always gets
+        the same generator, so retries of a failed request draw anew and reruns replay.
+
+        :param system_instructions: System prompt of the request
+        :param model_input: Input of the request
+        :returns: The random generator
+        """
+        request = json.dumps([system_instructions, model_input], sort_keys=True, default=str)
+        # The unique seeds of the topic requests would make every run different
+        request = _UUID.sub("<uuid>", request)
+        digest = hashlib.sha256(request.encode()).hexdigest()
+        occurrence = self._num_requests.pop(digest, 0)
+        self._num_requests[digest] = occurrence + 1
+        if len(self._num_requests) > self.max_tracked_requests:
+            self._num_requests.popitem(last=False)
+        return random.Random(f"{self.seed}:{digest}:{occurrence}")
+
+    async def acreate_chat_completion(self, body: dict) -> dict:
+        """
+        Answer a Chat Completions request like the mock model answers the agent making it
+        (e.g. the requests of a local batch, see batch.py).
+
+        :param body: Body of the chat completion request
+        :returns: Body of the chat completion
+        """
+        messages = body["messages"]
+        system_instructions = next(
+            (message["content"] for message in messages if message["role"] == "system"), None
+        )
+        model_input = [message for message in messages if message["role"] != "system"]
+        output_schema = None
+        response_format = body.get("response_format")
+        if response_format is not None:
+            properties = response_format["json_schema"]["schema"]["properties"]
+            output_schema = SimpleNamespace(
+                output_type=_OUTPUT_TYPES[frozenset(properties)], is_plain_text=lambda: False
+            )
+        # The handoffs are function tools named after their agent (see `Handoff.default_tool_name`)
+        handoffs = [
+            SimpleNamespace(
+                tool_name=tool["function"]["name"],
+                agent_name=tool["function"]["name"].removeprefix("transfer_to_"),
+            )
+            for tool in body.get("tools", [])
+        ]
+        response = await self._model.get_response(
+            system_instructions, model_input, None, [], output_schema, handoffs, None
+        )
+        output = response.output[0]
+        if isinstance(output, ResponseFunctionToolCall):
+            message = {
+                "role": "assistant",
+                "content": None,
+                "tool_calls": [
+                    {
+                        "id": output.call_id,
+                        "type": "function",
+                        "function": {"name": output.name, "arguments": output.arguments},
+                    }
+                ],
+            }
+        else:
+            message = {"role": "assistant", "content": output.content[0].text}
+        usage = response.usage
+        return {
+            "id": f"chatcmpl-mock-{usage.input_tokens}-{time.time_ns()}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body["model"],
+            "choices": [
+                {
+                    "index": 0,
+                    "message": message,
+                    "finish_reason": "tool_calls" if "tool_calls" in message else "stop",
+                }
+            ],
+            "usage": {
+                "prompt_tokens": usage.input_tokens,
+                "completion_tokens": usage.output_tokens,
+                "total_tokens": usage.total_tokens,
+                "prompt_tokens_details": {"cached_tokens": usage.cached_input_tokens},
+            },
+        }
+
+
+_backends: dict[str, tuple[ModelProvider, RateLimiter | None]] = {}
+_backends_pid: int | None = None
+
+
+def get_backend(name: str | None = None) -> tuple[ModelProvider, RateLimiter | None]:
+    """
+    Get the process-wide model provider and rate limiter of a backend. All games of a
+    process share them, so that (without latency or errors, whose timing reorders the
+    requests of concurrent games) the mock backend replays the same games for a seed.
+
+    :param name: "openai" or "mock" (defaults to `model_backend` from config.py)
+    :returns: Tuple of (model provider, rate limiter); a None rate limiter stands for the
+        process-wide one
+    """
+    global _backends_pid
+    name = name or model_backend
+    if name not in ("openai", "mock"):
+        raise ValueError(f"Unknown backend: {name}. Use 'openai' or 'mock'.")
+    if _backends_pid != os.getpid():
+        _backends_pid = os.getpid()
+        _backends.clear()
+    if name not in _backends:
+        if name == "openai":
+            # The API's connections are pooled per event loop (see clients.py)
+            _backends[name] = (PooledOpenAIProvider(), None)
+        else:
+            # Traces of mock games are noise (and would be uploaded with an API key set)
+            set_tracing_disabled(True)
+            # The mock has no per-minute limits to respect
+            _backends[name] = (MockModelProvider(), RateLimiter({}))
+    return _backends[name]
@@ -1,111 +1,654 @@
 """
-Simplified script for running multiple games of N questions concurrently using multiprocessing.
+Simplified script for running multiple games of N questions concurrently.
+
+Four execution modes are supported:
+- "process": one game per worker process at a time (multiprocessing pool).
+- "async": many games per process, scheduled on a single event loop with a
+  concurrency cap. Optionally sharded across processes (one event loop per process).
+- "batch": all games in lockstep on one event loop, their requests submitted
+  together through a batch backend (see batch.py).
+- "server": the games are sent to a running game server, whose warm worker processes
+  are reused across tournaments (see game_server.py).
 """
 
-from game import play_game
+from game import play_game, aplay_game
+from config import log_dir, max_concurrent_games_per_loop
+from utils import run_sync
+from response_cache import flush_cache_stats, get_response_cache, format_cache_stats
+from topic_matcher import get_topic_matcher
+from log_writer import flush_logs
+from checkpoints import CheckpointStore
+from game_server import GameClient, metrics_run_name
+from metrics import (
+    Histogram,
+    clear_metrics,
+    format_metrics_summary,
+    get_metrics,
+    start_metrics_export,
+    start_metrics_run,
+    write_metrics_file,
+    write_metrics_snapshot,
+)
+from config import metrics_host as default_metrics_host
+from config import metrics_port as default_metrics_port
+import asyncio
+import contextlib
 import fire
 import multiprocessing
 import os
+import queue
+import sys
 import time
 import shutil
+from typing import Any, Callable, Iterable
+
+
+class TournamentStats:
+    """
+    Statistics of a tournament, updated as each game finishes, so that any number of
+    games can be summarised in bounded memory (apart from the small (win, topic) result
+    of each game).
+
+    :param max_errors: Number of error messages kept as examples
+    """
+
+    def __init__(self, max_errors: int = 5):
+        self.num_games = 0
+        self.num_wins = 0
+        self.num_errors = 0
+        self.errors: list[str] = []
+        self.max_errors = max_errors
+        # (win, topic) of each successful game
+        self.results: list[tuple[bool, str]] = []
+        self.total_tokens = 0
+        self.total_requests = 0
+        self.total_rounds = 0
+        self.total_duration = 0.0
+        # Duration of the games, in seconds
+        self.game_seconds = Histogram()
+        self.num_speculative = 0
+        self.seconds_saved = 0.0
+        self.tokens_discarded = 0
+
+    @property
+    def num_successful(self) -> int:
+        return self.num_games - self.num_errors
+
+    @property
+    def win_rate(self) -> float:
+        return self.num_wins / self.num_successful if self.num_successful else 0.0
+
+    def add(self, outcome: tuple[Any, str | None]):
+        """
+        Account for a finished game.
+
+        :param outcome: The (result, error) tuple of the game
+        """
+        result, error = outcome
+        self.num_games += 1
+        if error or result is None:
+            self.num_errors += 1
+            if error and len(self.errors) < self.max_errors:
+                self.errors.append(error)
+            return
+
+        win, topic, game_stats = result
+        self.results.append((win, topic))
+        self.num_wins += win
+        self.total_tokens += game_stats["total_tokens"]
+        self.total_requests += sum(
+            agent_usage["requests"] for agent_usage in game_stats["usage"].values()
+        )
+        self.total_rounds += game_stats["num_rounds"]
+        self.total_duration += game_stats["duration"]
+        self.game_seconds.observe(game_stats["duration"])
+        if "speculation" in game_stats:
+            self.num_speculative += 1
+            self.seconds_saved += game_stats["speculation"]["seconds_saved"]
+            self.tokens_discarded += game_stats["speculation"]["tokens_discarded"]
 
+    def summary(self) -> dict[str, Any]:
+        """
+        Summarise the tournament.
 
-def run_game_safely(game_id):
+        :returns: Games played, wins, win rate, failures, tokens per game and game durations
+        """
+        return {
+            "games_played": self.num_games,
+            "games_won": self.num_wins,
+            "win_rate": self.win_rate,
+            "failed_games": self.num_errors,
+            "tokens_per_game": self.total_tokens / max(self.num_successful, 1),
+            "p50_game_seconds": self.game_seconds.quantile(0.5),
+            "p95_game_seconds": self.game_seconds.quantile(0.95),
+        }
+
+
+def run_game_safely(game_id, game_kwargs=None):
     """
     Run a single game with error handling.
 
     :param game_id: ID of the game for logging purposes
-    :returns: The result of the game or None if an error occurred
+    :param game_kwargs: Optional keyword arguments for `play_game`
+    :returns: The result of the game (win, topic, stats) or None if an error occurred
+    """
+    try:
+        return play_game(**(game_kwargs or {}), return_stats=True), None
+    except Exception as e:
+        return None, f"Game {game_id} failed: {e!r}"
+    finally:
+        # The worker may be terminated before its next periodic snapshot, and before its
+        # queued logs are written
+        write_metrics_snapshot()
+        flush_logs()
+        flush_cache_stats()
+
+
+async def arun_game_safely(
+    game_id, semaphore: asyncio.Semaphore | None = None, game_kwargs=None
+):
+    """
+    Run a single game on the event loop with error handling.
+
+    :param game_id: ID of the game for logging purposes
+    :param semaphore: Semaphore capping the number of games in flight (None if the
+        caller caps them)
+    :param game_kwargs: Optional keyword arguments for `aplay_game`
+    :returns: The result of the game (win, topic, stats) or None if an error occurred
+    """
+    async with semaphore or contextlib.nullcontext():
+        try:
+            return await aplay_game(**(game_kwargs or {}), return_stats=True), None
+        except Exception as e:
+            return None, f"Game {game_id} failed: {e!r}"
+
+
+async def aplay_games(
+    game_ids: Iterable[int],
+    max_concurrent: int,
+    on_complete=None,
+    game_kwargs=None,
+    should_stop: Callable[[], bool] | None = None,
+):
+    """
+    Play games concurrently on the running event loop. A game is only started once a
+    slot is free, so `game_ids` can be arbitrarily long (e.g. a range).
+
+    :param game_ids: IDs of the games to play
+    :param max_concurrent: Maximum number of games in flight at once
+    :param on_complete: Optional callback called with (result, error) as each game finishes
+    :param game_kwargs: Optional keyword arguments for `aplay_game`
+    :param should_stop: Optional callable checked before each game is started; once it
+        returns True, no more games are started (the games in flight are finished)
+    :returns: A list of (result, error) tuples in completion order, or None if `on_complete`
+        is given (the outcomes are then only passed to the callback, in bounded memory)
+    """
+    semaphore = asyncio.Semaphore(max_concurrent)
+    outcomes = [] if on_complete is None else None
+    games = set()
+
+    async def play(game_id):
+        try:
+            outcome = await arun_game_safely(game_id, game_kwargs=game_kwargs)
+        finally:
+            semaphore.release()
+        if on_complete is not None:
+            on_complete(outcome)
+        else:
+            outcomes.append(outcome)
+
+    for game_id in game_ids:
+        await semaphore.acquire()
+        if should_stop is not None and should_stop():
+            semaphore.release()
+            break
+        game = asyncio.create_task(play(game_id))
+        games.add(game)
+        game.add_done_callback(games.discard)
+    await asyncio.gather(*games)
+    return outcomes
+
+
+# Set in the shard processes of the "async" mode (see `_init_shard`)
+_shard_outcomes: "multiprocessing.Queue | None" = None
+_shard_stop: Any = None
+
+
+def _init_shard(outcomes: multiprocessing.Queue, stop):
+    """
+    Initialise a shard process with the queue streaming the outcomes to the parent and
+    the event telling it to stop starting games.
+    """
+    global _shard_outcomes, _shard_stop
+    _shard_outcomes = outcomes
+    _shard_stop = stop
+
+
+def run_games_shard(game_ids: Iterable[int], max_concurrent: int, game_kwargs=None) -> int:
     """
+    Play a shard of games on this process' event loop (used as a pool task). The outcome
+    of each game is streamed to the parent process as soon as the game finishes.
+
+    :param game_ids: IDs of the games in this shard
+    :param max_concurrent: Maximum number of games in flight in this shard
+    :param game_kwargs: Optional keyword arguments for `aplay_game`
+    :returns: The number of games played
+    """
+    num_played = 0
+
+    def report(outcome):
+        nonlocal num_played
+        num_played += 1
+        _shard_outcomes.put(outcome)
+
     try:
-        return play_game(), None
+        run_sync(
+            aplay_games(
+                game_ids, max_concurrent, report, game_kwargs, should_stop=_shard_stop.is_set
+            )
+        )
     except Exception as e:
-        return None, f"Game {game_id} failed: {str(e)}"
+        # The games in flight are lost, but not the outcomes already streamed
+        report((None, f"Shard of games {game_ids} failed: {e!r}"))
+    write_metrics_snapshot()
+    flush_logs()
+    flush_cache_stats()
+    return num_played
+
+
+def _play_games_in_processes(
+    num_games, max_concurrent, on_complete, should_stop, game_kwargs
+):
+    """
+    Play games with one game per worker process at a time. Games are submitted as
+    workers free up (a few ahead per worker), and handed to `on_complete` as they finish.
+    """
+    max_concurrent = (
+        multiprocessing.cpu_count() if max_concurrent is None else max_concurrent
+    )
+    outcomes = queue.Queue()
+    with multiprocessing.Pool(processes=max_concurrent) as pool:
+        num_submitted = 0
+        num_in_flight = 0
+        while True:
+            while (
+                num_submitted < num_games
+                and num_in_flight < 2 * max_concurrent
+                and not should_stop()
+            ):
+                pool.apply_async(
+                    run_game_safely,
+                    (num_submitted, game_kwargs),
+                    callback=outcomes.put,
+                    error_callback=lambda e: outcomes.put(
+                        (None, f"Error getting result: {str(e)}")
+                    ),
+                )
+                num_submitted += 1
+                num_in_flight += 1
+            if num_in_flight == 0:
+                break
+            outcome = outcomes.get()
+            num_in_flight -= 1
+            on_complete(outcome)
+
+
+def _play_games_on_event_loops(
+    num_games, max_concurrent, num_shards, on_complete, should_stop, game_kwargs
+):
+    """
+    Play games concurrently on event loops, optionally one loop per process shard.
+    """
+    max_concurrent = (
+        max_concurrent_games_per_loop if max_concurrent is None else max_concurrent
+    )
+    if num_shards <= 1:
+        asyncio.run(
+            aplay_games(
+                range(num_games), max_concurrent, on_complete, game_kwargs, should_stop
+            )
+        )
+        return
+
+    outcomes = multiprocessing.Queue()
+    stop = multiprocessing.Event()
+    with multiprocessing.Pool(
+        processes=num_shards, initializer=_init_shard, initargs=(outcomes, stop)
+    ) as pool:
+        async_results = [
+            pool.apply_async(
+                run_games_shard,
+                (range(i, num_games, num_shards), max_concurrent, game_kwargs),
+            )
+            for i in range(num_shards)
+        ]
+        num_received = 0
+        # Number of outcomes streamed by each finished shard
+        num_played: dict[int, int] = {}
+        while True:
+            try:
+                outcome = outcomes.get(timeout=0.1)
+            except queue.Empty:
+                # The shards report how many games they played once they are done
+                for shard, result in enumerate(async_results):
+                    if shard in num_played or not result.ready():
+                        continue
+                    try:
+                        num_played[shard] = result.get()
+                    except Exception as e:
+                        # e.g. the shard could not be started; the other shards play on
+                        num_played[shard] = 0
+                        on_complete((None, f"Shard {shard} failed: {e!r}"))
+                if len(num_played) == num_shards and num_received == sum(num_played.values()):
+                    break
+                continue
+            num_received += 1
+            on_complete(outcome)
+            if should_stop():
+                stop.set()
+
+
+def _play_games_in_batches(num_games, on_complete, game_kwargs):
+    """
+    Play all games in lockstep on one event loop, submitting their requests in batches.
+    """
+    from batch import BatchModelProvider, BatchScheduler, create_batch_backend
+    from rate_limiter import RateLimiter
+
+    async def play():
+        scheduler = BatchScheduler(create_batch_backend())
+        batch_game_kwargs = {
+            **game_kwargs,
+            "model_provider": BatchModelProvider(scheduler),
+            # Batches are not subject to the per-minute limits of the synchronous API
+            "rate_limiter": RateLimiter({}),
+        }
+        # Every game must be running, since a batch is only sent once all games wait on it
+        await scheduler.run(
+            (
+                arun_game_safely(game_id, game_kwargs=batch_game_kwargs)
+                for game_id in range(num_games)
+            ),
+            on_complete=on_complete,
+        )
+        print(
+            f"Batches submitted: {scheduler.num_batches} "
+            f"({scheduler.num_requests} requests)"
+        )
+
+    asyncio.run(play())
 
 
 def play_games(
-    num_games: int = 5,
+    num_games: int | None = 5,
     clear_logs: bool = True,
     max_concurrent: int = None,
     show_progress: bool = True,
+    mode: str = "process",
+    num_shards: int = 1,
+    max_num_rounds: int = 20,
+    memory_strategy: str | None = None,
+    dispatch_mode: str | None = None,
+    speculative: bool | None = None,
+    hedge: bool | None = None,
+    batch_host: bool | None = None,
+    plan: bool | None = None,
+    checkpoint: bool | None = None,
+    resume: bool = False,
+    backend: str | None = None,
+    metrics_port: int | None = default_metrics_port,
+    metrics_host: str = default_metrics_host,
+    time_budget: float | None = None,
+    return_summary: bool = False,
 ):
     """
-    Play multiple games concurrently using multiprocessing.
+    Play multiple games concurrently.
 
-    :param num_games: The number of games to run in total
+    :param num_games: The maximum number of games to run in total (None: no limit, the
+        games run until the `time_budget` is spent)
     :param clear_logs: Whether to clear logs before starting
-    :param max_concurrent: Maximum processes to run concurrently (defaults to CPU count)
+    :param max_concurrent: Maximum games to run concurrently. In "process" mode this is
+        the number of processes (defaults to CPU count); in "async" mode it is the number
+        of games in flight per event loop (defaults to `max_concurrent_games_per_loop`)
     :param show_progress: Whether to show basic progress updates
-    :returns: A list of results from successful games
+    :param mode: "process" (one game per process), "async" (many games per event loop),
+        "batch" (all games in lockstep, their requests sent as batches; see batch.py) or
+        "server" (on the warm workers of a running game server; see game_server.py)
+    :param num_shards: In "async" mode, the number of processes, each running its own event loop
+    :param max_num_rounds: The maximum number of rounds per game
+    :param memory_strategy: Conversation memory of the agents ("full", "window", "ledger" or
+        "summary"). If None, `memory_strategy` from config.py is used.
+    :param dispatch_mode: "handoff" or "direct" (see `play_game`). If None, `dispatch_mode`
+        from config.py is used.
+    :param speculative: Whether to overlap independent LLM calls within each round (see
+        `play_game`). If None, `speculative_execution` from config.py is used.
+    :param hedge: Whether to hedge the Host's slow answers with a duplicate request (see
+        `play_game`). If None, `hedge_requests` from config.py is used.
+    :param batch_host: Whether to batch the Host's decisions of the games running on the same
+        event loop in "direct" dispatch mode (see `play_game`). If None, `host_batching` from
+        config.py is used.
+    :param plan: Whether to suggest the most informative questions to the Guesser (see
+        `play_game`). If None, `question_planner` from config.py is used.
+    :param checkpoint: Whether to checkpoint every round of the games, so the failed ones can be
+        resumed (see checkpoints.py). If None, `checkpoint_games` from config.py is used.
+    :param resume: Whether each game first resumes a pending checkpoint (e.g. of a game that
+        failed in an earlier tournament); the games play new games once none is left.
+    :param backend: Backend of the models: "openai" or "mock" (a local stand-in, see
+        model_backends.py). If None, `model_backend` from config.py is used. In "batch" mode the
+        requests always go through the batch backend.
+    :param metrics_port: Port on which to serve the metrics of the LLM calls in the Prometheus
+        format while the games run (see metrics.py). If None, no endpoint is started.
+    :param metrics_host: Address the metrics endpoint listens on (the local machine only by
+        default)
+    :param time_budget: Seconds after which no more games are started (the games in flight
+        are finished). Only supported in the "process" and "async" modes.
+    :param return_summary: Whether to also return the summary of the tournament
+    :returns: A list of (win, topic) results from successful games, or a tuple of (results,
+        summary of the tournament; see `TournamentStats.summary`) if `return_summary` is True
     """
+    stats = run_games(
+        num_games,
+        clear_logs,
+        max_concurrent,
+        show_progress,
+        mode,
+        num_shards,
+        game_kwargs={
+            "max_num_rounds": max_num_rounds,
+            "memory_strategy": memory_strategy,
+            "dispatch_mode": dispatch_mode,
+            "speculative": speculative,
+            "hedge": hedge,
+            "batch_host": batch_host,
+            "plan": plan,
+            "checkpoint": checkpoint,
+            "resume": resume or None,
+            "backend": backend,
+        },
+        metrics_port=metrics_port,
+        metrics_host=metrics_host,
+        time_budget=time_budget,
+    )
+    if return_summary:
+        return stats.results, stats.summary()
+    return stats.results
+
+
+def run_games(
+    num_games,
+    clear_logs,
+    max_concurrent,
+    show_progress,
+    mode,
+    num_shards,
+    game_kwargs,
+    metrics_port=None,
+    metrics_host=default_metrics_host,
+    time_budget=None,
+) -> TournamentStats:
+    """
+    Play multiple games concurrently and print a summary (see `play_games`). The outcomes
+    are aggregated as the games finish, so memory does not grow with the number of games.
+
+    :returns: The statistics of the tournament
+    """
+    # Imported here, as it imports the Agents SDK, which e.g. `--help` does not need
+    from topic_pool import format_pool_stats, get_topic_pool
+
+    if num_games is None and time_budget is None:
+        raise ValueError("Set num_games, time_budget or both.")
+    if time_budget is not None and mode not in ("process", "async"):
+        raise ValueError("time_budget is only supported in the 'process' and 'async' modes.")
     start_time = time.time()
 
     # Clear logs if requested
     if clear_logs:
         try:
-            shutil.rmtree("game_logs")
+            shutil.rmtree(log_dir)
         except FileNotFoundError:
             pass
-        os.makedirs("game_logs", exist_ok=True)
+        os.makedirs(log_dir, exist_ok=True)
 
-    # Create a pool of workers
-    max_concurrent = (
-        multiprocessing.cpu_count() if max_concurrent is None else max_concurrent
-    )
-    with multiprocessing.Pool(processes=max_concurrent) as pool:
-        # Submit all tasks to the pool with game IDs
-        async_results = [
-            pool.apply_async(run_game_safely, (i,)) for i in range(num_games)
-        ]
+    response_cache = get_response_cache()
+    if response_cache is not None:
+        cache_stats_before = response_cache.stats(persistent=True)
+    topic_pool = get_topic_pool()
+    if topic_pool is not None:
+        pool_stats_before = topic_pool.stats()
 
-        # Track progress
-        completed = 0
-        results = []
-        errors = []
+    if mode == "server":
+        # The metrics come from the server's workers, which reset them when a tournament starts
+        start_metrics_run(metrics_run_name())
+        get_metrics().reset()
+    else:
+        start_metrics_run()
+        clear_metrics()
+    start_metrics_export(metrics_port, metrics_host)
 
-        # Wait for all processes to complete
-        for async_result in async_results:
-            try:
-                # Get the result (blocks until available)
-                result, error = async_result.get()
-
-                if error:
-                    errors.append(error)
-                elif result is not None:
-                    results.append(result)
-
-                # Update progress
-                completed += 1
-                if show_progress:
-                    print(
-                        f"Progress: {completed}/{num_games} games ({completed / num_games * 100:.1f}%)"
-                    )
-            except Exception as e:
-                errors.append(f"Error getting result: {str(e)}")
+    stats = TournamentStats()
+
+    def report_progress(outcome):
+        stats.add(outcome)
+        if show_progress:
+            if num_games is not None:
+                progress = (
+                    f"{stats.num_games}/{num_games} games "
+                    f"({stats.num_games / num_games * 100:.1f}%)"
+                )
+            else:
+                progress = (
+                    f"{stats.num_games} games "
+                    f"({time.time() - start_time:.0f}/{time_budget:.0f} seconds)"
+                )
+            print(
+                f"Progress: {progress}, win rate: {stats.win_rate * 100:.1f}%, "
+                f"p50 game: {stats.game_seconds.quantile(0.5):.1f}s"
+            )
+
+    def should_stop():
+        return time_budget is not None and time.time() - start_time >= time_budget
+
+    if num_games is None:
+        num_games_scheduled = sys.maxsize
+    else:
+        num_games_scheduled = num_games
+
+    if mode == "process":
+        _play_games_in_processes(
+            num_games_scheduled, max_concurrent, report_progress, should_stop, game_kwargs
+        )
+    elif mode == "async":
+        _play_games_on_event_loops(
+            num_games_scheduled,
+            max_concurrent,
+            num_shards,
+            report_progress,
+            should_stop,
+            game_kwargs,
+        )
+    elif mode == "batch":
+        _play_games_in_batches(num_games, report_progress, game_kwargs)
+    elif mode == "server":
+        GameClient().play(num_games, game_kwargs, on_complete=report_progress)
+    else:
+        raise ValueError(
+            f"Unknown mode: {mode}. Use 'process', 'async', 'batch' or 'server'."
+        )
 
     # Basic stats
     total_time = time.time() - start_time
-    successful_games = len(results)
-    games_won = sum(1 for win, _ in results if win)
 
     print("\n========== RESULTS ==========")
-    print(f"Games played: {num_games} in {total_time:.2f} seconds")
-    print(f"Games won: {games_won}")
-    print(f"Win rate: {games_won / successful_games * 100:.1f}%")
-    print(f"Failed games: {len(errors)}")
+    print(f"Games played: {stats.num_games} in {total_time:.2f} seconds")
+    print(f"Games won: {stats.num_wins}")
+    print(f"Win rate: {stats.win_rate * 100:.1f}%")
+    print(f"Failed games: {stats.num_errors}")
 
-    if errors:
+    if stats.errors:
         print("\nErrors encountered:")
-        for error in errors[:5]:  # Show first 5 errors
+        for error in stats.errors:
             print(f"- {error}")
-        if len(errors) > 5:
-            print(f"... and {len(errors) - 5} more errors")
+        if stats.num_errors > len(stats.errors):
+            print(f"... and {stats.num_errors - len(stats.errors)} more errors")
+
+    if game_kwargs.get("checkpoint") or game_kwargs.get("resume"):
+        num_checkpoints = len(CheckpointStore().game_ids())
+        if num_checkpoints:
+            print(
+                f"{num_checkpoints} failed games can be resumed from their checkpoints "
+                f"(python parallel_game.py --resume)"
+            )
+
+    if stats.num_successful > 0:
+        print(f"\nWin rate: {stats.win_rate * 100:.1f}%")
+        print(f"Average tokens per game: {stats.total_tokens / stats.num_successful:.0f}")
+        print(
+            f"Per round: {stats.total_tokens / stats.total_rounds:.0f} tokens, "
+            f"{stats.total_requests / stats.total_rounds:.1f} LLM requests, "
+            f"{stats.total_duration / stats.total_rounds:.2f} seconds"
+        )
+        print(
+            f"Game duration: p50 {stats.game_seconds.quantile(0.5):.1f}s, "
+            f"p95 {stats.game_seconds.quantile(0.95):.1f}s, "
+            f"p99 {stats.game_seconds.quantile(0.99):.1f}s"
+        )
+        if stats.num_speculative:
+            print(
+                f"Speculation: {stats.seconds_saved / stats.num_speculative:.2f} seconds of "
+                f"critical path saved per game, "
+                f"{stats.tokens_discarded / stats.num_speculative:.0f} tokens per game "
+                f"spent on discarded branches"
+            )
+
+    print(format_metrics_summary(write_metrics_file()))
+
+    topic_matcher = get_topic_matcher()
+    if sum(topic_matcher.stats.values()) > 0:
+        # Only games played in this process (i.e. "async" mode without shards) are counted
+        print(topic_matcher.format_stats())
+
+    if response_cache is not None:
+        # Counters are shared through the persistent tier, so this covers every worker
+        cache_stats = response_cache.stats(persistent=True)
+        print(
+            format_cache_stats(
+                {
+                    name: cache_stats[name] - cache_stats_before[name]
+                    for name in cache_stats
+                }
+            )
+        )
 
-    if successful_games > 0:
-        wins = sum(1 for win, _ in results if win)
-        print(f"\nWin rate: {wins / successful_games * 100:.1f}%")
+    if topic_pool is not None:
+        # Counters are shared through the database, so this covers every worker
+        pool_stats = topic_pool.stats()
+        print(
+            format_pool_stats(
+                {name: pool_stats[name] - pool_stats_before.get(name, 0) for name in pool_stats}
+            )
+        )
 
-    return results
+    return stats
 
 
 if __name__ == "__main__":
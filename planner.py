@@ -0,0 +1,284 @@
+"""
+Information-gain question planner of the Guesser.
+
+The planner keeps a local index of candidate topics and their attributes (a JSON table
+of topic -> attributes, or the table of the mock backend), and tracks the evidence of the
+game: the answers to the questions about an attribute ("Is it <attribute>?") and the
+rejected topic proposals. Each answer may be wrong with probability `planner_answer_noise`,
+so a single wrong answer lowers a topic's probability instead of ruling it out.
+
+Before every question, the planner ranks the attributes by the expected information gain
+of asking about them, as one vectorised computation over the candidates, and suggests the
+best questions to the Guesser's model, which keeps the final say. Once a candidate is
+likely enough, it also suggests proposing it. When every candidate contradicts the answers
+(e.g. the topic is not in the table), the planner stays silent.
+"""
+
+import copy
+import json
+import os
+import re
+from typing import Any, Iterable
+import numpy as np
+from config import (
+    planner_answer_noise,
+    planner_knowledge_path,
+    planner_max_mismatches,
+    planner_num_suggestions,
+    planner_propose_threshold,
+)
+from messages import planner_proposal_message, planner_questions_message
+from topic_matcher import normalize_topic
+
+_QUESTION = re.compile(r"^Is it (.+?)\?$", re.IGNORECASE)
+
+
+class CandidateIndex:
+    """
+    Candidate topics and their attributes, as a boolean matrix.
+
+    :param knowledge: Mapping of each topic to the attributes that hold for it
+    """
+
+    def __init__(self, knowledge: dict[str, Iterable[str]]):
+        self.topics = sorted(knowledge)
+        self.attributes = sorted({attribute for values in knowledge.values() for attribute in values})
+        self._attribute_ids = {attribute.lower(): i for i, attribute in enumerate(self.attributes)}
+        self._topic_ids = {normalize_topic(topic): i for i, topic in enumerate(self.topics)}
+        # matrix[i, j]: whether attribute j holds for topic i
+        self.matrix = np.zeros((len(self.topics), len(self.attributes)), dtype=bool)
+        for i, topic in enumerate(self.topics):
+            for attribute in knowledge[topic]:
+                self.matrix[i, self._attribute_ids[attribute.lower()]] = True
+
+    @classmethod
+    def from_file(cls, path: str) -> "CandidateIndex":
+        """
+        Load the index from a JSON file mapping each topic to its list of attributes.
+
+        :param path: Path of the file
+        :returns: The index
+        """
+        with open(path, encoding="utf-8") as f:
+            return cls(json.load(f))
+
+    def attribute_id(self, question: str) -> int | None:
+        """
+        Find the attribute a question asks about.
+
+        :param question: The question (e.g. "Is it made of metal?")
+        :returns: Index of the attribute, or None if the question is not about a known attribute
+        """
+        match = _QUESTION.match(question.strip())
+        if match is None:
+            return None
+        return self._attribute_ids.get(match.group(1).lower())
+
+    def topic_id(self, topic: str) -> int | None:
+        """
+        Find a topic of the index.
+
+        :param topic: Name of the topic
+        :returns: Index of the topic, or None if it is not in the index
+        """
+        return self._topic_ids.get(normalize_topic(topic))
+
+
+class QuestionPlanner:
+    """
+    Tracks the evidence of a game over the candidate topics and ranks the next questions.
+
+    :param index: Index of the candidate topics
+    :param num_suggestions: Number of questions suggested per round
+    :param answer_noise: Probability that an answer of the Host is wrong
+    :param propose_threshold: Probability of a candidate above which proposing it is suggested
+    :param max_mismatches: Number of answers a candidate may contradict before the planner
+        considers that the topic is not in the index
+    """
+
+    def __init__(
+        self,
+        index: CandidateIndex,
+        num_suggestions: int = planner_num_suggestions,
+        answer_noise: float = planner_answer_noise,
+        propose_threshold: float = planner_propose_threshold,
+        max_mismatches: int = planner_max_mismatches,
+    ):
+        self.index = index
+        self.num_suggestions = num_suggestions
+        self.answer_noise = answer_noise
+        self.propose_threshold = propose_threshold
+        self.max_mismatches = max_mismatches
+        self._reset()
+
+    def _reset(self):
+        """
+        Forget the evidence.
+        """
+        num_topics, num_attributes = self.index.matrix.shape
+        self.mismatches = np.zeros(num_topics, dtype=np.int64)
+        self.matches = np.zeros(num_topics, dtype=np.int64)
+        self.rejected = np.zeros(num_topics, dtype=bool)
+        self.asked = np.zeros(num_attributes, dtype=bool)
+        # Evidence in the order it was gathered, to checkpoint the planner
+        self.observations: list[tuple[str, str]] = []
+
+    def observe(self, question: str, answer: str):
+        """
+        Record the answer to a question. Questions about no known attribute carry no evidence.
+
+        :param question: The question
+        :param answer: "Yes" or "No"
+        """
+        self.observations.append((question, answer))
+        attribute = self.index.attribute_id(question)
+        if attribute is None:
+            return
+        self.asked[attribute] = True
+        holds = self.index.matrix[:, attribute] == (answer == "Yes")
+        self.matches += holds
+        self.mismatches += ~holds
+
+    def reject(self, topic_proposal: str):
+        """
+        Record a rejected topic proposal.
+
+        :param topic_proposal: The rejected topic
+        """
+        self.observations.append((topic_proposal, "Rejected"))
+        topic = self.index.topic_id(topic_proposal)
+        if topic is not None:
+            self.rejected[topic] = True
+
+    def posterior(self) -> np.ndarray | None:
+        """
+        Probability of each candidate topic given the evidence.
+
+        :returns: The probabilities, or None if every candidate contradicts the evidence
+        """
+        plausible = ~self.rejected & (self.mismatches <= self.max_mismatches)
+        if not plausible.any():
+            return None
+        log_weights = self.matches * np.log1p(-self.answer_noise) + self.mismatches * np.log(
+            self.answer_noise
+        )
+        log_weights = np.where(plausible, log_weights, -np.inf)
+        weights = np.exp(log_weights - log_weights.max())
+        return weights / weights.sum()
+
+    def rank_questions(self) -> list[tuple[str, float]]:
+        """
+        Rank the questions about the attributes not asked yet by expected information gain.
+
+        :returns: The informative questions and their expected gain in bits, best first
+        """
+        posterior = self.posterior()
+        if posterior is None:
+            return []
+        # Probability of a "Yes" for every attribute at once, accounting for wrong answers
+        p_holds = posterior @ self.index.matrix
+        p_yes = p_holds * (1 - self.answer_noise) + (1 - p_holds) * self.answer_noise
+        gains = _entropy(p_yes) - _entropy(np.float64(self.answer_noise))
+        gains[self.asked] = 0.0
+        order = np.argsort(-gains, kind="stable")
+        return [
+            (f"Is it {self.index.attributes[j]}?", float(gains[j]))
+            for j in order[: self.num_suggestions]
+            if gains[j] > 1e-9
+        ]
+
+    def suggest(self) -> str | None:
+        """
+        Suggestion for the Guesser's model: the best questions, and the topic to propose
+        once a candidate is likely enough.
+
+        :returns: The suggestion, or None if the planner has nothing to suggest
+        """
+        posterior = self.posterior()
+        if posterior is None:
+            return None
+        suggestions = []
+        best = int(np.argmax(posterior))
+        if posterior[best] >= self.propose_threshold:
+            suggestions.append(
+                planner_proposal_message.format(
+                    topic=self.index.topics[best], probability=posterior[best]
+                )
+            )
+        questions = self.rank_questions()
+        if questions:
+            suggestions.append(
+                planner_questions_message.format(
+                    num_candidates=int(np.count_nonzero(posterior > 1e-3)),
+                    questions=", ".join(
+                        f"'{question}' ({gain:.2f} bits)" for question, gain in questions
+                    ),
+                )
+            )
+        return "\n".join(suggestions) or None
+
+    def copy(self) -> "QuestionPlanner":
+        """
+        Copy the planner (sharing the index), e.g. for a branch of the Guesser.
+
+        :returns: The copy
+        """
+        planner = copy.copy(self)
+        for name in ("mismatches", "matches", "rejected", "asked"):
+            setattr(planner, name, getattr(self, name).copy())
+        planner.observations = list(self.observations)
+        return planner
+
+    def get_state(self) -> dict[str, Any]:
+        """
+        Get the state of the planner (e.g. for a checkpoint of the game).
+
+        :returns: JSON-serialisable state
+        """
+        return {"observations": self.observations}
+
+    def restore_state(self, state: dict[str, Any]):
+        """
+        Restore a state returned by `get_state`, replaying its evidence.
+
+        :param state: The state
+        """
+        self._reset()
+        for question, answer in state["observations"]:
+            if answer == "Rejected":
+                self.reject(question)
+            else:
+                self.observe(question, answer)
+
+
+def _entropy(p: np.ndarray) -> np.ndarray:
+    """
+    Binary entropy in bits, element-wise.
+    """
+    p = np.clip(p, 1e-12, 1 - 1e-12)
+    return -(p * np.log2(p) + (1 - p) * np.log2(1 - p))
+
+
+_candidate_index: CandidateIndex | None = None
+_candidate_index_pid: int | None = None
+
+
+def get_candidate_index() -> CandidateIndex:
+    """
+    Get the process-wide candidate index, loaded from `planner_knowledge_path` or, if it
+    is None, built from the knowledge table of the mock backend.
+
+    :returns: The shared index
+    """
+    global _candidate_index, _candidate_index_pid
+    if _candidate_index is None or _candidate_index_pid != os.getpid():
+        _candidate_index_pid = os.getpid()
+        if planner_knowledge_path is not None:
+            _candidate_index = CandidateIndex.from_file(planner_knowledge_path)
+        else:
+            from model_backends import TOPIC_KNOWLEDGE
+
+            _candidate_index = CandidateIndex(
+                {topic: attributes for topic, (*_, attributes) in TOPIC_KNOWLEDGE.items()}
+            )
+    return _candidate_index
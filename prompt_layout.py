@@ -0,0 +1,135 @@
+"""
+Layout of the model input for provider-side prompt caching.
+
+The providers cache the longest prefix a request shares with recent requests (the OpenAI
+API from 1024 tokens on, in blocks of 128 tokens): the cached part of the input is billed
+at a discount and cuts the time to the first token. So the input of the agents is laid out
+as a byte-stable prefix that only grows at its end, followed by the volatile fields:
+
+- the history of an agent is only ever appended to, and the volatile fields of a request
+  (the round counter, the planner's suggestions) go into the request's own message, last;
+- the Host's history starts with the statement of its topic, however the topic was
+  obtained, instead of the topic request and its unique seed;
+- the "window" and "ledger" memory strategies move their cut `memory_cut_step_turns` turns
+  at a time instead of at every turn (see memory.py), so the requests in between share
+  their prefix.
+
+`PrefixTracker` measures how much of each request repeats a recent request (the part a
+provider can serve from its cache), and `CachedUsage` carries the input tokens a provider
+did serve from its cache.
+"""
+
+import collections
+import dataclasses
+import hashlib
+import os
+from typing import Any
+from agents import Usage
+from config import prompt_cache_block_tokens, prompt_cache_min_tokens, prompt_prefix_max_entries
+from history import signature
+
+
+@dataclasses.dataclass
+class CachedUsage(Usage):
+    """
+    Usage of the model, with the input tokens served from the provider's prompt cache.
+    """
+
+    cached_input_tokens: int = 0
+    """Input tokens served from the prompt cache, across all requests."""
+
+    def add(self, other: Usage) -> None:
+        super().add(other)
+        self.cached_input_tokens += getattr(other, "cached_input_tokens", 0) or 0
+
+
+def read_cached_tokens(usage: Any) -> int:
+    """
+    Read the cached input tokens from the usage of an API response.
+
+    :param usage: Usage of a Responses or Chat Completions API response
+    :returns: The cached input tokens (0 if the response does not report them)
+    """
+    details = getattr(usage, "input_tokens_details", None) or getattr(
+        usage, "prompt_tokens_details", None
+    )
+    if isinstance(details, dict):
+        return details.get("cached_tokens") or 0
+    return getattr(details, "cached_tokens", None) or 0
+
+
+def cacheable_tokens(prefix_tokens: int) -> int:
+    """
+    Tokens of a shared prefix that a provider serves from its cache.
+
+    :param prefix_tokens: Tokens of the prefix shared with a recent request
+    :returns: 0 below `prompt_cache_min_tokens`, else the whole blocks of the prefix
+    """
+    if prefix_tokens < prompt_cache_min_tokens:
+        return 0
+    return prefix_tokens - prefix_tokens % prompt_cache_block_tokens
+
+
+class PrefixTracker:
+    """
+    Remembers the prefixes of recent requests, to measure how much of a request repeats
+    one of them byte for byte, as a provider's prompt cache sees it.
+
+    :param max_entries: Number of prefixes remembered (the least recently used are forgotten)
+    """
+
+    def __init__(self, max_entries: int = prompt_prefix_max_entries):
+        self.max_entries = max_entries
+        self._prefixes: collections.OrderedDict[bytes, None] = collections.OrderedDict()
+
+    def measure(self, instructions: str | None, model_input: str | list) -> tuple[int, int]:
+        """
+        Measure the prefix a request shares with the recent requests, and remember the
+        prefixes of the request.
+
+        :param instructions: System prompt of the request
+        :param model_input: Input of the request
+        :returns: Tuple of (estimated tokens of the shared prefix, estimated tokens of the
+            request), at about four characters per token like the rate limiter's estimate
+        """
+        if isinstance(model_input, str):
+            model_input = [{"role": "user", "content": model_input}]
+        instructions = instructions or ""
+        key = hashlib.blake2b(instructions.encode(), digest_size=16).digest()
+        num_chars = len(instructions)
+        shared = key in self._prefixes
+        prefix_chars = num_chars if shared else 0
+        self._prefixes[key] = None
+        self._prefixes.move_to_end(key)
+        for message in model_input:
+            # The digests of the recorded turns are computed once (see history.py)
+            size, digest = signature(message)
+            key = hashlib.blake2b(key + digest, digest_size=16).digest()
+            num_chars += size
+            if shared and key in self._prefixes:
+                self._prefixes.move_to_end(key)
+                prefix_chars = num_chars
+            else:
+                shared = False
+                self._prefixes[key] = None
+        while len(self._prefixes) > self.max_entries:
+            self._prefixes.popitem(last=False)
+        return prefix_chars // 4, num_chars // 4
+
+
+_prefix_tracker: PrefixTracker | None = None
+_prefix_tracker_pid: int | None = None
+
+
+def get_prefix_tracker() -> PrefixTracker:
+    """
+    Get the prefix tracker of this process, shared by all its games (like the provider's
+    cache, which serves a prefix to any request that repeats it).
+
+    :returns: The prefix tracker
+    """
+    global _prefix_tracker, _prefix_tracker_pid
+    if _prefix_tracker is None or _prefix_tracker_pid != os.getpid():
+        _prefix_tracker_pid = os.getpid()
+        _prefix_tracker = PrefixTracker()
+    return _prefix_tracker
@@ -73,3 +73,25 @@ Validation examples:
 - Incorrect: 'Vehicle' for 'Car' (too general)
 - Incorrect: 'Mountain range' for 'Mount Everest' (too general)
 """
+
+SYSTEM_PROMPT_SUMMARIZE_HISTORY = """
+You are helping a player in the game of 20 questions keep track of the game. You are given the summary of the game so far (if any) and the most recent part of the conversation.
+
+Guidelines:
+- Write a short, factual summary that replaces both the previous summary and the conversation you were given.
+- Keep every question that was asked together with its 'Yes'/'No' answer, and every topic proposal that was rejected.
+- Keep the topic of the game if it is mentioned.
+- Do not speculate and do not add information that is not in the conversation.
+"""
+
+SYSTEM_PROMPT_BATCH_HOST_DECISIONS = """
+You are helping the hosts of many games of 20 questions at once. You are given a JSON list of items, each with an `id` and the `topic` of its game, and either a `question` or a `topic_proposal`. Decide every item on its own, and return exactly one decision per item, with the same `id`.
+
+- For an item with a `question`, assess whether the question is strictly related to the topic, and set `answer` to 'Yes' or 'No'.
+- For an item with a `topic_proposal`, assess whether the topic proposal matches the topic, and set `is_correct`.
+
+Guidelines for topic proposals:
+- Do not be too strict. If the topic proposal is a specific instance or subset of the topic, validate it as correct. E.g. if topic_proposal is `Husky`, and the topic is `Dog`, validate it as correct.
+- Do not be too lenient. If the topic proposal is not specific enough or too general compared to the topic, reject it. E.g. if topic_proposal is `musical instrument`, and the topic is `violin`, reject it.
+- Acknowledge close synonyms, common names, well-known titles and local names of places. E.g. `NYC` for `New York City` is correct.
+"""
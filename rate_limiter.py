@@ -0,0 +1,318 @@
+"""
+Client-side rate limiting for LLM calls.
+
+Each model gets a token bucket with a requests-per-minute and a tokens-per-minute
+budget (see `rate_limits` in config.py). The bucket state lives in a small file
+guarded by an exclusive lock, so every worker process of `parallel_game.py`
+draws from the same budget without having to share a manager. The locked file
+updates run in a thread, so the games of an event loop never wait on the lock.
+"""
+
+import asyncio
+import email.utils
+import fcntl
+import os
+import struct
+import tempfile
+import time
+from typing import Any
+from agents import RunHooks
+from config import rate_limits
+from history import serialized_size
+
+# Budget assumed for the model's output when estimating the tokens of a request
+OUTPUT_TOKENS_ESTIMATE = 300
+
+# Pause applied after a 429 response that does not carry a Retry-After header
+DEFAULT_RETRY_AFTER = 1.0
+
+
+class TokenBucket:
+    """
+    Requests-per-minute and tokens-per-minute budget for one model, shared across
+    processes through a locked state file.
+
+    :param path: Path of the state file
+    :param requests_per_minute: Maximum number of requests per minute
+    :param tokens_per_minute: Maximum number of tokens per minute
+    """
+
+    # available requests, available tokens, last refill time, blocked until
+    _STATE = struct.Struct("<dddd")
+
+    def __init__(self, path: str, requests_per_minute: int, tokens_per_minute: int):
+        self.path = path
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+
+    def _update(self, update) -> Any:
+        """
+        Refill the bucket and apply `update` to its state under an exclusive file lock.
+
+        :param update: Function taking the state list [requests, tokens, updated_at,
+            blocked_until] and the current time; it may modify the list in place
+        :returns: The value returned by `update`
+        """
+        with open(self.path, "a+b") as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                f.seek(0)
+                raw = f.read(self._STATE.size)
+                now = time.time()
+                if len(raw) == self._STATE.size:
+                    state = list(self._STATE.unpack(raw))
+                    elapsed = max(0.0, now - state[2])
+                    state[0] = min(
+                        self.requests_per_minute,
+                        state[0] + elapsed * self.requests_per_minute / 60,
+                    )
+                    state[1] = min(
+                        self.tokens_per_minute,
+                        state[1] + elapsed * self.tokens_per_minute / 60,
+                    )
+                else:
+                    state = [self.requests_per_minute, self.tokens_per_minute, now, 0.0]
+                state[2] = now
+
+                value = update(state, now)
+
+                f.seek(0)
+                f.truncate()
+                f.write(self._STATE.pack(*state))
+                return value
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def try_acquire(self, tokens: int, correction: int = 0) -> float:
+        """
+        Take one request and `tokens` tokens from the bucket if they are available.
+
+        :param tokens: Estimated number of tokens of the request
+        :param correction: Tokens to take on top of earlier estimates, once their actual
+            usage is known (see `adjust`), taken either way
+        :returns: 0.0 if the budget was taken, otherwise the number of seconds to wait
+        """
+        tokens = min(tokens, self.tokens_per_minute)
+
+        def update(state, now):
+            state[1] = min(self.tokens_per_minute, state[1] - correction)
+            if state[3] > now:
+                return state[3] - now
+            missing_requests = 1 - state[0]
+            missing_tokens = tokens - state[1]
+            if missing_requests <= 0 and missing_tokens <= 0:
+                state[0] -= 1
+                state[1] -= tokens
+                return 0.0
+            return max(
+                missing_requests * 60 / self.requests_per_minute,
+                missing_tokens * 60 / self.tokens_per_minute,
+            )
+
+        return self._update(update)
+
+    def adjust(self, tokens: int):
+        """
+        Correct the token budget once the actual usage of a request is known.
+
+        :param tokens: Difference between the actual and the estimated number of tokens
+        """
+
+        def update(state, now):
+            state[1] = min(self.tokens_per_minute, state[1] - tokens)
+
+        self._update(update)
+
+    def block(self, seconds: float):
+        """
+        Stop handing out budget for the given number of seconds (e.g. after a 429).
+
+        :param seconds: Number of seconds to pause
+        """
+
+        def update(state, now):
+            state[3] = max(state[3], now + seconds)
+
+        self._update(update)
+
+
+class RateLimiter:
+    """
+    Token buckets keyed by model name.
+
+    :param limits: Mapping of model name to {"rpm": ..., "tpm": ...}
+    :param state_dir: Directory holding the shared bucket state files
+    """
+
+    def __init__(
+        self, limits: dict[str, dict[str, int]], state_dir: str | None = None
+    ):
+        self.limits = limits
+        self.state_dir = state_dir or os.path.join(
+            tempfile.gettempdir(), "20_questions_rate_limits"
+        )
+        os.makedirs(self.state_dir, exist_ok=True)
+        self._buckets: dict[str, TokenBucket] = {}
+        # Token corrections per model, applied with the model's next acquisition
+        self._corrections: dict[str, int] = {}
+
+    def bucket(self, model: str | None) -> TokenBucket | None:
+        """
+        Get the bucket of a model.
+
+        :param model: Model name
+        :returns: The bucket, or None if the model is not rate limited
+        """
+        if model not in self.limits:
+            return None
+        if model not in self._buckets:
+            limit = self.limits[model]
+            self._buckets[model] = TokenBucket(
+                os.path.join(self.state_dir, f"{model}.bucket"),
+                requests_per_minute=limit["rpm"],
+                tokens_per_minute=limit["tpm"],
+            )
+        return self._buckets[model]
+
+    async def acquire(self, model: str | None, tokens: int):
+        """
+        Wait until the model's budget allows one more request of `tokens` tokens.
+
+        :param model: Model name
+        :param tokens: Estimated number of tokens of the request
+        """
+        bucket = self.bucket(model)
+        if bucket is None:
+            return
+        while True:
+            correction = self._corrections.pop(model, 0)
+            wait = await asyncio.to_thread(bucket.try_acquire, tokens, correction)
+            if wait <= 0:
+                return
+            await asyncio.sleep(wait)
+
+    def adjust(self, model: str | None, tokens: int):
+        """
+        Correct the model's token budget once the actual usage of a request is known. The
+        correction is applied with the model's next acquisition, in the same file update.
+
+        :param model: Model name
+        :param tokens: Difference between the actual and the estimated number of tokens
+        """
+        if tokens and self.bucket(model) is not None:
+            self._corrections[model] = self._corrections.get(model, 0) + tokens
+
+    async def penalize(self, model: str | None, retry_after: float | None):
+        """
+        Pause all requests to the model after a 429 response.
+
+        :param model: Model name
+        :param retry_after: Seconds to wait as requested by the server, if known
+        """
+        bucket = self.bucket(model)
+        if bucket is not None:
+            await asyncio.to_thread(
+                bucket.block, DEFAULT_RETRY_AFTER if retry_after is None else retry_after
+            )
+
+
+class RateLimitHooks(RunHooks):
+    """
+    Run hooks that take budget from the rate limiter before each agent is invoked,
+    including agents reached through handoffs (which may use a different model).
+
+    :param limiter: Rate limiter to draw from
+    :param estimated_tokens: Estimated number of tokens per model call
+    :param circuit_breaker: Optional circuit breaker (see retry.py) consulted before each
+        model is invoked
+    """
+
+    def __init__(self, limiter: RateLimiter, estimated_tokens: int, circuit_breaker=None):
+        self.limiter = limiter
+        self.estimated_tokens = estimated_tokens
+        self.circuit_breaker = circuit_breaker
+        self.models: list[str | None] = []
+        # Models whose circuit trial this run holds
+        self.trials: list[str | None] = []
+
+    async def on_agent_start(self, context, agent):
+        model = agent.model if isinstance(agent.model, str) else None
+        if self.circuit_breaker is not None and self.circuit_breaker.check(model):
+            self.trials.append(model)
+        self.models.append(model)
+        await self.limiter.acquire(model, self.estimated_tokens)
+
+    def release_trials(self):
+        """
+        Give back the circuit trials of a run that ended without an outcome (e.g. cancelled).
+        """
+        for model in self.trials:
+            self.circuit_breaker.release(model)
+        self.trials.clear()
+
+    def reconcile(self, raw_responses: list):
+        """
+        Correct the token budgets with the actual usage of the run.
+
+        :param raw_responses: The model responses of the run, in call order
+        """
+        for model, response in zip(self.models, raw_responses):
+            self.limiter.adjust(model, response.usage.total_tokens - self.estimated_tokens)
+
+
+def estimate_tokens(instructions: str | None, messages: list[dict]) -> int:
+    """
+    Roughly estimate the tokens of a request (about four characters per token).
+
+    :param instructions: System prompt of the agent
+    :param messages: Input messages of the request
+    :returns: Estimated number of tokens, including the expected output
+    """
+    num_chars = len(instructions or "") + serialized_size(messages)
+    return num_chars // 4 + OUTPUT_TOKENS_ESTIMATE
+
+
+def retry_after_seconds(error: Exception) -> float | None:
+    """
+    Read the Retry-After delay from a rate limit error.
+
+    :param error: The error raised by the OpenAI client
+    :returns: The delay in seconds, or None if the response does not specify one
+    """
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None)
+    if not headers:
+        return None
+    retry_after_ms = headers.get("retry-after-ms")
+    if retry_after_ms is not None:
+        try:
+            return float(retry_after_ms) / 1000
+        except ValueError:
+            pass
+    retry_after = headers.get("retry-after")
+    if retry_after is None:
+        return None
+    try:
+        return float(retry_after)
+    except ValueError:
+        pass
+    try:
+        retry_date = email.utils.parsedate_to_datetime(retry_after)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, retry_date.timestamp() - time.time())
+
+
+_rate_limiter: RateLimiter | None = None
+
+
+def get_rate_limiter() -> RateLimiter:
+    """
+    Get the process-wide rate limiter configured from config.py.
+
+    :returns: The shared rate limiter
+    """
+    global _rate_limiter
+    if _rate_limiter is None:
+        _rate_limiter = RateLimiter(rate_limits)
+    return _rate_limiter
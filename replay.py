@@ -0,0 +1,191 @@
+"""
+Replay and re-scoring of recorded games, without any model call.
+
+The game records (see game_records.py) hold the transcript of every game: its topic, the
+Guesser's questions and topic proposals, the Host's validations and answers. Replaying a
+transcript re-scores the game under the current rules: the topic proposals are decided
+again by the local topic matcher (see topic_matcher.py), falling back to the recorded
+decision when the matcher cannot decide, and the game can be cut at a smaller number of
+rounds. Whole tournaments are re-scored in a second:
+
+    python replay.py rescore                          # re-score the recorded games
+    python replay.py rescore --max_num_rounds 10      # as if the games had 10 rounds
+    python replay.py show <game_id>                   # print the transcript of a game
+"""
+
+from typing import Any, Iterable
+from config import game_records_path
+from game_records import load_games
+from topic_matcher import TopicMatcher, get_topic_matcher
+
+# Events making up the transcript of a game
+TRANSCRIPT_EVENTS = ("game_start", "validation", "question", "answer", "game_end")
+
+
+def build_transcript(events: Iterable[dict[str, Any]]) -> dict[str, Any]:
+    """
+    Build the transcript of a game from its recorded events.
+
+    A round that was played again after the game was resumed from a checkpoint (see
+    checkpoints.py) is only kept once, as it was last played.
+
+    :param events: The events of the game, in order
+    :returns: The topic, the rounds (question, topic proposal, validation and answer, each
+        possibly missing), the recorded outcome (None if the game did not end) and the
+        maximum number of rounds
+    """
+    transcript = {"topic": None, "rounds": {}, "outcome": None, "max_num_rounds": None}
+    rounds = transcript["rounds"]
+    current_round = 0
+    for record in events:
+        name = record["event"]
+        if name == "game_start":
+            transcript["topic"] = record["topic"]
+            transcript["max_num_rounds"] = record["max_num_rounds"]
+            current_round = record.get("resumed_round") or 0
+        elif name == "validation":
+            # Validations are recorded before the question of their round
+            rounds.setdefault(current_round, {})["validation"] = {
+                "topic_proposal": record["topic_proposal"],
+                "is_correct": record["is_correct"],
+                "decided_by": record["decided_by"],
+            }
+        elif name == "question":
+            current_round = record["round"]
+            rounds.setdefault(current_round, {}).update(
+                question=record["question"], topic_proposal=record["topic_proposal"]
+            )
+        elif name == "answer":
+            rounds.setdefault(record["round"], {})["answer"] = record["answer"]
+            current_round = record["round"] + 1
+        elif name == "game_end":
+            transcript["outcome"] = {
+                "guesser_wins": record["guesser_wins"],
+                "num_rounds": record["num_rounds"],
+                "total_tokens": record["total_tokens"],
+            }
+    transcript["rounds"] = [rounds[number] for number in sorted(rounds)]
+    return transcript
+
+
+def replay_game(
+    transcript: dict[str, Any],
+    max_num_rounds: int | None = None,
+    topic_matcher: TopicMatcher | None = None,
+) -> dict[str, Any]:
+    """
+    Replay the transcript of a game and score it again.
+
+    :param transcript: Transcript returned by `build_transcript`
+    :param max_num_rounds: Number of rounds after which the Guesser loses (defaults to the
+        game's own)
+    :param topic_matcher: Matcher deciding the topic proposals (defaults to the process-wide one)
+    :returns: Whether the Guesser wins, the number of rounds played, and whether the game
+        is complete (it was played to its end, or until it was won)
+    """
+    topic_matcher = topic_matcher or get_topic_matcher()
+    max_num_rounds = max_num_rounds or transcript["max_num_rounds"] or len(transcript["rounds"])
+    topic = transcript["topic"]
+    for number, played in enumerate(transcript["rounds"][:max_num_rounds]):
+        validation = played.get("validation")
+        topic_proposal = played.get("topic_proposal") or (validation or {}).get("topic_proposal")
+        if topic_proposal is not None:
+            is_correct = topic_matcher.match(topic_proposal, topic)
+            if is_correct is None and validation is not None:
+                is_correct = validation["is_correct"]
+            if is_correct:
+                return {"guesser_wins": True, "num_rounds": number + 1, "complete": True}
+        if "answer" not in played:
+            # The game failed in this round
+            return {"guesser_wins": False, "num_rounds": number + 1, "complete": False}
+    num_rounds = min(max_num_rounds, len(transcript["rounds"]))
+    return {
+        "guesser_wins": False,
+        "num_rounds": num_rounds,
+        "complete": num_rounds == max_num_rounds,
+    }
+
+
+def rescore(path: str = game_records_path, max_num_rounds: int | None = None) -> dict[str, Any]:
+    """
+    Re-score all the recorded games and print how the results change.
+
+    :param path: Path of the game records
+    :param max_num_rounds: Number of rounds after which the Guesser loses (defaults to each
+        game's own)
+    :returns: Summary of the recorded and re-scored results
+    """
+    games = load_games(path, TRANSCRIPT_EVENTS)
+    num_recorded = num_recorded_wins = 0
+    num_complete = num_wins = num_changed = total_rounds = 0
+    for events in games.values():
+        transcript = build_transcript(events)
+        if transcript["topic"] is None:
+            continue
+        result = replay_game(transcript, max_num_rounds)
+        outcome = transcript["outcome"]
+        if outcome is not None:
+            num_recorded += 1
+            num_recorded_wins += outcome["guesser_wins"]
+            num_changed += outcome["guesser_wins"] != result["guesser_wins"]
+        if result["complete"]:
+            num_complete += 1
+            num_wins += result["guesser_wins"]
+            total_rounds += result["num_rounds"]
+    summary = {
+        "num_games": len(games),
+        "recorded_win_rate": num_recorded_wins / num_recorded if num_recorded else 0.0,
+        "num_rescored": num_complete,
+        "win_rate": num_wins / num_complete if num_complete else 0.0,
+        "average_rounds": total_rounds / num_complete if num_complete else 0.0,
+        "num_changed": num_changed,
+    }
+    print(f"Games recorded: {summary['num_games']} ({num_recorded} finished)")
+    print(f"Recorded win rate: {summary['recorded_win_rate'] * 100:.1f}%")
+    print(
+        f"Re-scored win rate: {summary['win_rate'] * 100:.1f}% over {num_complete} complete games "
+        f"({summary['average_rounds']:.1f} rounds on average)"
+    )
+    print(f"Games whose outcome changed: {num_changed}")
+    return summary
+
+
+def show(game_id: str, path: str = game_records_path, max_num_rounds: int | None = None):
+    """
+    Print the transcript of a recorded game and its re-scored outcome.
+
+    :param game_id: ID of the game
+    :param path: Path of the game records
+    :param max_num_rounds: Number of rounds after which the Guesser loses (defaults to the game's own)
+    """
+    events = load_games(path, TRANSCRIPT_EVENTS).get(str(game_id))
+    if events is None:
+        print(f"No game {game_id} in {path}.")
+        return
+    transcript = build_transcript(events)
+    print(f"Topic: {transcript['topic']}")
+    for number, played in enumerate(transcript["rounds"]):
+        validation = played.get("validation")
+        if validation is not None:
+            print(
+                f"{number}. Guesser: is it {validation['topic_proposal']}? "
+                f"Host: {'Yes' if validation['is_correct'] else 'No'} ({validation['decided_by']})"
+            )
+        if "question" in played:
+            print(f"{number}. Guesser: {played['question']} Host: {played.get('answer', '-')}")
+    result = replay_game(transcript, max_num_rounds)
+    if transcript["outcome"] is not None:
+        recorded = transcript["outcome"]
+        print(
+            f"Recorded: {'win' if recorded['guesser_wins'] else 'loss'} in {recorded['num_rounds']} rounds"
+        )
+    print(
+        f"Re-scored: {'win' if result['guesser_wins'] else 'loss'} in {result['num_rounds']} rounds"
+        + ("" if result["complete"] else " (incomplete)")
+    )
+
+
+if __name__ == "__main__":
+    import fire
+
+    fire.Fire({"rescore": rescore, "show": show})
@@ -0,0 +1,408 @@
+"""
+Deterministic response cache for LLM calls.
+
+Responses are keyed on everything that determines them: model, instructions,
+message list, output schema and temperature. The cache is made of tiers that are
+looked up in order (e.g. an in-memory LRU in front of a SQLite store); a hit in a
+slower tier is promoted to the faster ones. The async methods run the tiers doing I/O
+on a worker thread, off the event loop.
+"""
+
+import asyncio
+import atexit
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import Counter, OrderedDict
+from typing import Any, Protocol
+from config import (
+    response_cache_counter_flush,
+    response_cache_enabled,
+    response_cache_max_bytes,
+    response_cache_max_entries,
+    response_cache_path,
+)
+
+
+class CacheTier(Protocol):
+    """
+    Interface of a cache tier.
+    """
+
+    # Whether the tier does blocking I/O (and is called on a worker thread by the async
+    # methods of `ResponseCache`)
+    blocking: bool
+
+    def get(self, key: str) -> str | None: ...
+
+    def set(self, key: str, value: str): ...
+
+
+class LRUCache:
+    """
+    In-memory tier evicting the least recently used entries.
+
+    :param max_entries: Maximum number of entries kept in memory
+    """
+
+    blocking = False
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._entries: OrderedDict[str, str] = OrderedDict()
+
+    def get(self, key: str) -> str | None:
+        value = self._entries.get(key)
+        if value is not None:
+            self._entries.move_to_end(key)
+        return value
+
+    def set(self, key: str, value: str):
+        self._entries[key] = value
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+
+class SQLiteCache:
+    """
+    Persistent tier evicting the least recently used entries once the stored
+    responses exceed a size budget. Safe to share between processes and threads.
+
+    :param path: Path of the SQLite database
+    :param max_bytes: Maximum total size of the stored responses
+    """
+
+    blocking = True
+
+    def __init__(self, path: str, max_bytes: int):
+        self.path = path
+        self.max_bytes = max_bytes
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        # The connection is used from worker threads, one at a time
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(
+            path, timeout=30, isolation_level=None, check_same_thread=False
+        )
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, size INTEGER NOT NULL, "
+            "last_access REAL NOT NULL)"
+        )
+        self._connection.execute(
+            "CREATE INDEX IF NOT EXISTS responses_last_access ON responses (last_access)"
+        )
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS stats (name TEXT PRIMARY KEY, value INTEGER NOT NULL)"
+        )
+        # Running total size of the stored responses, so a write does not sum the whole table
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS total_size (id INTEGER PRIMARY KEY CHECK (id = 0), "
+            "size INTEGER NOT NULL)"
+        )
+        with self._connection:
+            self._connection.execute("BEGIN IMMEDIATE")
+            # Databases written before the running total get it computed once
+            self._connection.execute(
+                "INSERT OR IGNORE INTO total_size (id, size) "
+                "SELECT 0, COALESCE(SUM(size), 0) FROM responses"
+            )
+
+    def get(self, key: str) -> str | None:
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT value FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            self._connection.execute(
+                "UPDATE responses SET last_access = ? WHERE key = ?", (time.time(), key)
+            )
+        return row[0]
+
+    def set(self, key: str, value: str):
+        size = len(value.encode())
+        with self._lock, self._connection:
+            self._connection.execute("BEGIN IMMEDIATE")
+            replaced = self._connection.execute(
+                "SELECT size FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            self._connection.execute(
+                "INSERT OR REPLACE INTO responses (key, value, size, last_access) "
+                "VALUES (?, ?, ?, ?)",
+                (key, value, size, time.time()),
+            )
+            self._connection.execute(
+                "UPDATE total_size SET size = size + ? WHERE id = 0",
+                (size - (replaced[0] if replaced is not None else 0),),
+            )
+            (total_size,) = self._connection.execute(
+                "SELECT size FROM total_size WHERE id = 0"
+            ).fetchone()
+            if total_size > self.max_bytes:
+                self._evict(total_size)
+
+    def _evict(self, total_size: int):
+        """
+        Delete the least recently used entries until the size budget is met.
+
+        :param total_size: Current total size of the stored responses
+        """
+        freed = 0
+        evicted = []
+        for key, size in self._connection.execute(
+            "SELECT key, size FROM responses ORDER BY last_access"
+        ):
+            evicted.append((key,))
+            freed += size
+            if total_size - freed <= self.max_bytes:
+                break
+        self._connection.executemany("DELETE FROM responses WHERE key = ?", evicted)
+        self._connection.execute("UPDATE total_size SET size = size - ? WHERE id = 0", (freed,))
+
+    def increment(self, counts: dict[str, int]):
+        """
+        Increment persistent counters (shared by all processes using the database).
+
+        :param counts: Mapping of counter name to increment
+        """
+        with self._lock, self._connection:
+            self._connection.execute("BEGIN IMMEDIATE")
+            self._connection.executemany(
+                "INSERT INTO stats (name, value) VALUES (?, ?) "
+                "ON CONFLICT(name) DO UPDATE SET value = value + excluded.value",
+                counts.items(),
+            )
+
+    def counters(self) -> dict[str, int]:
+        """
+        Read the persistent counters.
+
+        :returns: Mapping of counter name to value
+        """
+        with self._lock:
+            return dict(self._connection.execute("SELECT name, value FROM stats"))
+
+
+class ResponseCache:
+    """
+    Tiered response cache with hit/miss statistics. The counters of the persistent tier
+    are updated in batches, rather than on every lookup.
+
+    :param tiers: Cache tiers, fastest first
+    :param counter_flush: Number of lookups after which the counters are written to
+        the persistent tier
+    """
+
+    def __init__(
+        self, tiers: list[CacheTier], counter_flush: int = response_cache_counter_flush
+    ):
+        self.tiers = tiers
+        self.counter_flush = counter_flush
+        self.hits = 0
+        self.misses = 0
+        # Lookups not yet counted in the persistent tier
+        self._pending: Counter[str] = Counter()
+
+    @staticmethod
+    def make_key(**fields: Any) -> str:
+        """
+        Build a cache key from the fields that determine a response.
+
+        :param fields: e.g. model, instructions, messages, output_schema, temperature
+        :returns: Hex digest identifying the request
+        """
+        canonical = json.dumps(fields, sort_keys=True, default=str)
+        return hashlib.sha256(canonical.encode()).hexdigest()
+
+    def get(self, key: str) -> Any | None:
+        """
+        Look up a response.
+
+        :param key: Cache key
+        :returns: The cached (JSON-serialisable) value, or None on a miss
+        """
+        for i, tier in enumerate(self.tiers):
+            value = tier.get(key)
+            if value is not None:
+                for faster_tier in self.tiers[:i]:
+                    faster_tier.set(key, value)
+                self._count("hits")
+                return json.loads(value)
+        self._count("misses")
+        return None
+
+    async def aget(self, key: str) -> Any | None:
+        """
+        Look up a response without blocking the event loop.
+
+        :param key: Cache key
+        :returns: The cached (JSON-serialisable) value, or None on a miss
+        """
+        for i, tier in enumerate(self.tiers):
+            if tier.blocking:
+                value = await asyncio.to_thread(tier.get, key)
+            else:
+                value = tier.get(key)
+            if value is not None:
+                for faster_tier in self.tiers[:i]:
+                    await self._aset_tier(faster_tier, key, value)
+                await self._acount("hits")
+                return json.loads(value)
+        await self._acount("misses")
+        return None
+
+    def set(self, key: str, value: Any):
+        """
+        Store a response in every tier.
+
+        :param key: Cache key
+        :param value: JSON-serialisable value
+        """
+        serialized = json.dumps(value)
+        for tier in self.tiers:
+            tier.set(key, serialized)
+
+    async def aset(self, key: str, value: Any):
+        """
+        Store a response in every tier without blocking the event loop.
+
+        :param key: Cache key
+        :param value: JSON-serialisable value
+        """
+        serialized = json.dumps(value)
+        for tier in self.tiers:
+            await self._aset_tier(tier, key, serialized)
+
+    @staticmethod
+    async def _aset_tier(tier: CacheTier, key: str, value: str):
+        if tier.blocking:
+            await asyncio.to_thread(tier.set, key, value)
+        else:
+            tier.set(key, value)
+
+    def _count(self, name: str):
+        if self._add_count(name):
+            self._write_counts(self._take_pending())
+
+    async def _acount(self, name: str):
+        if self._add_count(name):
+            await asyncio.to_thread(self._write_counts, self._take_pending())
+
+    def _add_count(self, name: str) -> bool:
+        """
+        Count a lookup.
+
+        :param name: "hits" or "misses"
+        :returns: Whether the pending counts are due to be written
+        """
+        setattr(self, name, getattr(self, name) + 1)
+        self._pending[name] += 1
+        return self._pending.total() >= self.counter_flush
+
+    def _take_pending(self) -> dict[str, int]:
+        pending, self._pending = dict(self._pending), Counter()
+        return pending
+
+    def _write_counts(self, counts: dict[str, int]):
+        if not counts:
+            return
+        for tier in self.tiers:
+            if isinstance(tier, SQLiteCache):
+                tier.increment(counts)
+
+    def flush(self):
+        """
+        Write the pending hit/miss counts to the persistent tier.
+        """
+        self._write_counts(self._take_pending())
+
+    def stats(self, persistent: bool = False) -> dict[str, int]:
+        """
+        Get the hit/miss statistics.
+
+        :param persistent: If True, return the counters accumulated by every process
+            sharing the persistent tier, instead of this process only
+        :returns: Dictionary with "hits" and "misses"
+        """
+        if persistent:
+            self.flush()
+            for tier in self.tiers:
+                if isinstance(tier, SQLiteCache):
+                    counters = tier.counters()
+                    return {
+                        "hits": counters.get("hits", 0),
+                        "misses": counters.get("misses", 0),
+                    }
+        return {"hits": self.hits, "misses": self.misses}
+
+
+def format_cache_stats(stats: dict[str, int]) -> str:
+    """
+    Format hit/miss statistics for printing.
+
+    :param stats: Dictionary with "hits" and "misses"
+    :returns: Human-readable summary
+    """
+    lookups = stats["hits"] + stats["misses"]
+    hit_rate = stats["hits"] / lookups * 100 if lookups else 0.0
+    return f"Cache hits: {stats['hits']}, misses: {stats['misses']} (hit rate: {hit_rate:.1f}%)"
+
+
+def describe_agent(agent: Any) -> dict[str, Any]:
+    """
+    Describe the parts of an agent (and the agents it hands off to) that determine its responses.
+
+    :param agent: An `agents.Agent`
+    :returns: JSON-serialisable description of the agent
+    """
+    output_type = agent.output_type
+    return {
+        "name": agent.name,
+        "model": agent.model if isinstance(agent.model, str) else repr(agent.model),
+        "instructions": agent.instructions,
+        "temperature": agent.model_settings.temperature,
+        "output_schema": output_type.model_json_schema()
+        if hasattr(output_type, "model_json_schema")
+        else repr(output_type),
+        "handoffs": [describe_agent(handoff) for handoff in agent.handoffs],
+    }
+
+
+_response_cache: ResponseCache | None = None
+_response_cache_pid: int | None = None
+
+
+def get_response_cache() -> ResponseCache | None:
+    """
+    Get the process-wide response cache configured in config.py.
+    Forked worker processes get their own instance (SQLite connections cannot be shared).
+
+    :returns: The shared cache, or None if caching is disabled
+    """
+    global _response_cache, _response_cache_pid
+    if not response_cache_enabled:
+        return None
+    if _response_cache is None or _response_cache_pid != os.getpid():
+        _response_cache_pid = os.getpid()
+        _response_cache = ResponseCache(
+            [
+                LRUCache(response_cache_max_entries),
+                SQLiteCache(response_cache_path, response_cache_max_bytes),
+            ]
+        )
+        atexit.register(_response_cache.flush)
+    return _response_cache
+
+
+def flush_cache_stats():
+    """
+    Write the pending hit/miss counts of this process' response cache (e.g. when a worker
+    process, which may be terminated without running its exit handlers, finishes its games).
+    """
+    if _response_cache is not None and _response_cache_pid == os.getpid():
+        _response_cache.flush()
@@ -0,0 +1,237 @@
+"""
+Retries of failed LLM calls.
+
+Errors are classified by what a retry can do about them: rate limits, timeouts, server
+errors and outputs that do not match the schema are retried with exponential backoff and
+full jitter, within a deadline per call; any other error (e.g. an invalid API key or a
+malformed request) fails the call at once. A circuit breaker per model stops sending
+requests to a model that keeps failing, so the games depending on it fail fast instead
+of tying up their workers.
+"""
+
+import asyncio
+import json
+import os
+import random
+import time
+import openai
+import pydantic
+from agents import MaxTurnsExceeded, ModelBehaviorError
+from config import (
+    circuit_failure_threshold,
+    circuit_reset_timeout,
+    llm_backoff_base,
+    llm_backoff_max,
+    llm_call_timeout,
+    llm_max_attempts,
+    llm_retry_deadline,
+)
+
+# Error classes that a retry may resolve
+RETRYABLE_ERRORS = ("rate_limit", "timeout", "server_error", "schema")
+
+
+class CircuitOpenError(Exception):
+    """
+    Raised instead of calling a model whose circuit is open.
+    """
+
+
+def classify_error(error: BaseException) -> str:
+    """
+    Classify the error of an LLM call.
+
+    :param error: The error raised by the call
+    :returns: "rate_limit", "timeout", "server_error", "schema" (the output could not be
+        parsed), "circuit_open" or "fatal" (a retry would fail the same way)
+    """
+    if isinstance(error, openai.RateLimitError):
+        return "rate_limit"
+    if isinstance(error, (openai.APITimeoutError, asyncio.TimeoutError)):
+        return "timeout"
+    if isinstance(error, openai.InternalServerError) or (
+        isinstance(error, openai.APIStatusError) and error.status_code >= 500
+    ):
+        return "server_error"
+    if isinstance(error, openai.APIConnectionError):
+        return "server_error"
+    if isinstance(
+        error,
+        (ModelBehaviorError, MaxTurnsExceeded, json.JSONDecodeError, pydantic.ValidationError),
+    ):
+        return "schema"
+    if isinstance(error, CircuitOpenError):
+        return "circuit_open"
+    return "fatal"
+
+
+class RetryPolicy:
+    """
+    Exponential backoff with full jitter, bounded by a number of attempts and a deadline.
+
+    :param max_attempts: Maximum number of attempts of a call
+    :param base_delay: Upper bound of the delay before the first retry in seconds
+        (doubled on every further retry)
+    :param max_delay: Upper bound of a single delay in seconds
+    :param attempt_timeout: Seconds a single attempt may take (None: no limit)
+    :param deadline: Seconds all the attempts of a call may take together (None: no limit)
+    """
+
+    def __init__(
+        self,
+        max_attempts: int = llm_max_attempts,
+        base_delay: float = llm_backoff_base,
+        max_delay: float = llm_backoff_max,
+        attempt_timeout: float | None = llm_call_timeout,
+        deadline: float | None = llm_retry_deadline,
+    ):
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.attempt_timeout = attempt_timeout
+        self.deadline = deadline
+
+    def delay(self, attempt: int, retry_after: float | None = None) -> float:
+        """
+        Draw the delay before the next attempt.
+
+        :param attempt: Number of the failed attempt (0 for the first one)
+        :param retry_after: Seconds the server asked to wait, if known
+        :returns: Delay in seconds
+        """
+        delay = random.uniform(0, min(self.max_delay, self.base_delay * 2**attempt))
+        return max(delay, retry_after or 0.0)
+
+    def next_delay(
+        self, attempt: int, kind: str, start_time: float, retry_after: float | None = None
+    ) -> float | None:
+        """
+        Decide whether a failed attempt is retried.
+
+        :param attempt: Number of the failed attempt (0 for the first one)
+        :param kind: Class of the error (see `classify_error`)
+        :param start_time: `time.monotonic()` when the first attempt started
+        :param retry_after: Seconds the server asked to wait, if known
+        :returns: Delay before the next attempt, or None if the call must fail
+        """
+        if kind not in RETRYABLE_ERRORS or attempt + 1 >= self.max_attempts:
+            return None
+        delay = self.delay(attempt, retry_after)
+        if self.deadline is not None and time.monotonic() - start_time + delay > self.deadline:
+            return None
+        return delay
+
+    def attempt_timeout_at(self, start_time: float) -> float | None:
+        """
+        Seconds the next attempt may take, within both the attempt timeout and the deadline.
+
+        :param start_time: `time.monotonic()` when the first attempt started
+        :returns: Timeout in seconds, or None for no limit
+        """
+        timeouts = [self.attempt_timeout] if self.attempt_timeout is not None else []
+        if self.deadline is not None:
+            timeouts.append(max(0.0, self.deadline - (time.monotonic() - start_time)))
+        return min(timeouts) if timeouts else None
+
+
+class CircuitBreaker:
+    """
+    Circuit breaker per model. After `failure_threshold` consecutive server errors or
+    timeouts, the circuit of the model opens and its calls fail at once; after
+    `reset_timeout` seconds a single trial call is let through, which closes the circuit
+    again on success.
+
+    :param failure_threshold: Consecutive failures that open the circuit
+    :param reset_timeout: Seconds the circuit stays open before a trial call
+    """
+
+    def __init__(
+        self,
+        failure_threshold: int = circuit_failure_threshold,
+        reset_timeout: float = circuit_reset_timeout,
+    ):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._failures: dict[str | None, int] = {}
+        self._opened_at: dict[str | None, float] = {}
+        self._trial_in_flight: set[str | None] = set()
+
+    def check(self, model: str | None) -> bool:
+        """
+        Let a call to a model through, or raise if its circuit is open.
+
+        :param model: Name of the model
+        :returns: True if the call is the trial call of the model's circuit, whose outcome
+            (or `release`, if it has none) must be reported
+        :raises CircuitOpenError: If the circuit of the model is open
+        """
+        opened_at = self._opened_at.get(model)
+        if opened_at is None:
+            return False
+        if time.monotonic() - opened_at < self.reset_timeout or model in self._trial_in_flight:
+            raise CircuitOpenError(
+                f"The circuit of {model} is open after {self._failures[model]} consecutive failures"
+            )
+        self._trial_in_flight.add(model)
+        return True
+
+    def release(self, model: str | None):
+        """
+        Give back the trial of a call that ended without an outcome (e.g. it was cancelled),
+        so the next call becomes the trial.
+
+        :param model: Name of the model
+        """
+        self._trial_in_flight.discard(model)
+
+    def record_success(self, model: str | None):
+        """
+        Record a successful call, closing the circuit of the model.
+
+        :param model: Name of the model
+        """
+        self._failures.pop(model, None)
+        self._opened_at.pop(model, None)
+        self._trial_in_flight.discard(model)
+
+    def record_failure(self, model: str | None, kind: str):
+        """
+        Record a failed call. Only server errors and timeouts count towards opening the circuit.
+
+        :param model: Name of the model
+        :param kind: Class of the error (see `classify_error`)
+        """
+        if kind not in ("server_error", "timeout"):
+            self._trial_in_flight.discard(model)
+            return
+        self._failures[model] = self._failures.get(model, 0) + 1
+        if model in self._trial_in_flight or self._failures[model] >= self.failure_threshold:
+            self._opened_at[model] = time.monotonic()
+        self._trial_in_flight.discard(model)
+
+    def is_open(self, model: str | None) -> bool:
+        """
+        Check whether the circuit of a model is open.
+
+        :param model: Name of the model
+        :returns: True if the calls to the model currently fail fast
+        """
+        return model in self._opened_at
+
+
+_circuit_breaker: CircuitBreaker | None = None
+_circuit_breaker_pid: int | None = None
+
+
+def get_circuit_breaker() -> CircuitBreaker:
+    """
+    Get the process-wide circuit breaker configured in config.py.
+    Forked worker processes get their own instance.
+
+    :returns: The shared circuit breaker
+    """
+    global _circuit_breaker, _circuit_breaker_pid
+    if _circuit_breaker is None or _circuit_breaker_pid != os.getpid():
+        _circuit_breaker_pid = os.getpid()
+        _circuit_breaker = CircuitBreaker()
+    return _circuit_breaker
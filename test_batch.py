@@ -0,0 +1,89 @@
+"""
+Simple test script for verifying that the batch scheduler submits a batch only once
+every running game waits on a request.
+
+The requests are answered locally, so no API key is needed. Run it as a script, or with
+pytest.
+"""
+
+import asyncio
+import logging
+import tempfile
+import traceback
+from batch import BatchScheduler, LocalBatchBackend
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+async def echo(body):
+    """Answer a request with its own body."""
+    return body
+
+def test_multi_request_game():
+    """Test that a game queuing several requests at once does not send the batch early."""
+    logging.info("Testing a game that queues several requests at once...")
+
+    async def play():
+        scheduler = BatchScheduler(LocalBatchBackend(echo), batch_dir=tempfile.mkdtemp())
+
+        async def speculative_game():
+            # e.g. the branches of a speculative round
+            return await asyncio.gather(*(scheduler.submit({"request": i}) for i in range(3)))
+
+        async def slow_game():
+            await asyncio.sleep(0.05)
+            return [await scheduler.submit({"request": 3})]
+
+        results = await scheduler.run([speculative_game(), slow_game()])
+        return scheduler, results
+
+    scheduler, results = asyncio.run(play())
+    assert sorted(results, key=len) == [[{"request": 3}], [{"request": 0}, {"request": 1}, {"request": 2}]]
+    # The requests of both games went in a single batch
+    assert scheduler.num_batches == 1
+    assert scheduler.num_requests == 4
+    logging.info(f"{scheduler.num_requests} requests sent in {scheduler.num_batches} batch")
+
+def test_local_backend_is_offline():
+    """Test that the local backend answers the requests with the mock backend by default."""
+    logging.info("Testing the default responder of the local backend...")
+
+    body = {
+        "model": "gpt-4o-mini",
+        "messages": [
+            {"role": "system", "content": "You are the Host."},
+            {"role": "user", "content": "The topic for this game is: Dog. Answer the question: Is it an animal?"},
+        ],
+        "response_format": {
+            "type": "json_schema",
+            "json_schema": {
+                "name": "final_output",
+                "schema": {"properties": {"reasoning": {}, "answer": {}}},
+            },
+        },
+    }
+    completion = asyncio.run(LocalBatchBackend().responder(body))
+    assert completion["choices"][0]["finish_reason"] == "stop"
+    logging.info(f"Mock completion: {completion['choices'][0]['message']['content']}")
+
+def main():
+    """Run all tests."""
+    passed = True
+    for test in (test_multi_request_game, test_local_backend_is_offline):
+        try:
+            test()
+        except Exception as e:
+            logging.error(f"Error in {test.__name__}: {e}")
+            traceback.print_exc()
+            passed = False
+
+    if passed:
+        logging.info("All tests passed!")
+        return 0
+    else:
+        logging.error("Some tests failed!")
+        return 1
+
+if __name__ == "__main__":
+    result = main()
+    exit(result)
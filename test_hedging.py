@@ -0,0 +1,74 @@
+"""
+Simple test script for verifying that the request hedger keeps to its budget.
+
+No model is called: the hedged calls are coroutines that sleep. Run it as a script, or
+with pytest.
+"""
+
+import asyncio
+import logging
+import traceback
+from hedging import RequestHedger
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+class FakeAgent:
+    """Agent whose branches only need to be forked and merged back."""
+
+    llm_seconds = 0.0
+
+    def fork(self):
+        return FakeAgent()
+
+    def merge(self, branch, adopt=True):
+        pass
+
+def test_hedge_budget_under_concurrency():
+    """Test that concurrent slow calls never hedge more than the budget allows."""
+    logging.info("Testing the hedge budget with concurrent slow calls...")
+
+    hedger = RequestHedger(percentile=0.5, min_samples=1, budget=0.1, window=10)
+    hedger.observe("Host/get_answer", 0.001)
+    max_ratio = 0.0
+
+    async def slow_call(agent):
+        nonlocal max_ratio
+        # Every call is slower than the hedging delay
+        await asyncio.sleep(0.05)
+        max_ratio = max(max_ratio, hedger.num_hedges / (hedger.budget * hedger.num_calls))
+        return "Yes"
+
+    async def play():
+        return await asyncio.gather(
+            *(hedger.arun(FakeAgent(), "Host/get_answer", slow_call) for _ in range(50))
+        )
+
+    results = asyncio.run(play())
+    assert results == ["Yes"] * 50
+    assert hedger.num_calls == 50
+    assert 0 < hedger.num_hedges <= hedger.budget * hedger.num_calls
+    assert max_ratio <= 1.0
+    logging.info(f"{hedger.num_hedges} hedges over {hedger.num_calls} calls")
+
+def main():
+    """Run all tests."""
+    passed = True
+    for test in (test_hedge_budget_under_concurrency,):
+        try:
+            test()
+        except Exception as e:
+            logging.error(f"Error in {test.__name__}: {e}")
+            traceback.print_exc()
+            passed = False
+
+    if passed:
+        logging.info("All tests passed!")
+        return 0
+    else:
+        logging.error("Some tests failed!")
+        return 1
+
+if __name__ == "__main__":
+    result = main()
+    exit(result)
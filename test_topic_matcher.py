@@ -0,0 +1,60 @@
+"""
+Simple test script for verifying that topic proposals are only decided locally when
+they are unambiguous.
+
+No model is called. Run it as a script, or with pytest.
+"""
+
+import logging
+import traceback
+from topic_matcher import TopicMatcher, load_topic_aliases
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+def test_aliases():
+    """Test that aliases match their topic, and that ambiguous names are left to the LLM."""
+    logging.info("Testing the alias table...")
+
+    matcher = TopicMatcher(load_topic_aliases())
+    assert matcher.match("NYC", "New York City") is True
+    assert matcher.match("the Big Apple", "New York City") is True
+    assert matcher.match("USA", "United States") is True
+    assert matcher.match("Queen Elizabeth II", "Elizabeth II") is True
+    # The state of New York, Elizabeth I and the continent are other topics
+    assert matcher.match("New York", "New York City") is not True
+    assert matcher.match("Queen Elizabeth", "Elizabeth II") is not True
+    assert matcher.match("America", "United States") is not True
+    logging.info(matcher.format_stats())
+
+def test_contained_topics():
+    """Test that a proposal containing the topic, or contained in it, is not accepted."""
+    logging.info("Testing proposals that contain the topic...")
+
+    matcher = TopicMatcher(reject_threshold=0.5)
+    assert matcher.match("Hot dog", "Dog") is None
+    assert matcher.match("World War I", "World War II") is None
+    assert matcher.match("Golden Gate Bridge", "the golden gate bridges") is True
+    logging.info(matcher.format_stats())
+
+def main():
+    """Run all tests."""
+    passed = True
+    for test in (test_aliases, test_contained_topics):
+        try:
+            test()
+        except Exception as e:
+            logging.error(f"Error in {test.__name__}: {e}")
+            traceback.print_exc()
+            passed = False
+
+    if passed:
+        logging.info("All tests passed!")
+        return 0
+    else:
+        logging.error("Some tests failed!")
+        return 1
+
+if __name__ == "__main__":
+    result = main()
+    exit(result)
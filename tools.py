@@ -8,13 +8,20 @@ such as generating topics, validating answers, and asking questions.
 from typing import Optional, Literal
 from pydantic import BaseModel, Field
 from prompts import (
+    SYSTEM_PROMPT_BATCH_HOST_DECISIONS,
     SYSTEM_PROMPT_GENERATE_TOPIC,
     SYSTEM_PROMPT_GET_ANSWER,
     SYSTEM_PROMPT_GET_QUESTION,
     SYSTEM_PROMPT_VALIDATE_TOPIC_PROPOSAL,
+    SYSTEM_PROMPT_SUMMARIZE_HISTORY,
 )
 from agents import Agent
-from config import model_type_guesser, model_type_host, model_type_topic_proposal
+from config import (
+    model_type_guesser,
+    model_type_host,
+    model_type_topic_proposal,
+    model_type_summary,
+)
 
 
 # Base schemas
@@ -90,6 +97,47 @@ class GetQuestion(BaseGameOutput):
     )
 
 
+class SummarizeHistory(BaseGameOutput):
+    """
+    Schema for summarising the conversation history of a player.
+
+    :param summary: Compact summary of the game so far
+    """
+
+    summary: str = Field(
+        description="Summary of the game so far: every question with its answer and every rejected topic proposal."
+    )
+
+
+class HostDecision(BaseGameOutput):
+    """
+    Schema for one decision of a batch of Host decisions.
+
+    :param id: ID of the item the decision is for
+    :param answer: The yes/no answer, for an item with a question
+    :param is_correct: Whether the proposal matches the topic, for an item with a topic proposal
+    """
+
+    id: str = Field(description="The id of the item.")
+    answer: Optional[Literal["Yes", "No"]] = Field(
+        default=None, description="The answer to the question of the item, if it has one."
+    )
+    is_correct: Optional[bool] = Field(
+        default=None,
+        description="Whether the topic proposal of the item matches its topic, if it has one.",
+    )
+
+
+class HostDecisions(BaseModel):
+    """
+    Schema for the decisions of a batch of Host requests from concurrent games.
+
+    :param decisions: One decision per item of the batch
+    """
+
+    decisions: list[HostDecision] = Field(description="One decision per item, with its id.")
+
+
 # Agent instances
 generate_topic_agent = Agent(
     name="generate_topic",
@@ -118,3 +166,17 @@ get_question_agent = Agent(
     instructions=SYSTEM_PROMPT_GET_QUESTION,
     output_type=GetQuestion,
 )
+
+summarize_history_agent = Agent(
+    name="summarize_history",
+    model=model_type_summary,
+    instructions=SYSTEM_PROMPT_SUMMARIZE_HISTORY,
+    output_type=SummarizeHistory,
+)
+
+batch_host_decisions_agent = Agent(
+    name="batch_host_decisions",
+    model=model_type_host,
+    instructions=SYSTEM_PROMPT_BATCH_HOST_DECISIONS,
+    output_type=HostDecisions,
+)
@@ -0,0 +1,166 @@
+"""
+Local pre-validation of topic proposals.
+
+Exact matches, once normalised or through the alias table (e.g. "golden gate bridge" vs
+"Golden Gate Bridge", "NYC" vs "New York City"), are accepted without calling the LLM.
+Everything else is left to the `validate_topic_proposal` agent: names that merely contain
+or resemble the topic are often different topics ("Hot dog" vs "Dog", "Henry VIII" vs
+"Henry VII"), and the agent also knows about synonyms and specific instances (e.g. "Husky"
+for "Dog") that string matching cannot see.
+"""
+
+import json
+import re
+import unicodedata
+from collections import Counter
+from difflib import SequenceMatcher
+from config import (
+    topic_aliases,
+    topic_aliases_path,
+    topic_reject_threshold,
+)
+
+ARTICLES = {"the", "a", "an"}
+
+
+def _singularize(token: str) -> str:
+    """
+    Reduce a token to a naive singular form (enough to compare both sides alike).
+
+    :param token: Lower-case token
+    :returns: Singular form of the token
+    """
+    if len(token) <= 3:
+        return token
+    if token.endswith("ies"):
+        return token[:-3] + "y"
+    if token.endswith(("ches", "shes", "sses", "xes", "zes")):
+        return token[:-2]
+    if token.endswith("s") and not token.endswith(("ss", "us", "is")):
+        return token[:-1]
+    return token
+
+
+def normalize_topic(text: str) -> str:
+    """
+    Normalise a topic: case, accents, punctuation, articles and plurals.
+
+    :param text: Topic or topic proposal
+    :returns: Normalised topic, e.g. "The Pyramids of Giza" -> "pyramid of giza"
+    """
+    text = unicodedata.normalize("NFKD", text)
+    text = "".join(char for char in text if not unicodedata.combining(char))
+    text = text.lower().replace("&", " and ")
+    tokens = re.findall(r"[a-z0-9]+", text)
+    return " ".join(_singularize(token) for token in tokens if token not in ARTICLES)
+
+
+class TopicMatcher:
+    """
+    Matches topic proposals against the topic using normalisation and an alias table,
+    and counts how often the LLM could be skipped.
+
+    :param aliases: Mapping of a topic to its alternative names
+    :param reject_threshold: Character similarity below which a proposal sharing no
+        word with the topic is rejected. None disables local rejection.
+    """
+
+    def __init__(
+        self,
+        aliases: dict[str, list[str]] | None = None,
+        reject_threshold: float | None = None,
+    ):
+        self.reject_threshold = reject_threshold
+        self._canonical_names: dict[str, str] = {}
+        for topic, names in (aliases or {}).items():
+            canonical_name = normalize_topic(topic)
+            for alias in names:
+                self._canonical_names[normalize_topic(alias)] = canonical_name
+        # "repeated" is counted by the Host for proposals it has already decided on
+        self.stats = Counter(matched=0, rejected=0, repeated=0, deferred=0)
+
+    def canonical(self, text: str) -> str:
+        """
+        Get the canonical normalised name of a topic, resolving aliases.
+
+        :param text: Topic or topic proposal
+        :returns: Canonical normalised name
+        """
+        normalized = normalize_topic(text)
+        return self._canonical_names.get(normalized, normalized)
+
+    def match(self, topic_proposal: str, topic: str) -> bool | None:
+        """
+        Decide locally whether the proposal matches the topic.
+
+        :param topic_proposal: Topic proposed by the Guesser
+        :param topic: Topic of the game
+        :returns: True or False for a clear decision, None if the LLM should decide
+        """
+        decision = self._decide(self.canonical(topic_proposal), self.canonical(topic))
+        if decision is None:
+            self.stats["deferred"] += 1
+        else:
+            self.stats["matched" if decision else "rejected"] += 1
+        return decision
+
+    def _decide(self, proposal: str, topic: str) -> bool | None:
+        if not proposal or not topic:
+            return None
+        if proposal == topic:
+            return True
+        # Only exact matches are accepted locally: a proposal containing or resembling the
+        # topic may name another topic ("Hot dog" vs "Dog", "World War II" vs "World War I")
+        if self.reject_threshold is None or set(proposal.split()) & set(topic.split()):
+            return None
+        if SequenceMatcher(None, proposal, topic).ratio() < self.reject_threshold:
+            return False
+        return None
+
+    def format_stats(self) -> str:
+        """
+        Summarise how often the LLM was skipped.
+
+        :returns: Human-readable summary
+        """
+        total = sum(self.stats.values())
+        skipped = total - self.stats["deferred"]
+        skipped_rate = skipped / total * 100 if total else 0.0
+        return (
+            f"Local topic validation: {self.stats['matched']} matched, "
+            f"{self.stats['rejected']} rejected, {self.stats['repeated']} repeated, "
+            f"{self.stats['deferred']} sent to the LLM "
+            f"(LLM skipped: {skipped_rate:.1f}%)"
+        )
+
+
+def load_topic_aliases() -> dict[str, list[str]]:
+    """
+    Load the alias table from config.py, extended with the optional JSON file.
+
+    :returns: Mapping of a topic to its alternative names
+    """
+    aliases = {topic: list(names) for topic, names in topic_aliases.items()}
+    if topic_aliases_path is not None:
+        with open(topic_aliases_path) as f:
+            for topic, names in json.load(f).items():
+                aliases.setdefault(topic, []).extend(names)
+    return aliases
+
+
+_topic_matcher: TopicMatcher | None = None
+
+
+def get_topic_matcher() -> TopicMatcher:
+    """
+    Get the process-wide topic matcher configured in config.py.
+
+    :returns: The shared topic matcher
+    """
+    global _topic_matcher
+    if _topic_matcher is None:
+        _topic_matcher = TopicMatcher(
+            load_topic_aliases(),
+            reject_threshold=topic_reject_threshold,
+        )
+    return _topic_matcher
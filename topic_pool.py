@@ -0,0 +1,406 @@
+"""
+Pool of pre-generated topics.
+
+Generating a topic takes a call to the reasoning model `model_type_topic_proposal`, which
+would otherwise be on the critical path of every game start. The pool generates topics in
+the background, de-duplicates them on their canonical name and stores them with their
+category in a SQLite database shared by all worker processes. A game without a topic
+takes one instantly, and each topic is handed out only once, so the games of a tournament
+all get different topics. The pool is topped up once fewer than `topic_pool_low_watermark`
+unused topics are left; it can also be filled ahead of a tournament:
+
+    python topic_pool.py fill --size 200                     # pre-generate topics
+    python topic_pool.py fill --size 200 --backend mock      # ... for the mock backend
+    python topic_pool.py stats                               # topics available and used
+"""
+
+import asyncio
+import logging
+import os
+import sqlite3
+import time
+import uuid
+from typing import Any
+import fire
+from agents import ModelProvider, Runner, RunConfig
+from config import (
+    topic_pool_enabled,
+    topic_pool_low_watermark,
+    topic_pool_max_concurrent,
+    topic_pool_path,
+    topic_pool_retry_after,
+    topic_pool_target_size,
+)
+from messages import topic_pool_message
+from metrics import get_metrics, record_llm_call
+from model_backends import MockModelProvider, get_backend
+from rate_limiter import RateLimiter, RateLimitHooks, estimate_tokens, get_rate_limiter
+from tools import generate_topic_agent
+from topic_matcher import normalize_topic
+from utils import run_sync
+
+logger = logging.getLogger(__name__)
+
+# Number of topics listed in the generation prompt as already in use
+NUM_TOPICS_TO_AVOID = 50
+
+
+def pool_namespace(model_provider: ModelProvider | None) -> str:
+    """
+    Name of the part of the pool filled by a model provider, so topics generated by
+    the mock backend are never handed out to games played on the API.
+
+    :param model_provider: Provider of the models (None: the OpenAI API)
+    :returns: "mock" or "openai"
+    """
+    return "mock" if isinstance(model_provider, MockModelProvider) else "openai"
+
+
+class TopicPool:
+    """
+    Persistent pool of pre-generated topics. Safe to share between processes.
+
+    :param path: Path of the SQLite database
+    :param low_watermark: Top up the pool once fewer unused topics are left
+    :param target_size: Number of unused topics a top-up aims for
+    :param max_concurrent: Maximum number of topics generated at once
+    """
+
+    def __init__(
+        self,
+        path: str,
+        low_watermark: int = topic_pool_low_watermark,
+        target_size: int = topic_pool_target_size,
+        max_concurrent: int = topic_pool_max_concurrent,
+    ):
+        self.path = path
+        self.low_watermark = low_watermark
+        self.target_size = target_size
+        self.max_concurrent = max_concurrent
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._connection = sqlite3.connect(path, timeout=30, isolation_level=None)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS topics ("
+            "namespace TEXT NOT NULL, canonical TEXT NOT NULL, topic TEXT NOT NULL, "
+            "category TEXT, sub_category TEXT, created REAL NOT NULL, taken REAL, "
+            "PRIMARY KEY (namespace, canonical))"
+        )
+        self._connection.execute(
+            "CREATE INDEX IF NOT EXISTS topics_available ON topics (namespace, taken, created)"
+        )
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS stats (name TEXT PRIMARY KEY, value INTEGER NOT NULL)"
+        )
+        # Background top-ups in flight, per event loop and namespace
+        self._refills: dict[tuple[asyncio.AbstractEventLoop, str], asyncio.Task] = {}
+        # Namespaces whose model proposes no new topics anymore
+        self._exhausted: set[str] = set()
+        # `time.monotonic()` of the last failed top-up, per namespace
+        self._failed_at: dict[str, float] = {}
+
+    def add(self, namespace: str, topic: str, category: str | None, sub_category: str | None) -> bool:
+        """
+        Add a topic, unless a topic with the same canonical name was ever added.
+
+        :param namespace: Namespace of the topic (see `pool_namespace`)
+        :param topic: The topic
+        :param category: Category of the topic
+        :param sub_category: Sub-category of the topic
+        :returns: True if the topic was added, False if it is a duplicate
+        """
+        cursor = self._connection.execute(
+            "INSERT OR IGNORE INTO topics "
+            "(namespace, canonical, topic, category, sub_category, created) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            (namespace, normalize_topic(topic), topic, category, sub_category, time.time()),
+        )
+        added = cursor.rowcount == 1
+        self._increment("generated" if added else "duplicates")
+        return added
+
+    def mark_used(self, namespace: str, topic: str):
+        """
+        Record a topic generated outside the pool (e.g. when the pool was empty), so it is
+        not handed out again.
+
+        :param namespace: Namespace of the topic (see `pool_namespace`)
+        :param topic: The topic
+        """
+        now = time.time()
+        self._connection.execute(
+            "INSERT INTO topics (namespace, canonical, topic, created, taken) "
+            "VALUES (?, ?, ?, ?, ?) "
+            "ON CONFLICT (namespace, canonical) DO UPDATE SET taken = COALESCE(taken, excluded.taken)",
+            (namespace, normalize_topic(topic), topic, now, now),
+        )
+
+    def take(self, namespace: str) -> dict[str, str] | None:
+        """
+        Take the oldest unused topic. Each topic is handed out only once, across processes.
+
+        :param namespace: Namespace of the topic (see `pool_namespace`)
+        :returns: Dict with the topic, category and sub_category, or None if the pool is empty
+        """
+        with self._connection:
+            self._connection.execute("BEGIN IMMEDIATE")
+            row = self._connection.execute(
+                "SELECT canonical, topic, category, sub_category FROM topics "
+                "WHERE namespace = ? AND taken IS NULL ORDER BY created LIMIT 1",
+                (namespace,),
+            ).fetchone()
+            if row is None:
+                self._increment("misses")
+                return None
+            canonical, topic, category, sub_category = row
+            self._connection.execute(
+                "UPDATE topics SET taken = ? WHERE namespace = ? AND canonical = ?",
+                (time.time(), namespace, canonical),
+            )
+            self._increment("served")
+        return {"topic": topic, "category": category, "sub_category": sub_category}
+
+    def num_available(self, namespace: str) -> int:
+        """
+        Count the unused topics.
+
+        :param namespace: Namespace of the topics (see `pool_namespace`)
+        :returns: Number of unused topics
+        """
+        (count,) = self._connection.execute(
+            "SELECT COUNT(*) FROM topics WHERE namespace = ? AND taken IS NULL", (namespace,)
+        ).fetchone()
+        return count
+
+    def _recent_topics(self, namespace: str) -> list[str]:
+        """
+        The most recently added topics, which new topics must differ from.
+        """
+        return [
+            topic
+            for (topic,) in self._connection.execute(
+                "SELECT topic FROM topics WHERE namespace = ? ORDER BY created DESC LIMIT ?",
+                (namespace, NUM_TOPICS_TO_AVOID),
+            )
+        ]
+
+    async def atake(
+        self, model_provider: ModelProvider | None = None, rate_limiter: RateLimiter | None = None
+    ) -> dict[str, str] | None:
+        """
+        Take an unused topic, and top the pool up in the background if it runs low.
+
+        :param model_provider: Provider of the models of the game (None: the OpenAI API)
+        :param rate_limiter: Rate limiter of the game (defaults to the process-wide one)
+        :returns: Dict with the topic, category and sub_category, or None if the pool is empty
+        """
+        namespace = pool_namespace(model_provider)
+        topic = self.take(namespace)
+        if self.num_available(namespace) < self.low_watermark:
+            self._schedule_refill(model_provider, rate_limiter)
+        return topic
+
+    def _schedule_refill(self, model_provider: ModelProvider | None, rate_limiter: RateLimiter | None):
+        """
+        Start a background top-up on the running event loop, unless one is in flight, the
+        model ran out of new topics, or the last top-up failed less than
+        `topic_pool_retry_after` seconds ago.
+        """
+        namespace = pool_namespace(model_provider)
+        if namespace in self._exhausted:
+            return
+        failed_at = self._failed_at.get(namespace)
+        if failed_at is not None and time.monotonic() - failed_at < topic_pool_retry_after:
+            return
+        loop = asyncio.get_running_loop()
+        refill = self._refills.get((loop, namespace))
+        if refill is not None and not refill.done():
+            return
+        self._refills[(loop, namespace)] = loop.create_task(
+            self.arefill(model_provider, rate_limiter)
+        )
+
+    async def arefill(
+        self,
+        model_provider: ModelProvider | None = None,
+        rate_limiter: RateLimiter | None = None,
+        target_size: int | None = None,
+    ) -> int:
+        """
+        Generate topics until `target_size` unused topics are available. Gives up once a
+        round adds no topic: if every generated topic was a duplicate, the background
+        top-ups of this process stop; if generations failed (e.g. an invalid API key or an
+        outage), the last error is logged and the background top-ups pause for
+        `topic_pool_retry_after` seconds.
+
+        :param model_provider: Provider of the models (None: the OpenAI API)
+        :param rate_limiter: Rate limiter of the calls (defaults to the process-wide one)
+        :param target_size: Number of unused topics to aim for (defaults to `target_size`)
+        :returns: Number of topics added
+        """
+        namespace = pool_namespace(model_provider)
+        target_size = self.target_size if target_size is None else target_size
+        run_config = RunConfig(model_provider=model_provider) if model_provider is not None else None
+        rate_limiter = rate_limiter or get_rate_limiter()
+        added = 0
+        while (missing := target_size - self.num_available(namespace)) > 0:
+            avoid = self._recent_topics(namespace)
+            results = await asyncio.gather(
+                *(
+                    self._agenerate(avoid, run_config, rate_limiter)
+                    for _ in range(min(missing, self.max_concurrent))
+                ),
+                return_exceptions=True,
+            )
+            num_added = 0
+            last_error = None
+            for result in results:
+                if isinstance(result, Exception):
+                    get_metrics().increment("topic_pool_errors_total", error=type(result).__name__)
+                    last_error = result
+                elif self.add(namespace, result["topic"], result["category"], result["sub_category"]):
+                    num_added += 1
+            added += num_added
+            if num_added > 0:
+                continue
+            if last_error is not None:
+                logger.error(
+                    f"No new topic could be generated; stopped topping up the {namespace} topic pool "
+                    f"at {self.num_available(namespace)} unused topics: {last_error!r}"
+                )
+                self._failed_at[namespace] = time.monotonic()
+            else:
+                logger.warning(
+                    f"The model keeps proposing known topics; stopped topping up the {namespace} "
+                    f"topic pool at {self.num_available(namespace)} unused topics"
+                )
+                self._exhausted.add(namespace)
+            break
+        return added
+
+    async def _agenerate(
+        self, avoid: list[str], run_config: RunConfig | None, rate_limiter: RateLimiter
+    ) -> dict[str, Any]:
+        """
+        Generate one topic with the topic proposal agent.
+
+        :param avoid: Topics the new topic must differ from
+        :param run_config: Run configuration of the models
+        :param rate_limiter: Rate limiter of the call
+        :returns: The generated topic, category and sub_category
+        """
+        message = topic_pool_message.format(
+            used_topics="; ".join(avoid) or "none", unique_id=uuid.uuid4()
+        )
+        topic_input = [{"role": "user", "content": message}]
+        hooks = RateLimitHooks(
+            rate_limiter, estimate_tokens(generate_topic_agent.instructions, topic_input)
+        )
+        start_time = time.perf_counter()
+        result = await Runner.run(
+            generate_topic_agent, topic_input, hooks=hooks, run_config=run_config
+        )
+        record_llm_call(
+            "TopicPool",
+            generate_topic_agent.name,
+            time.perf_counter() - start_time,
+            hooks.models,
+            result.raw_responses,
+        )
+        hooks.reconcile(result.raw_responses)
+        return result.final_output.model_dump()
+
+    def _increment(self, name: str):
+        """
+        Increment a persistent counter (shared by all processes using the database).
+        """
+        self._connection.execute(
+            "INSERT INTO stats (name, value) VALUES (?, 1) "
+            "ON CONFLICT(name) DO UPDATE SET value = value + 1",
+            (name,),
+        )
+
+    def stats(self) -> dict[str, int]:
+        """
+        Read the counters of the pool (topics served, generated, rejected as duplicates, and
+        games that found the pool empty) together with the number of topics per namespace.
+
+        :returns: Mapping of counter name to value
+        """
+        counters = {name: 0 for name in ("served", "generated", "duplicates", "misses")}
+        counters.update(self._connection.execute("SELECT name, value FROM stats"))
+        for namespace, available, used in self._connection.execute(
+            "SELECT namespace, SUM(taken IS NULL), SUM(taken IS NOT NULL) FROM topics "
+            "GROUP BY namespace"
+        ):
+            counters[f"{namespace}_available"] = available
+            counters[f"{namespace}_used"] = used
+        return counters
+
+
+def format_pool_stats(stats: dict[str, int]) -> str:
+    """
+    Summarise the counters of the topic pool.
+
+    :param stats: Counters, as returned by `TopicPool.stats`
+    :returns: Human-readable summary
+    """
+    requests = stats["served"] + stats["misses"]
+    hit_rate = stats["served"] / requests * 100 if requests else 0.0
+    return (
+        f"Topic pool: {stats['served']} topics served, {stats['misses']} games found it empty "
+        f"(hit rate: {hit_rate:.1f}%), {stats['generated']} topics generated, "
+        f"{stats['duplicates']} duplicates discarded"
+    )
+
+
+_topic_pool: TopicPool | None = None
+_topic_pool_pid: int | None = None
+
+
+def get_topic_pool() -> TopicPool | None:
+    """
+    Get the process-wide topic pool configured in config.py.
+    Forked worker processes get their own instance (SQLite connections cannot be shared).
+
+    :returns: The shared pool, or None if the pool is disabled
+    """
+    global _topic_pool, _topic_pool_pid
+    if not topic_pool_enabled:
+        return None
+    if _topic_pool is None or _topic_pool_pid != os.getpid():
+        _topic_pool_pid = os.getpid()
+        _topic_pool = TopicPool(topic_pool_path)
+    return _topic_pool
+
+
+def fill(size: int = topic_pool_target_size, backend: str | None = None, path: str = topic_pool_path):
+    """
+    Fill the pool with unused topics ahead of a tournament.
+
+    :param size: Number of unused topics to aim for
+    :param backend: Model backend generating the topics ("openai" or "mock", see config.py)
+    :param path: Path of the SQLite database
+    """
+    model_provider, rate_limiter = get_backend(backend)
+    pool = TopicPool(path)
+    added = run_sync(pool.arefill(model_provider, rate_limiter, target_size=size))
+    namespace = pool_namespace(model_provider)
+    print(f"Added {added} topics; {pool.num_available(namespace)} unused {namespace} topics available")
+
+
+def stats(path: str = topic_pool_path):
+    """
+    Print the counters of the pool.
+
+    :param path: Path of the SQLite database
+    """
+    pool_stats = TopicPool(path).stats()
+    print(format_pool_stats(pool_stats))
+    for name in sorted(pool_stats):
+        if name.endswith(("_available", "_used")):
+            print(f"  {name}: {pool_stats[name]}")
+
+
+if __name__ == "__main__":
+    fire.Fire({"fill": fill, "stats": stats})
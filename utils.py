@@ -1,51 +1,44 @@
+import asyncio
 import logging
-import os
-import colorama
-from colorama import Fore, Style
+import threading
+from typing import Any, Coroutine, TypeVar
+from log_writer import QueuedGameHandler, get_log_writer
 
-# Initialize colorama
-colorama.init(autoreset=True)
+T = TypeVar("T")
 
+# One event loop per thread, reused across synchronous calls (like `Runner.run_sync`),
+# so that async HTTP clients bound to the loop stay usable between calls.
+_thread_state = threading.local()
 
-class ColorFormatter(logging.Formatter):
-    """
-    Custom logging formatter to color-code log messages based on their source.
 
+def run_sync(coro: Coroutine[Any, Any, T]) -> T:
     """
+    Run a coroutine to completion from synchronous code.
 
-    def __init__(self, fmt=None, datefmt=None):
-        super().__init__(fmt, datefmt)
-        self.host_color = Fore.BLUE
-        self.guesser_color = Fore.GREEN
-        self.other_color = Fore.YELLOW
-        self.reset = Style.RESET_ALL
-
-    def format(self, record):
-        message = record.getMessage()
-        if message.startswith("Host"):
-            record.msg = f"{self.host_color}{message}{self.reset}"
-        elif message.startswith("Guesser"):
-            record.msg = f"{self.guesser_color}{message}{self.reset}"
-        else:
-            record.msg = f"{self.other_color}{message}{self.reset}"
-        return super().format(record)
+    :param coro: The coroutine to run
+    :return: The result of the coroutine
+    """
+    loop = getattr(_thread_state, "loop", None)
+    if loop is None or loop.is_closed():
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        _thread_state.loop = loop
+    return loop.run_until_complete(coro)
 
 
 def setup_logger(game_id: str) -> logging.Logger:
     """
-    Set up and configure the logger for the game.
+    Set up and configure the logger for the game. Its records are written to the console,
+    the worker's log file and the game records by the background log writer of the
+    process (see log_writer.py), so logging never blocks the game.
 
     :param game_id: Unique identifier for the game instance
     :return: Configured logger instance
     """
-    # Ensure the log directory exists
-    log_dir = "game_logs"
-    os.makedirs(log_dir, exist_ok=True)
-
-    # Configure logging to both console and file with color formatting
-    log_filename = f"{log_dir}/game_log_{game_id}.log"
     logger = logging.getLogger(f"game_{game_id}")
-    logger.setLevel(logging.INFO)
+    # Structured events (e.g. LLM calls) are logged at the DEBUG level, and only recorded
+    # in the game records
+    logger.setLevel(logging.DEBUG)
 
     # Prevent log messages from being propagated to the root logger
     logger.propagate = False
@@ -54,16 +47,19 @@ def setup_logger(game_id: str) -> logging.Logger:
     if logger.hasHandlers():
         logger.handlers.clear()
 
-    # Console handler with color formatter
-    console_handler = logging.StreamHandler()
-    console_formatter = ColorFormatter()
-    console_handler.setFormatter(console_formatter)
-    logger.addHandler(console_handler)
+    logger.addHandler(QueuedGameHandler(game_id, get_log_writer()))
+    return logger
 
-    # File handler without color codes
-    file_handler = logging.FileHandler(log_filename)
-    file_formatter = logging.Formatter("%(asctime)s - %(message)s")
-    file_handler.setFormatter(file_formatter)
-    logger.addHandler(file_handler)
 
-    return logger
+def close_logger(logger: logging.Logger):
+    """
+    Close the handlers of a game's logger and forget the logger, so that processes
+    playing many games do not accumulate loggers. The game's log is indexed once its
+    queued records are written.
+
+    :param logger: Logger created by `setup_logger`
+    """
+    for handler in list(logger.handlers):
+        logger.removeHandler(handler)
+        handler.close()
+    logging.Logger.manager.loggerDict.pop(logger.name, None)